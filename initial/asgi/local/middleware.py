@@ -1,6 +1,9 @@
+import bisect
 import logging
+import math
 import os
 import signal
+import time
 import hypercorn.config
 import hypercorn.asyncio
 import asyncio
@@ -8,6 +11,9 @@ import asyncio
 
 DEFAULT_LOG_LEVEL = logging.INFO
 DEFAULT_LISTEN_ADDRESS = "127.0.0.1:8080"
+# request latency histogram buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_CONTENT_TYPE = b"text/plain; version=0.0.4; charset=utf-8"
 
 def serve(f):
     return ASGIApplication(f()).serve()
@@ -16,6 +22,7 @@ class ASGIApplication():
     def __init__(self, f):
         self.f = f
         self.stop_event = asyncio.Event()
+        self.metrics = RequestMetrics()
         if hasattr(self.f, "handle") is not True:
             raise AttributeError("Function must implement a 'handle' method.")
 
@@ -91,14 +98,136 @@ class ASGIApplication():
             return
 
         # Route request
+        route = ROUTES.get(scope['path'], "function")
+        status = 500
+        async def send_recorded(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        self.metrics.in_flight += 1
+        start = time.perf_counter()
         try:
-            if scope['path'] == '/health/liveness':
-                await self.handle_liveness(scope, receive, send)
-            elif scope['path'] == '/health/readiness':
-                await self.handle_readiness(scope, receive, send)
+            if route == 'liveness':
+                await self.handle_liveness(scope, receive, send_recorded)
+            elif route == 'readiness':
+                await self.handle_readiness(scope, receive, send_recorded)
+            elif route == 'metrics':
+                await self.handle_metrics(scope, receive, send_recorded)
             else:
-                await self.f.handle(scope, receive, send)
+                await self.f.handle(scope, receive, send_recorded)
         except Exception as e:
-            await send_exception(send, 500, f"Error: {e}")
-
-
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after is not None:
+                # backpressure: the Function is out of capacity, the client
+                # should come back later (429 Too Many Requests/503)
+                await send_exception(send_recorded, getattr(e, "status", 503), f"Error: {e}",
+                                     [[b'retry-after', str(math.ceil(retry_after)).encode()]])
+            else:
+                await send_exception(send_recorded, 500, f"Error: {e}")
+        finally:
+            self.metrics.in_flight -= 1
+            self.metrics.record(route, status, time.perf_counter() - start)
+
+    async def handle_liveness(self, scope, receive, send):
+        alive = True
+        message = "OK"
+        if hasattr(self.f, "alive"):
+            alive, message = self.f.alive()
+        await send_health(send, alive, message)
+
+    async def handle_readiness(self, scope, receive, send):
+        ready = True
+        message = "OK"
+        if hasattr(self.f, "ready"):
+            ready, message = self.f.ready()
+        await send_health(send, ready, message)
+
+    async def handle_metrics(self, scope, receive, send):
+        """ request metrics, followed by the Function's own if it has any """
+        body = self.metrics.render()
+        if hasattr(self.f, "metrics"):
+            body += self.f.metrics()
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [[b'content-type', METRICS_CONTENT_TYPE]],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': body.encode(),
+        })
+
+# path -> route label of the request metrics (everything else is "function")
+ROUTES = {
+    '/health/liveness': 'liveness',
+    '/health/readiness': 'readiness',
+    '/metrics': 'metrics',
+}
+
+class RequestMetrics:
+    """
+    HTTP request count, latency histogram and in-flight requests per route,
+    in the Prometheus text format. Updated from the event loop only, so
+    plain counters without locks are enough.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.requests = {} # (route, status) -> count
+        self.latency = {} # route -> ([count per bucket..., +Inf], sum)
+
+    def record(self, route, status, seconds):
+        key = (route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        counts, total = self.latency.get(route) or ([0] * (len(LATENCY_BUCKETS) + 1), 0.0)
+        counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.latency[route] = (counts, total + seconds)
+
+    def render(self):
+        lines = [
+            "# HELP http_requests_in_flight Requests being served",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_requests_total Requests by route and status",
+            "# TYPE http_requests_total counter",
+        ]
+        for (route, status), count in self.requests.items():
+            lines.append(f'http_requests_total{{route="{route}",status="{status}"}} {count}')
+        lines += [
+            "# HELP http_request_duration_seconds Request duration by route",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for route, (counts, total) in self.latency.items():
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + (None,), counts):
+                cumulative += count
+                le = "+Inf" if bound is None else f"{bound:g}"
+                lines.append(f'http_request_duration_seconds_bucket{{route="{route}",le="{le}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{route="{route}"}} {total}')
+            lines.append(f'http_request_duration_seconds_count{{route="{route}"}} {cumulative}')
+        return "\n".join(lines) + "\n"
+
+async def send_health(send, ok, message):
+    # 503 lets the platform retry the probe/hold traffic until ready
+    await send({
+        'type': 'http.response.start',
+        'status': 200 if ok else 503,
+        'headers': [[b'content-type', b'text/plain']],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': f"{message}".encode(),
+    })
+
+async def send_exception(send, code, message, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': code,
+        'headers': [[b'content-type', b'text/plain'], *headers],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': message.encode(),
+    })
@@ -67,48 +67,75 @@ class Function:
         configuration.
         """
         self.mcp_server = MCPServer()
-        self._mcp_initialized = False
+        # MCP lifespan is started exactly once, see start()/_start_mcp
+        self._mcp_task = None
+        self._mcp_ready = None
+        self._mcp_stop = None
+        self._mcp_error = None
 
     async def handle(self, scope, receive, send):
         """Handle ASGI requests."""
-        # Initialize MCP server on first request
-        if not self._mcp_initialized:
-            await self._initialize_mcp()
-        
         # Route MCP requests
-        if scope['path'].startswith('/mcp'):
+        if scope.get('path', '').startswith('/mcp'):
+            # started by start(), waits only while it is still coming up
+            await self._wait_mcp()
             await self.mcp_server.handle_request(scope, receive, send)
             return
         
         # Default response for non-MCP requests
         await self._send_default_response(send)
     
-    async def _initialize_mcp(self):
-        """Initialize the MCP server by sending lifespan startup event."""
+    def _start_mcp(self):
+        """
+        Start the MCP server lifespan (session manager) in background.
+        Runs exactly once, needs a running event loop.
+        """
+        if self._mcp_task is not None:
+            return
+        self._mcp_ready = asyncio.Event()
+        self._mcp_stop = asyncio.Event()
+        self._mcp_task = asyncio.create_task(self._run_mcp_lifespan())
+
+    async def _run_mcp_lifespan(self):
+        """Drive the MCP server lifespan: startup now, shutdown on stop()."""
         lifespan_scope = {'type': 'lifespan', 'asgi': {'version': '3.0'}}
         startup_sent = False
-        
+
         async def lifespan_receive():
             nonlocal startup_sent
             if not startup_sent:
                 startup_sent = True
                 return {'type': 'lifespan.startup'}
-            await asyncio.Event().wait()  # Wait forever for shutdown
-        
+            await self._mcp_stop.wait()
+            return {'type': 'lifespan.shutdown'}
+
         async def lifespan_send(message):
             if message['type'] == 'lifespan.startup.complete':
-                self._mcp_initialized = True
+                self._mcp_ready.set()
             elif message['type'] == 'lifespan.startup.failed':
                 logging.error(f"MCP startup failed: {message}")
-        
-        # Start lifespan in background
-        asyncio.create_task(self.mcp_server.handle_request(
-            lifespan_scope, lifespan_receive, lifespan_send
-        ))
-        
-        # Brief wait for startup completion
-        await asyncio.sleep(0.1)
-    
+                self._mcp_error = message.get('message') or "startup failed"
+
+        try:
+            await self.mcp_server.handle_request(
+                lifespan_scope, lifespan_receive, lifespan_send
+            )
+        except Exception as e:
+            logging.error(f"MCP lifespan failed: {e}")
+            self._mcp_error = self._mcp_error or str(e)
+        finally:
+            # never leave requests waiting for a server that is not coming
+            if not self._mcp_ready.is_set():
+                self._mcp_error = self._mcp_error or "lifespan exited"
+                self._mcp_ready.set()
+
+    async def _wait_mcp(self):
+        """Wait until the MCP server is up (starting it if start() did not)."""
+        self._start_mcp()
+        await self._mcp_ready.wait()
+        if self._mcp_error:
+            raise RuntimeError(f"MCP server failed to start: {self._mcp_error}")
+
     async def _send_default_response(self, send):
         """Send default OK response."""
         await send({
@@ -123,12 +150,20 @@ class Function:
 
     def start(self, cfg):
         logging.info("Function starting")
+        # MCP server is started here, not on the first request
+        self._start_mcp()
 
     def stop(self):
         logging.info("Function stopping")
+        if self._mcp_stop is not None:
+            self._mcp_stop.set()
 
     def alive(self):
         return True, "Alive"
 
     def ready(self):
+        if self._mcp_ready is None or not self._mcp_ready.is_set():
+            return False, "MCP server starting"
+        if self._mcp_error:
+            return False, f"MCP server failed to start: {self._mcp_error}"
         return True, "Ready"
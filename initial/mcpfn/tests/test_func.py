@@ -2,6 +2,8 @@
 An example set of unit tests which confirm that the main handler (the
 callable function) returns 200 OK for a simple HTTP GET.
 """
+import asyncio
+
 import pytest
 from function import new
 
@@ -36,3 +38,19 @@ async def test_function_handle():
     assert sent_ok, "Function did not send a 200 OK"
     assert sent_headers, "Function did not send headers"
     assert sent_body, "Function did not send a body"
+
+
+@pytest.mark.asyncio
+async def test_function_mcp_lifespan():
+    f = new()
+    assert not f.ready()[0], "Function ready before MCP server started"
+
+    f.start({})
+    # concurrent first requests share the single lifespan started by start
+    task = f._mcp_task
+    await asyncio.gather(f._wait_mcp(), f._wait_mcp())
+    assert f._mcp_task is task
+    assert f.ready() == (True, "Ready")
+
+    f.stop()
+    await asyncio.wait_for(task, 5)
@@ -0,0 +1,164 @@
+import asyncio
+import collections
+import contextlib
+import json
+import math
+import time
+from typing import Callable, Optional
+
+# per model: calls to ollama at once, calls waiting, seconds they may wait
+DEFAULT_CONCURRENCY = 4
+DEFAULT_QUEUE = 32
+DEFAULT_QUEUE_TIMEOUT = 30.0
+
+# weight of the last call in the average call duration (retry estimates)
+EWMA_WEIGHT = 0.2
+
+class Overloaded(Exception):
+    """
+    No capacity for the model: status 429 when its queue is full, 503 when
+    the wait would exceed the deadline. The ASGI middleware answers with
+    this status and a Retry-After header of retry_after seconds.
+    """
+
+    def __init__(self, model: str, status: int, retry_after: int, reason: str):
+        super().__init__(f"ollama model {model} is overloaded ({reason}), "
+                         f"retry after {retry_after}s")
+        self.model = model
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+class _Model:
+    def __init__(self):
+        self.in_flight = 0
+        self.waiters: collections.deque = collections.deque()
+        self.duration = 0.0 # average seconds a call holds its slot
+
+class Admission:
+    """
+    Per model concurrency limit in front of ollama, with a bounded FIFO wait
+    queue and a deadline on the time spent waiting: under a burst the
+    calls queue here instead of piling onto ollama, and are turned away
+    (Overloaded) when they can't be served in time.
+    Use from the event loop thread only.
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY,
+                 max_queue: int = DEFAULT_QUEUE,
+                 timeout: float = DEFAULT_QUEUE_TIMEOUT,
+                 on_wait: Optional[Callable[[str, float], None]] = None):
+        self.concurrency = concurrency # 0 = no limit
+        self.max_queue = max_queue
+        self.timeout = timeout # 0 = wait as long as it takes
+        # called with (model, seconds waited) when a call gets its slot
+        self.on_wait = on_wait
+        self.models: dict[str, _Model] = {}
+        self.rejected: dict[tuple[str, str], int] = {} # (model, reason) -> count
+
+    @property
+    def enabled(self) -> bool:
+        return self.concurrency > 0
+
+    def check(self, model: str):
+        """ fail fast: raise Overloaded if a call for model now would be turned away """
+        m = self.models.get(model)
+        if not self.enabled or m is None or m.in_flight < self.concurrency:
+            return
+        if len(m.waiters) >= self.max_queue:
+            self._reject(model, m, "queue_full", 429)
+        if self.timeout and self._wait_estimate(m) > self.timeout:
+            self._reject(model, m, "deadline", 503)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, model: str):
+        """ hold one of the model's slots for the block, waiting in line for it """
+        if not self.enabled:
+            yield
+            return
+        m = self.models.setdefault(model, _Model())
+        start = time.perf_counter()
+        if m.in_flight < self.concurrency and not m.waiters:
+            m.in_flight += 1
+        else:
+            if len(m.waiters) >= self.max_queue:
+                self._reject(model, m, "queue_full", 429)
+            waiter = asyncio.get_running_loop().create_future()
+            m.waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, self.timeout or None)
+            except BaseException as e:
+                if waiter.done() and not waiter.cancelled():
+                    self._release(m) # handed over just now, pass it on
+                elif waiter in m.waiters:
+                    m.waiters.remove(waiter)
+                if isinstance(e, asyncio.TimeoutError):
+                    self._reject(model, m, "timeout", 503)
+                raise
+        if self.on_wait is not None:
+            self.on_wait(model, time.perf_counter() - start)
+        held = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - held
+            m.duration = (duration if not m.duration
+                          else (1 - EWMA_WEIGHT) * m.duration + EWMA_WEIGHT * duration)
+            self._release(m)
+
+    def _release(self, m: _Model):
+        # the slot goes to the first waiter still waiting, else it is freed
+        while m.waiters:
+            waiter = m.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        m.in_flight -= 1
+
+    def _wait_estimate(self, m: _Model) -> float:
+        """ seconds until a new call would get a slot """
+        return m.duration * (len(m.waiters) + 1) / self.concurrency
+
+    def _reject(self, model: str, m: _Model, reason: str, status: int):
+        key = (model, reason)
+        self.rejected[key] = self.rejected.get(key, 0) + 1
+        raise Overloaded(model, status, max(1, math.ceil(self._wait_estimate(m))), reason)
+
+async def read_body(receive):
+    """
+    Read the whole ASGI request body. Returns it and a receive callable
+    replaying it, for the app that handles the request afterwards.
+    """
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            return b"", _replay(message, receive)
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    body = b"".join(chunks)
+    return body, _replay({"type": "http.request", "body": body, "more_body": False}, receive)
+
+def _replay(message, receive):
+    pending = [message]
+    async def replay():
+        return pending.pop() if pending else await receive()
+    return replay
+
+def tool_calls(body: bytes) -> list[tuple[str, dict]]:
+    """ (tool name, arguments) of the MCP tools/call requests in a JSON-RPC body """
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return []
+    calls = []
+    for message in payload if isinstance(payload, list) else [payload]:
+        if not isinstance(message, dict) or message.get("method") != "tools/call":
+            continue
+        params = message.get("params")
+        if isinstance(params, dict):
+            arguments = params.get("arguments")
+            calls.append((params.get("name", ""),
+                          arguments if isinstance(arguments, dict) else {}))
+    return calls
@@ -0,0 +1,86 @@
+import time
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+class AdaptiveBatcher:
+    """
+    Groups items into batches for bulk embed/insert calls.
+    Batch size adapts to observed latency: it grows by a quarter while full
+    batches finish well under `target_latency` (seconds) and halves when a
+    call is slower than that. Every batch is also capped by payload size
+    (`max_bytes`, measured by `weight`) so a few huge inputs can't build one
+    giant request.
+    """
+
+    def __init__(self,
+                 initial: int = 16,
+                 min_size: int = 1,
+                 max_size: int = 256,
+                 target_latency: float = 2.0,
+                 max_bytes: int = 512 * 1024):
+        if not 1 <= min_size <= initial <= max_size:
+            raise ValueError("expected 1 <= min_size <= initial <= max_size")
+        self.size = initial
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.max_bytes = max_bytes
+
+    def batches(self, items: Iterable[T],
+                weight: Callable[[T], int] = len) -> Iterator[list[T]]:
+        """ lazily yield batches from items, reading self.size per batch """
+        batch: list[T] = []
+        batch_bytes = 0
+        for item in items:
+            w = weight(item)
+            if batch and (len(batch) >= self.size
+                          or batch_bytes + w > self.max_bytes):
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append(item)
+            batch_bytes += w
+        if batch:
+            yield batch
+
+    async def abatches(self, items: AsyncIterable[T],
+                       weight: Callable[[T], int] = len) -> AsyncIterator[list[T]]:
+        """ batches for an async stream of items """
+        batch: list[T] = []
+        batch_bytes = 0
+        async for item in items:
+            w = weight(item)
+            if batch and (len(batch) >= self.size
+                          or batch_bytes + w > self.max_bytes):
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append(item)
+            batch_bytes += w
+        if batch:
+            yield batch
+
+    def record(self, count: int, seconds: float):
+        """ adjust batch size given a call with count items took seconds """
+        if seconds > self.target_latency:
+            self.size = max(self.min_size, self.size // 2)
+        elif seconds < self.target_latency / 2 and count >= self.size:
+            # only grow when the batch was actually full, otherwise the
+            # latency tells us nothing about a bigger batch
+            self.size = min(self.max_size, self.size + max(1, self.size // 4))
+
+    def timed(self, count: int):
+        """ context manager recording the duration of a batch call """
+        return _Timer(self, count)
+
+class _Timer:
+    def __init__(self, batcher: AdaptiveBatcher, count: int):
+        self.batcher = batcher
+        self.count = count
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.batcher.record(self.count, time.monotonic() - self.start)
@@ -0,0 +1,235 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Sequence
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "mcp-rag-embeddings.sqlite")
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024 # bytes of stored vectors
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def normalize_prompt(prompt: str) -> str:
+    """ collapse whitespace so trivially different prompts share a key """
+    return " ".join(prompt.split())
+
+class LRUCache:
+    """
+    Bounded in-process cache with least recently used eviction and an
+    optional time to live (seconds, 0 = entries never expire).
+    Counts hits and misses.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict() # key -> (expires, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl and entry[0] < time.monotonic():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class SemanticCache:
+    """
+    Response cache matching prompts by meaning instead of exact text.
+    A cached response is returned when a new prompt embedding is within
+    max_distance (cosine distance) of a cached prompt, for the same model
+    and the same retrieved context. Bounded by max_entries (LRU) and ttl
+    (seconds). Call clear() whenever the underlying documents change.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600,
+                 max_distance: float = 0.05):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        # key -> (expires, model, context_key, unit vector, response)
+        self._data: OrderedDict = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    def get(self, model: str, embedding: Sequence[float],
+            context_key: str) -> Optional[str]:
+        query = _unit(embedding)
+        now = time.monotonic()
+        with self._lock:
+            best, best_distance = None, self.max_distance
+            for key, (expires, m, ctx, vector, _) in list(self._data.items()):
+                if expires < now:
+                    del self._data[key]
+                    continue
+                if m != model or ctx != context_key or len(vector) != len(query):
+                    continue
+                distance = 1.0 - float(vector @ query)
+                if distance <= best_distance:
+                    best, best_distance = key, distance
+            if best is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(best)
+            self.hits += 1
+            return self._data[best][4]
+
+    def put(self, model: str, embedding: Sequence[float],
+            context_key: str, response: str):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[self._next_key] = (time.monotonic() + self.ttl, model,
+                                          context_key, _unit(embedding), response)
+            self._next_key += 1
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+def _unit(vector: Sequence[float]):
+    import numpy as np # only needed once the semantic cache is enabled
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+class EmbeddingCache:
+    """
+    Persistent content-addressed embedding cache backed by SQLite.
+    Vectors are keyed by (embedding model, sha256 of the content), so
+    re-ingesting unchanged content costs a lookup instead of a model call.
+    Total size of stored vectors is capped at max_bytes, least recently used
+    entries are evicted first.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH,
+                 max_bytes: int = DEFAULT_CACHE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, hash)
+            )""")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_used)")
+        self._db.commit()
+        self._size = self._db.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str,
+                 texts: Sequence[str]) -> list[Optional[list[float]]]:
+        """ return cached vectors for texts (None for every miss) """
+        hashes = [content_hash(t) for t in texts]
+        found = {}
+        with self._lock:
+            # sqlite limits number of host parameters, query in slices
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i+500]
+                rows = self._db.execute(
+                    "SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN (%s)"
+                    % ",".join("?" * len(part)), [model, *part])
+                found.update(rows)
+            if found:
+                self._db.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                    [(time.time(), model, h) for h in found])
+                self._db.commit()
+        self.hits += len(found)
+        self.misses += len(hashes) - len(found)
+        return [_unpack(found[h]) if h in found else None for h in hashes]
+
+    def put_many(self, model: str, texts: Sequence[str],
+                 vectors: Sequence[Sequence[float]]):
+        """ store vectors for texts and evict old entries over the size cap """
+        now = time.time()
+        rows = {}
+        for t, v in zip(texts, vectors):
+            h = content_hash(t)
+            rows[h] = (model, h, _pack(v), now)
+        rows = list(rows.values())
+        with self._lock:
+            for row in rows:
+                old = self._db.execute(
+                    "SELECT LENGTH(vector) FROM embeddings WHERE model = ? AND hash = ?",
+                    row[:2]).fetchone()
+                self._size += len(row[2]) - (old[0] if old else 0)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._evict()
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _evict(self):
+        """ drop least recently used entries until under max_bytes """
+        while self._size > self.max_bytes:
+            rows = self._db.execute(
+                "SELECT model, hash, LENGTH(vector) FROM embeddings "
+                "ORDER BY last_used LIMIT 100").fetchall()
+            if not rows:
+                self._size = 0
+                return
+            for model, h, size in rows:
+                if self._size <= self.max_bytes:
+                    break
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE model = ? AND hash = ?", (model, h))
+                self._size -= size
+
+def _pack(vector: Sequence[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+def _unpack(blob: bytes) -> list[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
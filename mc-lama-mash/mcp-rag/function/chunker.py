@@ -0,0 +1,111 @@
+import re
+from typing import Iterable, Iterator, NamedTuple
+
+# default chunk size/overlap in characters. ~1000 chars stays well within the
+# context of the usual embedding models (mxbai-embed-large has 512 tokens)
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+class Chunk(NamedTuple):
+    """ single piece of a document ready to be embedded """
+    text: str
+    heading: str # markdown heading path of the section eg. "Intro > Usage"
+    index: int   # position of the chunk within its document
+
+class Chunker:
+    """
+    Push-style splitter of a stream of lines into chunks of roughly `size`
+    characters, where consecutive chunks share up to `overlap` characters.
+    A markdown heading always starts a new chunk (overlap does not cross
+    section boundaries). Headings inside code fences are ignored.
+    Only the current chunk is held in memory, never the whole document.
+    """
+
+    def __init__(self, size: int = DEFAULT_CHUNK_SIZE,
+                 overlap: int = DEFAULT_CHUNK_OVERLAP):
+        if size <= 0:
+            raise ValueError("chunk size must be positive")
+        if not 0 <= overlap < size:
+            raise ValueError("chunk overlap must be in range [0, size)")
+        self.size = size
+        self.overlap = overlap
+        self._headings: list[tuple[int, str]] = [] # stack of (level, title)
+        self._buf: list[str] = []
+        self._buf_len = 0
+        self._fresh = False # buf holds text not yet emitted (not only overlap)
+        self._in_fence = False
+        self._index = 0
+
+    def feed(self, line: str) -> list[Chunk]:
+        """ add a line, return chunks completed by it """
+        out = []
+        line = line.rstrip("\r\n")
+        if FENCE_RE.match(line):
+            self._in_fence = not self._in_fence
+        match = None if self._in_fence else HEADING_RE.match(line)
+
+        if match:
+            # new section -> flush whatever is left of the previous one
+            out.extend(self.flush())
+            level = len(match.group(1))
+            self._headings = [h for h in self._headings if h[0] < level]
+            self._headings.append((level, match.group(2)))
+
+        # lines longer than a chunk are split so a chunk never explodes
+        for piece in _split_long(line, self.size):
+            self._buf.append(piece)
+            self._buf_len += len(piece) + 1
+            self._fresh = True
+            if self._buf_len >= self.size:
+                out.extend(self._emit())
+                self._buf, self._buf_len = _tail(self._buf, self.overlap)
+                self._fresh = False
+        return out
+
+    def flush(self) -> list[Chunk]:
+        """ return the last (partial) chunk, call at end of a section/document """
+        out = self._emit() if self._fresh else []
+        self._buf, self._buf_len, self._fresh = [], 0, False
+        return out
+
+    def _emit(self) -> list[Chunk]:
+        text = "\n".join(self._buf).strip()
+        if not text:
+            return []
+        heading = " > ".join(title for _, title in self._headings)
+        self._index += 1
+        return [Chunk(text, heading, self._index - 1)]
+
+def chunk_lines(lines: Iterable[str],
+                size: int = DEFAULT_CHUNK_SIZE,
+                overlap: int = DEFAULT_CHUNK_OVERLAP) -> Iterator[Chunk]:
+    """ Generator that splits a stream of lines into chunks (see Chunker) """
+    chunker = Chunker(size, overlap)
+    for line in lines:
+        yield from chunker.feed(line)
+    yield from chunker.flush()
+
+def chunk_text(text: str,
+               size: int = DEFAULT_CHUNK_SIZE,
+               overlap: int = DEFAULT_CHUNK_OVERLAP) -> Iterator[Chunk]:
+    """ chunk_lines for text which is already in memory """
+    return chunk_lines(text.splitlines(), size, overlap)
+
+def _split_long(line: str, size: int) -> list[str]:
+    if len(line) <= size:
+        return [line]
+    return [line[i:i+size] for i in range(0, len(line), size)]
+
+def _tail(buf: list[str], overlap: int) -> tuple[list[str], int]:
+    """ return trailing lines of buf which fit into overlap (and their len) """
+    tail: list[str] = []
+    tail_len = 0
+    for line in reversed(buf):
+        if tail_len + len(line) + 1 > overlap:
+            break
+        tail.insert(0, line)
+        tail_len += len(line) + 1
+    return tail, tail_len
@@ -0,0 +1,82 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, Iterable
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for a key is in
+    flight, callers of the same key wait for it and share its result (or
+    exception) instead of calling the backend again. Nothing is kept once
+    the call is done, that's what the caches are for.
+    Use from the event loop thread only.
+    """
+
+    def __init__(self):
+        self._flights: dict[Hashable, asyncio.Future] = {}
+        # calls made / calls served by a call already in flight
+        self.calls = 0
+        self.shared = 0
+
+    def __len__(self):
+        return len(self._flights)
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable], *args, **kwargs):
+        """ result of fn(*args, **kwargs), shared with the concurrent calls of key """
+        flight = self._in_flight(key)
+        if flight is None:
+            # a task of its own: a caller giving up doesn't cancel it for the others
+            flight = asyncio.ensure_future(fn(*args, **kwargs))
+            self._start(key, flight)
+        else:
+            self.shared += 1
+        return await asyncio.shield(flight)
+
+    def claim(self, keys: Iterable[Hashable]) -> tuple[dict, list]:
+        """
+        For work done in bulk: returns the flights of the keys already in
+        flight ({key: future}, await them) and the keys now claimed by the
+        caller, who must resolve() each of them when done.
+        """
+        joined, claimed = {}, []
+        for key in keys:
+            if key in claimed:
+                continue
+            flight = self._in_flight(key)
+            if flight is not None:
+                joined[key] = flight
+                self.shared += 1
+            else:
+                self._start(key, asyncio.get_running_loop().create_future())
+                claimed.append(key)
+        return joined, claimed
+
+    def resolve(self, key: Hashable, result=None, error: BaseException = None):
+        """
+        end the claimed flight of key, its waiters get result or error
+        (a cancelled caller fails its waiters instead of cancelling them)
+        """
+        flight = self._flights.pop(key, None)
+        if flight is None or flight.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            error = RuntimeError("the call it was waiting for got cancelled")
+        if error is not None:
+            flight.set_exception(error)
+        else:
+            flight.set_result(result)
+
+    def _in_flight(self, key):
+        # done callbacks run later, a finished flight may still be listed
+        flight = self._flights.get(key)
+        return None if flight is None or flight.done() else flight
+
+    def _start(self, key, flight: asyncio.Future):
+        self.calls += 1
+        self._flights[key] = flight
+        flight.add_done_callback(lambda f: self._done(key, f))
+
+    def _done(self, key, flight: asyncio.Future):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # nobody may be waiting anymore, don't log the error as never retrieved
+        if not flight.cancelled():
+            flight.exception()
@@ -0,0 +1,52 @@
+import logging
+import time
+
+# origin of all marks, func.py imports this module before anything heavy
+IMPORT_STARTED = time.perf_counter()
+
+DEFAULT_BUDGET_MS = 2000
+
+class ColdStart:
+    """
+    Cold start budget of the Function.
+    Records phases (ms since the function package started importing):
+    import -> new() -> start() -> MCP ready -> first /mcp request/response,
+    and reports them once the first MCP response is sent, with a warning
+    when the total is over budget_ms. Time the pod spent ready but idle
+    before the first request is not counted.
+    """
+
+    def __init__(self, budget_ms: float = DEFAULT_BUDGET_MS):
+        self.budget_ms = budget_ms
+        self.marks: dict[str, float] = {}
+        self.reported = False
+
+    def mark(self, phase: str):
+        """ record the first time phase was reached """
+        if phase not in self.marks:
+            self.marks[phase] = (time.perf_counter() - IMPORT_STARTED) * 1000
+
+    def summary(self) -> str:
+        return ", ".join(f"{phase} {ms:.0f}ms" for phase, ms in self.marks.items())
+
+    def report(self):
+        """ log the phases, call once the first MCP response was sent """
+        if self.reported:
+            return
+        self.reported = True
+        total = self.total()
+        if total > self.budget_ms:
+            logging.warning(f"cold start {total:.0f}ms over budget "
+                            f"{self.budget_ms:.0f}ms: {self.summary()}")
+        else:
+            logging.info(f"cold start {total:.0f}ms (budget "
+                         f"{self.budget_ms:.0f}ms): {self.summary()}")
+
+    def total(self) -> float:
+        """ ms from import to first response, minus idle time before it """
+        request = self.marks.get("first_mcp_request", 0)
+        startup = max((ms for phase, ms in self.marks.items()
+                       if ms <= request and phase != "first_mcp_request"),
+                      default=0)
+        idle = max(0, request - startup)
+        return max(self.marks.values(), default=0) - idle
@@ -0,0 +1,75 @@
+import math
+from typing import Optional, Sequence
+
+DEFAULT_TOP_K = 4
+DEFAULT_CONTEXT_TOKENS = 1500
+# 1.0 = rank by relevance only (no MMR), lower values favor diversity
+DEFAULT_MMR_LAMBDA = 1.0
+
+# don't bother with a truncated chunk smaller than this (tokens)
+MIN_PART_TOKENS = 50
+
+def estimate_tokens(text: str) -> int:
+    """ rough token count (~4 chars per token for english text) """
+    return math.ceil(len(text) / 4)
+
+def mmr(query: Sequence[float], candidates: Sequence[Sequence[float]],
+        k: int, lambda_: float = DEFAULT_MMR_LAMBDA) -> list[int]:
+    """
+    Maximal marginal relevance: pick k of the candidates (indices), each
+    time the one most similar to the query and least similar to the ones
+    already picked. lambda_ weighs relevance (1.0) against diversity (0.0).
+    """
+    if lambda_ >= 1.0 or len(candidates) <= 1:
+        return list(range(min(k, len(candidates))))
+    import numpy as np # only needed when MMR is enabled
+    c = _normalize(np.asarray(candidates, dtype=np.float32))
+    relevance = c @ _normalize(np.asarray(query, dtype=np.float32))
+    similarity = c @ c.T
+    picked: list[int] = []
+    left = list(range(len(c)))
+    while left and len(picked) < k:
+        redundancy = (similarity[left][:, picked].max(axis=1) if picked
+                      else np.zeros(len(left)))
+        scores = lambda_ * relevance[left] - (1 - lambda_) * redundancy
+        picked.append(left.pop(int(scores.argmax())))
+    return picked
+
+def pack_context(documents: Sequence[str],
+                 metadatas: Sequence[Optional[dict]],
+                 budget_tokens: int = DEFAULT_CONTEXT_TOKENS) -> str:
+    """
+    Pack retrieved chunks (most relevant first) into at most budget_tokens:
+    duplicates are dropped, the chunk crossing the budget is truncated and
+    the rest is skipped. Packed chunks are ordered by document and position
+    within it, so text of one document reads in its original order.
+    """
+    seen = set()
+    packed = [] # (document rank, chunk index, text)
+    ranks: dict[str, int] = {}
+    left = budget_tokens
+    for text, meta in zip(documents, metadatas):
+        text = text.strip()
+        if not text or text in seen or left < MIN_PART_TOKENS:
+            continue
+        # overlapping chunks: skip the ones already fully contained
+        if any(text in other for _, _, other in packed):
+            continue
+        seen.add(text)
+        meta = meta or {}
+        tokens = estimate_tokens(text)
+        if tokens > left:
+            text = text[:left * 4].rsplit(" ", 1)[0] + " ..."
+            tokens = left
+        left -= tokens
+        source = meta.get("source", "")
+        rank = ranks.setdefault(source, len(ranks))
+        heading = meta.get("heading")
+        label = f"[{source} > {heading}]" if heading else f"[{source}]"
+        packed.append((rank, meta.get("chunk", 0), f"{label}\n{text}"))
+    return "\n\n".join(text for _, _, text in sorted(packed, key=lambda p: p[:2]))
+
+def _normalize(v):
+    import numpy as np
+    norm = np.linalg.norm(v, axis=-1, keepdims=True)
+    return v / np.where(norm == 0, 1, norm)
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING, AsyncIterator, Optional
+from urllib.parse import urlparse
+
+if TYPE_CHECKING:
+    import httpx # imported on first use, see Fetcher.client
+
+# status codes worth another try, everything else >=400 fails right away
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class Fetcher:
+    """
+    Async http layer of the ingestion path.
+    One shared connection pool (httpx.AsyncClient) for all fetches, with
+    a per-host concurrency limit, timeouts and retries with exponential
+    backoff for connection errors and retryable status codes.
+    """
+
+    def __init__(self,
+                 timeout: float = 30.0,
+                 retries: int = 3,
+                 backoff: float = 0.5,
+                 per_host: int = 8,
+                 max_connections: int = 64):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.per_host = per_host
+        self.max_connections = max_connections
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        # created on first use so it binds to the running event loop
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def iter_lines(self, url: str) -> AsyncIterator[str]:
+        """
+        Stream contents of url line by line.
+        Retries happen only before the first line is handed out, a failure
+        mid-stream is raised to the caller.
+        """
+        import httpx
+        host = urlparse(url).netloc
+        limit = self._hosts.setdefault(host, asyncio.Semaphore(self.per_host))
+        started = False
+        async with limit:
+            for attempt in range(self.retries + 1):
+                try:
+                    async with self.client.stream("GET", url) as response:
+                        if response.status_code in RETRY_STATUS and attempt < self.retries:
+                            raise _Retry(f"status {response.status_code}")
+                        response.raise_for_status() # errors if bad response
+                        async for line in response.aiter_lines():
+                            started = True
+                            yield line
+                    print(f"fetch '{url}' - ok")
+                    return
+                except (_Retry, httpx.TransportError) as e:
+                    if started or attempt >= self.retries:
+                        raise
+                    delay = self.backoff * 2 ** attempt
+                    logging.warning(f"fetch '{url}' failed ({e}), retry in {delay}s")
+                    await asyncio.sleep(delay)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def close(self):
+        """ close the connection pool from sync code, in background """
+        if self._client is not None:
+            client, self._client = self._client, None
+            try:
+                asyncio.get_running_loop().create_task(client.aclose())
+            except RuntimeError:
+                pass # no loop anymore, the connections go with the process
+
+class _Retry(Exception):
+    pass
@@ -1,13 +1,39 @@
 # function/func.py
 
 # Function as an MCP Server implementation
+from .coldstart import ColdStart # first, marks the start of the import
 import logging
 
-from mcp.server.fastmcp import FastMCP
-import ollama
 import asyncio
-import chromadb
-import requests
+import collections
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+# FastMCP, ollama and chromadb are heavy to import, they are imported on
+# first use or in background once Function.start is called (see
+# MCPServer.mcp and MCPServer.warm_up)
+if TYPE_CHECKING:
+    from mcp.server.fastmcp import Context
+
+from . import tracing
+from .admission import Admission, read_body, tool_calls
+from .batching import AdaptiveBatcher
+from .coalesce import SingleFlight
+from .cache import (EmbeddingCache, LRUCache, SemanticCache,
+                    content_hash, normalize_prompt,
+                    DEFAULT_CACHE_PATH, DEFAULT_CACHE_SIZE)
+from .context import (DEFAULT_CONTEXT_TOKENS, DEFAULT_MMR_LAMBDA, DEFAULT_TOP_K,
+                      estimate_tokens, mmr, pack_context)
+from .fetch import Fetcher
+from .lexical import BM25Index, looks_like_identifier, reciprocal_rank_fusion
+from .manifest import Manifest, chunk_id
+from .metrics import CONTENT_TYPE, Registry
+from .parser import chunk_data_stream, is_url
+from .preload import Preloader, parse_keep_alive, parse_models
+from .pulls import PullJobs
+from .store import DEFAULT_RECALL_SAMPLE, ChromaStore, NumpyStore, QuantizedStore
 
 def new():
     """ New is the only method that must be implemented by a Function.
@@ -15,14 +41,19 @@ def new():
     """
     return Function()
 
-# Accepts any url link which points to a raw data (*.md/text files etc.)
-# example: https://raw.githubusercontent.com/knative/func/main/docs/function-templates/python.md
-def get_raw_content(url: str) -> str:
-    """ retrieve contents of github raw url as a text """
-    response = requests.get(url)
-    response.raise_for_status() # errors if bad response
-    print(f"fetch '{url}' - ok")
-    return response.text
+async def forward_stream(ctx: "Context", parts, text_of) -> str:
+    """
+    Forward partial tokens of a streamed ollama response to the MCP client as
+    progress notifications (progress = parts so far, message = new text).
+    Returns the whole response text.
+    """
+    out = []
+    async for part in parts:
+        text = text_of(part)
+        if text:
+            out.append(text)
+            await ctx.report_progress(len(out), message=text)
+    return "".join(out)
 
 class MCPServer:
     """
@@ -31,42 +62,667 @@ class MCPServer:
     """
 
     def __init__(self):
-        # Create FastMCP instance with stateless HTTP for Kubernetes deployment
-        self.mcp = FastMCP("MCP-Ollama server", stateless_http=True)
+        # FastMCP instance and its ASGI app, created on first use (see mcp)
+        self._mcp = None
+        self._app = None
+        self._mcp_lock = threading.Lock()
 
-        # Get the ASGI app from FastMCP
-        self._app = self.mcp.streamable_http_app()
+        # async client -> a slow generation doesn't stall other requests
+        self._client = None
+        # ollama server (default: OLLAMA_HOST of the environment, else local)
+        self.ollama_host = ""
+        self.ollama_timeout = None
+        # how long ollama keeps a model in memory after a call (None = its
+        # default) and the models loaded at start, see configure/preload
+        self.keep_alive = None
+        self.preload_models: list[str] = []
+        self.preloader = Preloader(self.load_model)
+        # model pulls run in background, see pull_model/pull_status
+        self.pulls = PullJobs(self.pull)
+        # bounded pool for the unavoidable blocking work (chroma, sqlite)
+        self.io_threads = 8
+        self.executor = ThreadPoolExecutor(self.io_threads,
+                                           thread_name_prefix="mcp-rag-io")
 
-        self.client = ollama.Client()
-
-        #init database stuff
-        self.dbClient = chromadb.Client()
-        self.collection = self.dbClient.create_collection(name="my_collection")
-        # default embedding model
+        #init database stuff (opened on first use, see configure)
+        # in-memory by default, CHROMA_PATH/CHROMA_HOST make the index durable
+        self.vector_store = "chroma"
+        self.vector_dtype = "float32"
+        self.vector_quantization = "int8"
+        self.vector_rerank = 0 # 0 = default of the quantization
+        self.vector_path = ""
+        self.recall_sample = DEFAULT_RECALL_SAMPLE
+        self.db_path = ""
+        self.db_host = ""
+        self.db_port = 8000
+        self.collection_name = "my_collection"
+        self._store = None
+        self._lock = threading.Lock()
+        # default embedding and generation models
         self.embedding_model = "mxbai-embed-large"
-        # call this after self.embedding_model assignment, so its defined
-        self._register_tools()
+        self.model = "llama3.2:3b"
+        # shared across calls so the batch size keeps what it learned
+        self.batcher = AdaptiveBatcher()
+        # shared connection pool for fetching documents
+        self.fetcher = Fetcher()
+        # persistent embedding cache, opened on first use (see configure)
+        self.embed_cache_path = DEFAULT_CACHE_PATH
+        self.embed_cache_size = DEFAULT_CACHE_SIZE
+        self._embed_cache = None
+        # query embeddings of recent prompts, agents retry the same prompts
+        self.query_cache = LRUCache(max_entries=1024, ttl=600)
+        # semantic response cache in front of generation, off by default
+        self.response_cache = None
+        # retrieval: chunks per prompt, their token budget and MMR diversity
+        self.top_k = DEFAULT_TOP_K
+        self.context_tokens = DEFAULT_CONTEXT_TOKENS
+        self.mmr_lambda = DEFAULT_MMR_LAMBDA
+        # vector, lexical (BM25) or hybrid (both, fused) retrieval
+        self.retrieval = "hybrid"
+        self._lexical = None
+        # source -> chunk ids held by the store, for incremental re-ingestion
+        self._manifest = None
+        # identical concurrent retrievals, generations and url ingestions
+        # share one backend call (see coalesce.SingleFlight)
+        self.retrievals = SingleFlight()
+        self.generations = SingleFlight()
+        self.ingestions = SingleFlight()
+        self._init_metrics()
+        # per model limit of the calls to ollama, see configure
+        self.admission = Admission(on_wait=self._observe_wait)
+        # stage level traces of sampled tool calls, off until configured
+        self.tracer = tracing.Tracer()
+
+    def _init_metrics(self):
+        """ metrics of the tools and backends, served on /metrics """
+        self.metrics = Registry()
+        self.requests_in_flight = self.metrics.gauge(
+                "mcp_rag_requests_in_flight", "MCP requests being served")
+        self.tool_calls = self.metrics.counter(
+                "mcp_rag_tool_calls_total", "MCP tool calls by result",
+                ["tool", "status"])
+        self.tool_duration = self.metrics.histogram(
+                "mcp_rag_tool_duration_seconds", "MCP tool call duration", ["tool"])
+        self.tools_in_flight = self.metrics.gauge(
+                "mcp_rag_tool_calls_in_flight", "MCP tool calls running", ["tool"])
+        self.backend_duration = self.metrics.histogram(
+                "mcp_rag_backend_duration_seconds",
+                "Ollama, vector store and keyword index call duration",
+                ["backend", "operation"])
+        self.backend_errors = self.metrics.counter(
+                "mcp_rag_backend_errors_total", "Failed backend calls",
+                ["backend", "operation"])
+        self.metrics.counter(
+                "mcp_rag_cache_hits_total", "Cache hits", ["cache"],
+                callback=lambda: {(name,): c.hits for name, c in self._caches()})
+        self.metrics.counter(
+                "mcp_rag_cache_misses_total", "Cache misses", ["cache"],
+                callback=lambda: {(name,): c.misses for name, c in self._caches()})
+        self.metrics.counter(
+                "mcp_rag_coalesced_calls_total",
+                "Calls served by an identical call already in flight", ["operation"],
+                callback=lambda: {(name,): f.shared for name, f in self._flights()})
+        self.metrics.gauge(
+                "mcp_rag_admission_in_flight", "Ollama calls holding a slot, by model",
+                ["model"], callback=lambda: {(name,): m.in_flight
+                                             for name, m in self.admission.models.items()})
+        self.metrics.gauge(
+                "mcp_rag_admission_queue_depth", "Ollama calls waiting for a slot, by model",
+                ["model"], callback=lambda: {(name,): len(m.waiters)
+                                             for name, m in self.admission.models.items()})
+        self.admission_wait = self.metrics.histogram(
+                "mcp_rag_admission_wait_seconds", "Time waited for an ollama slot",
+                ["model"])
+        self.metrics.counter(
+                "mcp_rag_admission_rejected_total",
+                "Ollama calls turned away (queue_full, deadline, timeout)",
+                ["model", "reason"], callback=lambda: self.admission.rejected)
+        self.metrics.gauge(
+                "mcp_rag_pull_jobs", "Recent model pull jobs by status", ["status"],
+                callback=lambda: collections.Counter(
+                        (job.status,) for job in self.pulls.jobs.values()))
+        self.metrics.gauge(
+                "mcp_rag_model_loaded", "1 once a model preloaded at start is in memory",
+                ["model"], callback=lambda: {(model,): int(model in self.preloader.loaded)
+                                             for model in self.preloader.models})
+        self.metrics.gauge(
+                "mcp_rag_model_preload_seconds", "Time ollama took to load a model at start",
+                ["model"], callback=lambda: {(model,): seconds for model, seconds
+                                             in self.preloader.loaded.items()})
+        self.load_duration = self.metrics.histogram(
+                "mcp_rag_ollama_load_duration_seconds",
+                "Model load time of the ollama calls, as reported by ollama", ["model"])
+        self.metrics.gauge(
+                "mcp_rag_cache_hit_ratio", "Cache hits / lookups since start", ["cache"],
+                callback=lambda: {(name,): c.hits / (c.hits + c.misses)
+                                  for name, c in self._caches() if c.hits + c.misses})
+
+    def _caches(self):
+        """ (name, cache) of the caches in use """
+        caches = [("query_embedding", self.query_cache)]
+        if self._embed_cache is not None:
+            caches.append(("embedding", self._embed_cache))
+        if self.response_cache is not None:
+            caches.append(("response", self.response_cache))
+        return caches
+
+    def _flights(self):
+        """ (operation, SingleFlight) of the coalesced operations """
+        return [("retrieve", self.retrievals), ("generate", self.generations),
+                ("ingest", self.ingestions)]
+
+    def _observe_wait(self, model: str, seconds: float):
+        self.admission_wait.observe(model, value=seconds)
+
+    def _observe_load(self, model: str, response):
+        """ record the model load time reported in an ollama response, in seconds """
+        load_duration = response.get("load_duration")
+        if load_duration is None:
+            return None
+        seconds = load_duration / 1e9
+        self.load_duration.observe(model, value=seconds)
+        return seconds
+
+    def admit(self, tool: str, arguments: dict):
+        """ raise Overloaded if the ollama model the tool call needs has no capacity left """
+        if tool == "call_model":
+            self.admission.check(arguments.get("model") or self.model)
+        elif tool == "embed_document":
+            self.admission.check(arguments.get("model") or self.embedding_model)
+
+    def observe(self, backend: str, operation: str):
+        """ time a backend call (with block) into the backend metrics """
+        return self.backend_duration.time(backend, operation, errors=self.backend_errors)
+
+    @property
+    def mcp(self):
+        """
+        FastMCP server with the tools registered, created on first use:
+        FastMCP takes most of the import time of the Function.
+        """
+        if self._mcp is None:
+            with self._mcp_lock:
+                if self._mcp is None:
+                    from mcp.server.fastmcp import FastMCP
+                    # stateless HTTP for Kubernetes deployment
+                    mcp = FastMCP("MCP-Ollama server", stateless_http=True)
+                    self._register_tools(mcp)
+                    self._app = mcp.streamable_http_app()
+                    self._mcp = mcp
+        return self._mcp
+
+    def _tool(self, mcp):
+        """ mcp.tool() recording calls, failures and duration of the tool """
+        def register(fn):
+            name = fn.__name__
+
+            @functools.wraps(fn)
+            async def tool(*args, **kwargs):
+                self.tools_in_flight.inc(name)
+                start = time.perf_counter()
+                status = "error"
+                try:
+                    # root span, the stages of the tool are traced within
+                    with self.tracer.trace(name) as span:
+                        result = await fn(*args, **kwargs)
+                        # tools report failures as text, see _register_tools
+                        if isinstance(result, str) and result.startswith(("Error", "Oops")):
+                            span.fail(result)
+                        else:
+                            status = "ok"
+                    return result
+                finally:
+                    self.tools_in_flight.dec(name)
+                    self.tool_duration.observe(name, value=time.perf_counter() - start)
+                    self.tool_calls.inc(name, status)
+            return mcp.tool()(tool)
+        return register
+
+    def configure(self, cfg):
+        """
+        Apply Function configuration (environment).
+        - OLLAMA_HOST: url of the ollama server (e.g. a local stand-in).
+        - OLLAMA_TIMEOUT: seconds to wait for an ollama response (default none).
+        - OLLAMA_MAX_CONCURRENCY: calls to ollama at once per model (0 = no
+          limit), the others wait in line.
+        - OLLAMA_MAX_QUEUE: calls waiting per model, more are turned away (429).
+        - OLLAMA_QUEUE_TIMEOUT: seconds a call may wait, calls that would wait
+          longer are turned away (503).
+        - OLLAMA_KEEP_ALIVE: how long ollama keeps a model in memory after a
+          call, seconds or a duration ("30m", "24h"), negative = forever.
+        - OLLAMA_PRELOAD_MODELS: comma separated models loaded when the
+          Function starts, it is ready once they are in memory.
+        - EMBED_CACHE_PATH: sqlite file of the embedding cache, mount a volume
+          here to keep it across pods. Empty string disables the cache.
+        - EMBED_CACHE_SIZE_MB: size cap of the embedding cache.
+        - VECTOR_STORE: chroma (default) or numpy, an in-memory index without
+          the chroma dependency, for small and medium corpora.
+        - VECTOR_DTYPE: float32 or float16 (half the memory), numpy store only.
+        - VECTOR_STORE=quantized: in-memory int8 or binary codes
+          (VECTOR_QUANTIZATION) for the search, the shortlist of
+          VECTOR_RERANK x top k is re-ranked on full precision vectors kept
+          in a file in VECTOR_PATH (memory-mapped). VECTOR_RECALL_SAMPLE of
+          the queries are checked against exact search and the recall logged.
+        - CHROMA_PATH: directory of a persistent chroma store, mount a volume
+          here so a new pod starts with the existing index.
+        - CHROMA_HOST/CHROMA_PORT: chroma server shared by all replicas,
+          takes precedence over CHROMA_PATH.
+        - CHROMA_COLLECTION: collection name, reopened if it exists.
+        - QUERY_CACHE_SIZE/QUERY_CACHE_TTL: entries and lifetime (seconds)
+          of the in-memory prompt embedding cache, size 0 disables it.
+        - SEMANTIC_CACHE_SIZE: enables the semantic response cache of
+          call_model with this many entries (default 0 = disabled).
+        - SEMANTIC_CACHE_TTL: lifetime of cached responses (seconds).
+        - SEMANTIC_CACHE_DISTANCE: max cosine distance between two prompts
+          to be answered by the same cached response.
+        - IO_THREADS: size of the thread pool running blocking store calls.
+        - RAG_TOP_K: chunks retrieved per prompt.
+        - RAG_CONTEXT_TOKENS: token budget of the retrieved context.
+        - RAG_MMR_LAMBDA: below 1.0 the chunks are picked by maximal marginal
+          relevance (0.5 is a good start), 1.0 ranks by similarity only.
+        - RAG_RETRIEVAL: vector, lexical (BM25, no query embedding) or
+          hybrid (default, both fused by reciprocal rank).
+        - TRACE_FILE: traces of the tool calls appended to this file (json lines).
+        - TRACE_OTLP_ENDPOINT (or OTEL_EXPORTER_OTLP_ENDPOINT): OTLP/HTTP
+          collector receiving the traces.
+        - TRACE_SAMPLE_RATE: share of the tool calls traced (default 1.0
+          when an exporter is set).
+        """
+        host = cfg.get("OLLAMA_HOST", self.ollama_host)
+        timeout = float(cfg["OLLAMA_TIMEOUT"]) if cfg.get("OLLAMA_TIMEOUT") else self.ollama_timeout
+        if (host, timeout) != (self.ollama_host, self.ollama_timeout):
+            self.ollama_host, self.ollama_timeout = host, timeout
+            self._client = None # recreated with the new settings on first use
+        self.admission.concurrency = int(cfg.get("OLLAMA_MAX_CONCURRENCY",
+                                                 self.admission.concurrency))
+        self.admission.max_queue = int(cfg.get("OLLAMA_MAX_QUEUE", self.admission.max_queue))
+        self.admission.timeout = float(cfg.get("OLLAMA_QUEUE_TIMEOUT", self.admission.timeout))
+        if "OLLAMA_KEEP_ALIVE" in cfg:
+            self.keep_alive = parse_keep_alive(cfg["OLLAMA_KEEP_ALIVE"])
+        if "OLLAMA_PRELOAD_MODELS" in cfg:
+            self.preload_models = parse_models(cfg["OLLAMA_PRELOAD_MODELS"])
+        self.embed_cache_path = cfg.get("EMBED_CACHE_PATH", self.embed_cache_path)
+        if "EMBED_CACHE_SIZE_MB" in cfg:
+            self.embed_cache_size = int(cfg["EMBED_CACHE_SIZE_MB"]) * 1024 * 1024
+        self.vector_store = cfg.get("VECTOR_STORE", self.vector_store)
+        if self.vector_store not in ("chroma", "numpy", "quantized"):
+            raise ValueError(f"unknown VECTOR_STORE: {self.vector_store}")
+        self.vector_dtype = cfg.get("VECTOR_DTYPE", self.vector_dtype)
+        self.vector_quantization = cfg.get("VECTOR_QUANTIZATION", self.vector_quantization)
+        self.vector_rerank = int(cfg.get("VECTOR_RERANK", self.vector_rerank))
+        self.vector_path = cfg.get("VECTOR_PATH", self.vector_path)
+        self.recall_sample = float(cfg.get("VECTOR_RECALL_SAMPLE", self.recall_sample))
+        self.db_path = cfg.get("CHROMA_PATH", self.db_path)
+        self.db_host = cfg.get("CHROMA_HOST", self.db_host)
+        self.db_port = int(cfg.get("CHROMA_PORT", self.db_port))
+        self.collection_name = cfg.get("CHROMA_COLLECTION", self.collection_name)
+        self.query_cache = LRUCache(
+                max_entries=int(cfg.get("QUERY_CACHE_SIZE", self.query_cache.max_entries)),
+                ttl=float(cfg.get("QUERY_CACHE_TTL", self.query_cache.ttl)))
+        if int(cfg.get("SEMANTIC_CACHE_SIZE", 0)) > 0:
+            self.response_cache = SemanticCache(
+                    max_entries=int(cfg["SEMANTIC_CACHE_SIZE"]),
+                    ttl=float(cfg.get("SEMANTIC_CACHE_TTL", 3600)),
+                    max_distance=float(cfg.get("SEMANTIC_CACHE_DISTANCE", 0.05)))
+        if int(cfg.get("IO_THREADS", self.io_threads)) != self.io_threads:
+            self.io_threads = int(cfg["IO_THREADS"])
+            self.executor.shutdown(wait=False)
+            self.executor = ThreadPoolExecutor(self.io_threads,
+                                               thread_name_prefix="mcp-rag-io")
+        self.top_k = int(cfg.get("RAG_TOP_K", self.top_k))
+        self.context_tokens = int(cfg.get("RAG_CONTEXT_TOKENS", self.context_tokens))
+        self.mmr_lambda = float(cfg.get("RAG_MMR_LAMBDA", self.mmr_lambda))
+        self.retrieval = cfg.get("RAG_RETRIEVAL", self.retrieval)
+        if self.retrieval not in ("vector", "lexical", "hybrid"):
+            raise ValueError(f"unknown RAG_RETRIEVAL: {self.retrieval}")
+        if self.retrieval == "vector":
+            # not updated any more, rebuilt if the keyword search is enabled again
+            self._lexical = None
+        if any(key.startswith("TRACE_") or key == "OTEL_EXPORTER_OTLP_ENDPOINT"
+               for key in cfg):
+            self.tracer.close()
+            self.tracer = tracing.from_config(cfg, "mcp-rag")
+
+    @property
+    def embed_cache(self):
+        if self._embed_cache is None and self.embed_cache_path:
+            with self._lock:
+                if self._embed_cache is None:
+                    self._embed_cache = EmbeddingCache(self.embed_cache_path,
+                                                       self.embed_cache_size)
+        return self._embed_cache
+
+    @property
+    def client(self):
+        """ ollama.AsyncClient, created on first use """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import ollama
+                    self._client = ollama.AsyncClient(host=self.ollama_host or None,
+                                                      timeout=self.ollama_timeout)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @property
+    def store(self):
+        """
+        Vector store, opened on first use. An existing chroma collection is
+        reopened (get_or_create) so nothing has to be embedded again after a
+        restart/scale from zero.
+        """
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    if self.vector_store == "numpy":
+                        self._store = NumpyStore(dtype=self.vector_dtype)
+                    elif self.vector_store == "quantized":
+                        self._store = QuantizedStore(
+                                self.vector_quantization, path=self.vector_path,
+                                rerank=self.vector_rerank or None,
+                                recall_sample=self.recall_sample)
+                    else:
+                        self._store = ChromaStore.open(
+                                self.collection_name, path=self.db_path,
+                                host=self.db_host, port=self.db_port)
+                    logging.info(f"{self.vector_store} store '{self.collection_name}' "
+                                 f"ready ({self._store.count()} documents)")
+        return self._store
+
+    @property
+    def lexical(self):
+        """
+        BM25 index of the chunks, kept in memory only: on first use it is
+        rebuilt from what the (possibly persistent) store holds.
+        Blocking, use from the io threads.
+        """
+        if self._lexical is None:
+            self._load_indexes()
+        return self._lexical
+
+    @property
+    def manifest(self):
+        """
+        Manifest (source -> chunk ids) of the store, rebuilt from what it
+        holds on first use. Blocking, use from the io threads.
+        """
+        if self._manifest is None:
+            self._load_indexes()
+        return self._manifest
+
+    def _load_indexes(self):
+        """ build the missing in-memory indexes from one read of the store """
+        store = self.store
+        with self._lock:
+            # the keyword index is not kept up to date in vector mode
+            lexical = self.retrieval != "vector"
+            if self._manifest is not None and (self._lexical is not None or not lexical):
+                return
+            stored = store.get()
+            if self._manifest is None:
+                self._manifest = Manifest.from_chunks(stored.ids, stored.metadatas)
+            if self._lexical is None and lexical:
+                index = BM25Index()
+                index.add(stored.ids, stored.documents, stored.metadatas)
+                self._lexical = index
+
+    def warm_up(self):
+        """
+        Import and construct the heavy dependencies (ollama client, vector
+        store, embedding cache) in the background, so the pod is ready before
+        they are and the first tool call does not pay for them.
+        """
+        def warm():
+            try:
+                self.client
+                self.store
+                if self.retrieval != "vector":
+                    self.lexical
+                self.embed_cache
+            except Exception as e:
+                logging.warning(f"warm-up failed, retried on first use: {e}")
+        return asyncio.get_running_loop().run_in_executor(self.executor, warm)
+
+    def preload(self):
+        """ load preload_models into ollama in background, see Function.ready """
+        self.preloader.start(self.preload_models)
+
+    async def load_model(self, model: str):
+        """
+        Load model into ollama's memory (a call without input), kept there
+        for keep_alive. Returns the seconds ollama took to load it.
+        """
+        import ollama
+        with self.observe("ollama", "load"):
+            try:
+                response = await self.client.generate(
+                        model=model, prompt="", keep_alive=self.keep_alive)
+            except ollama.ResponseError:
+                # embedding models don't generate
+                response = await self.client.embed(
+                        model=model, input="", keep_alive=self.keep_alive)
+        return self._observe_load(model, response)
+
+    async def pull(self, model: str):
+        """ progress messages of pulling model into ollama """
+        with self.observe("ollama", "pull"):
+            async for progress in await self.client.pull(model, stream=True):
+                yield progress
+
+    async def run_blocking(self, fn, *args, **kwargs):
+        """ run blocking fn in the bounded io thread pool """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+                self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def embed(self, model: str, texts: list[str]) -> list[list[float]]:
+        """
+        Embed texts via ollama, vectors of already seen content are served
+        from the embedding cache.
+        """
+        async def embed_fn(inputs):
+            async with self.admission.slot(model):
+                with self.batcher.timed(len(inputs)), self.observe("ollama", "embed"):
+                    response = await self.client.embed(model=model,input=inputs,
+                                                       keep_alive=self.keep_alive)
+            self._observe_load(model, response)
+            return response["embeddings"]
+
+        with tracing.span("embed", model=model, texts=len(texts)) as span:
+            cache = await self.run_blocking(lambda: self.embed_cache)
+            if cache is None:
+                missing = list(range(len(texts)))
+                vectors = await embed_fn(texts)
+            else:
+                vectors = await self.run_blocking(cache.get_many, model, texts)
+                missing = [i for i, v in enumerate(vectors) if v is None]
+                if missing:
+                    new = await embed_fn([texts[i] for i in missing])
+                    await self.run_blocking(
+                            cache.put_many, model, [texts[i] for i in missing], new)
+                    for i, v in zip(missing, new):
+                        vectors[i] = v
+            if span.recording:
+                # sizes of what was sent to ollama, cached texts cost nothing
+                span.set(cached=len(texts) - len(missing),
+                         bytes=sum(len(texts[i].encode()) for i in missing),
+                         tokens=sum(estimate_tokens(texts[i]) for i in missing))
+        return vectors # pyright: ignore[reportReturnType]
 
-    def _register_tools(self):
+    async def embed_query(self, model: str, prompt: str) -> list[list[float]]:
+        """ embed a prompt, repeated prompts are served from query_cache """
+        key = (model, normalize_prompt(prompt))
+        with tracing.span("embed", model=model, texts=1) as span:
+            embeddings = self.query_cache.get(key)
+            span.set(cached=int(embeddings is not None))
+            if embeddings is None:
+                span.set(bytes=len(prompt.encode()), tokens=estimate_tokens(prompt))
+                async with self.admission.slot(model):
+                    with self.observe("ollama", "embed"):
+                        response = await self.client.embed(model=model,input=prompt,
+                                                           keep_alive=self.keep_alive)
+                self._observe_load(model, response)
+                embeddings = response["embeddings"]
+                self.query_cache.put(key, embeddings)
+        return embeddings
+
+    def close(self):
+        if self._embed_cache is not None:
+            self._embed_cache.close()
+            self._embed_cache = None
+        if self._store is not None:
+            self._store.close()
+        self.fetcher.close()
+        self.preloader.stop()
+        self.pulls.stop()
+        self.tracer.close()
+        self.executor.shutdown(wait=False)
+
+    async def retrieve(self, prompt: str, embed_model: str):
+        """
+        top_k chunks most relevant to the prompt, packed as context.
+        Returns (context, query embedding), the embedding is None if the
+        vector search was skipped: in lexical mode, or in hybrid mode for an
+        identifier (flag, file name, key) that the lexical index found.
+        Concurrent retrievals for the same prompt share one.
+        """
+        key = (embed_model, normalize_prompt(prompt))
+        return await self.retrievals.do(key, self._retrieve, prompt, embed_model)
+
+    async def _retrieve(self, prompt: str, embed_model: str):
+        n = self.top_k * 3 if self.mmr_lambda < 1.0 else self.top_k
+        rankings = []
+        chunks = {} # id -> (document, metadata)
+        hits = []
+        if self.retrieval != "vector":
+            def search():
+                # chunks are added/removed meanwhile by the io threads
+                lexical = self.lexical
+                with lexical.lock:
+                    hits = lexical.search(prompt, self.top_k)
+                    return hits, {doc_id: lexical.documents[doc_id] for doc_id, _ in hits}
+            with self.observe("bm25", "search"), tracing.span("lexical_search") as span:
+                hits, found = await self.run_blocking(search)
+                span.set(hits=len(hits))
+            rankings.append([doc_id for doc_id, _ in hits])
+            chunks.update(found)
+
+        query_embedding = None
+        if self.retrieval == "vector" or (
+                self.retrieval == "hybrid" and not (hits and looks_like_identifier(prompt))):
+            query_embedding = (await self.embed_query(embed_model, prompt))[0]
+            # MMR picks from a larger candidate pool, it needs their vectors
+            with self.observe(self.vector_store, "query"), \
+                    tracing.span("vector_query", store=self.vector_store, n=n) as span:
+                # the store opens on first use, not in the event loop
+                results = await self.run_blocking(
+                        lambda: self.store.query(query_embedding, n,
+                                                 with_embeddings=n > self.top_k))
+                span.set(results=len(results.ids))
+            ids = results.ids
+            if n > self.top_k and ids:
+                picked = mmr(query_embedding, results.embeddings,
+                             self.top_k, self.mmr_lambda)
+            else:
+                picked = range(len(ids))
+            rankings.append([ids[i] for i in picked])
+            chunks.update((ids[i], (results.documents[i], results.metadatas[i]))
+                          for i in picked)
+
+        with tracing.span("prompt_assembly") as span:
+            fused = reciprocal_rank_fusion(rankings)[:self.top_k]
+            data = pack_context([chunks[doc_id][0] for doc_id in fused],
+                                [chunks[doc_id][1] for doc_id in fused],
+                                self.context_tokens)
+            if span.recording:
+                span.set(chunks=len(fused), bytes=len(data.encode()),
+                         tokens=estimate_tokens(data))
+        return data, query_embedding
+
+    async def generate(self, model: str, prompt: str):
+        """ generate (not streamed), identical concurrent prompts share one """
+        async def generate_fn():
+            async with self.admission.slot(model):
+                with self.observe("ollama", "generate"):
+                    response = await self.client.generate(
+                            model=model, prompt=prompt, keep_alive=self.keep_alive)
+            self._observe_load(model, response)
+            return response
+        return await self.generations.do((model, prompt), generate_fn)
+
+    async def _upsert_batch(self, model: str, batch: list):
+        """ embed a batch of (id, source, Chunk) and bulk upsert it """
+        ids = [doc_id for doc_id, _, _ in batch]
+        texts = [chunk.text for _, _, chunk in batch]
+        metadatas = self._metadatas(batch)
+        embeddings = await self.embed(model, texts)
+        with self.observe(self.vector_store, "upsert"), \
+                tracing.span("vector_upsert", store=self.vector_store, chunks=len(ids)):
+            await self.run_blocking(
+                    lambda: self.store.upsert(ids, embeddings, texts, metadatas))
+        if self.retrieval != "vector":
+            await self.run_blocking(
+                    lambda: self.lexical.add(ids, texts, metadatas))
+        for doc_id, source, chunk in batch:
+            self.manifest.add(source, doc_id, chunk.index)
+
+    async def _reindex(self, batch: list):
+        """
+        record the new position of moved chunks, a batch of (id, source,
+        Chunk): their content didn't change, they are not embedded again
+        """
+        ids = [doc_id for doc_id, _, _ in batch]
+        metadatas = self._metadatas(batch)
+        with self.observe(self.vector_store, "update"):
+            await self.run_blocking(lambda: self.store.update_metadata(ids, metadatas))
+        if self.retrieval != "vector":
+            await self.run_blocking(lambda: self.lexical.update_metadata(ids, metadatas))
+        for doc_id, source, chunk in batch:
+            self.manifest.add(source, doc_id, chunk.index)
+
+    @staticmethod
+    def _metadatas(batch: list) -> list[dict]:
+        return [{
+            "source": source,
+            "heading": chunk.heading,
+            "chunk": chunk.index,
+            } for _, source, chunk in batch]
+
+    async def _delete(self, source: str, ids: list):
+        """ remove chunks of source from the store and the indexes """
+        with self.observe(self.vector_store, "delete"), \
+                tracing.span("vector_delete", store=self.vector_store, chunks=len(ids)):
+            await self.run_blocking(lambda: self.store.delete(ids))
+        if self.retrieval != "vector":
+            await self.run_blocking(lambda: self.lexical.remove(ids))
+        self.manifest.remove(source, ids)
+
+    def _register_tools(self, mcp):
         """Register MCP tools."""
-        @self.mcp.tool()
-        def list_models():
+        from mcp.server.fastmcp import Context
+
+        @self._tool(mcp)
+        async def list_models():
             """List all models currently available on the Ollama server"""
             try:
-                models = self.client.list()
+                with self.observe("ollama", "list"):
+                    models = await self.client.list()
             except Exception as e:
                 return f"Oops, failed to list models because: {str(e)}"
             #return [model['name'] for model in models['models']]
             return [model for model in models]
 
         default_embedding_model = self.embedding_model
-        @self.mcp.tool()
-        def embed_document(data:list[str],model:str = default_embedding_model) -> str:
+        @self._tool(mcp)
+        async def embed_document(data:list[str],model:str = default_embedding_model) -> str:
             """
             RAG (Retrieval-augmented generation) tool.
-            Embeds documents provided in data.
+            Embeds documents provided in data, split into chunks.
             Arguments:
-            - data: expected to be of type str|list.
+            - data: list of urls (raw text/markdown) and/or text strings.
             - model: embedding model to use, examples below.
 
             # example embedding models:
@@ -74,76 +730,182 @@ class MCPServer:
             # nomic-embed-text - 137M
             # all-minilm - 23M
             """
-            count = 0
+            stats: dict[str, list] = {} # source -> [documents, chunks, changed, removed]
+
+            # a url another call is ingesting right now is not fetched again,
+            # this call waits for that one and reports its outcome
+            urls = list(dict.fromkeys(
+                    item for item in data if isinstance(item, str) and is_url(item)))
+            joined, claimed = self.ingestions.claim(urls)
+            items = [item for item in data
+                     if not (isinstance(item, str) and item in urls)] + claimed
 
-            ############ TODO -- import im a separate file
-            # documents generator
-            #documents_gen = parse_data_generator(data)
             #### 1) GENERATE
-            # generate vector embeddings via embedding model
-            #for i, d in enumerate(documents_gen):
-            #    response = ollama.embed(model=model,input=d)
-            #    embeddings = response["embeddings"]
-            #    self.collection.add(
-            #            ids=[str(i)],
-            #            embeddings=embeddings,
-            #            documents=[d]
-            #            )
-            #    count += 1
-
-            # for simplicity (until the above is resolved, this accecpts only URLs)
-            for i, d in enumerate(data):
-                response = ollama.embed(model=model,input=get_raw_content(d))
-                embeddings = response["embeddings"]
-                self.collection.add(
-                        ids=[str(i)],
-                        embeddings=embeddings,
-                        documents=[d]
-                        )
-                count += 1
-            return f"ok - Embedded {count} documents"
-
-        @self.mcp.tool()
-        def pull_model(model: str) -> str:
-            """Download and install an Ollama model into the running server"""
+            # documents are split into chunks (streamed, one at a time) and
+            # each chunk gets its own vector so retrieval returns only the
+            # relevant section instead of the whole page.
+            # All urls are fetched concurrently, chunks are grouped into
+            # batches -> one embed request and one bulk upsert per batch.
+            # Chunk ids are derived from source and content: chunks the store
+            # already holds are skipped, a refreshed url only costs its diff.
             try:
-                _ = self.client.pull(model)
-            except Exception as e:
-                return f"Error occurred during pulling of a model: {str(e)}"
-            return f"Success! model {model} is available"
-
-        @self.mcp.tool()
-        def call_model(prompt: str,
-                       model: str = "llama3.2:3b",
-                       embed_model: str = self.embedding_model) -> str:
-            """Send a prompt to a model being served on ollama server"""
+                manifest = await self.run_blocking(lambda: self.manifest)
+                seen: dict[str, set] = {} # source -> chunk ids of this call
+                chunk_stream = chunk_data_stream(items, self.fetcher)
+                weight = lambda item: len(item[1].text)
+                async for batch in self.batcher.abatches(chunk_stream, weight):
+                    todo, moved = [], []
+                    for source, chunk in batch:
+                        counts = stats.setdefault(source, [0, 0, 0, 0])
+                        counts[0] += chunk.index == 0
+                        counts[1] += 1
+                        doc_id = chunk_id(source, chunk.text)
+                        ids = seen.setdefault(source, set())
+                        if doc_id in ids:
+                            continue # repeated within the source
+                        ids.add(doc_id)
+                        stored = manifest.chunks(source).get(doc_id)
+                        if stored is None:
+                            todo.append((doc_id, source, chunk))
+                            counts[2] += 1
+                        elif stored != chunk.index:
+                            moved.append((doc_id, source, chunk))
+                    if todo:
+                        await self._upsert_batch(model, todo)
+                    if moved:
+                        await self._reindex(moved)
+                # chunks no longer in a re-ingested url are stale (all of
+                # them if the page is empty now), raw texts only ever add
+                # (they have no identity besides their content)
+                for source in claimed:
+                    ids = seen.get(source, set())
+                    stale = [doc_id for doc_id in manifest.chunks(source) if doc_id not in ids]
+                    if stale:
+                        await self._delete(source, stale)
+                        stats.setdefault(source, [0, 0, 0, 0])[3] += len(stale)
+            except BaseException as e:
+                for url in claimed:
+                    self.ingestions.resolve(url, error=e)
+                raise
+            for url in claimed:
+                self.ingestions.resolve(url, stats.get(url, [0, 0, 0, 0]))
+            updated = any(counts[2] or counts[3] for counts in stats.values())
+            for url, flight in joined.items():
+                stats[url] = await asyncio.shield(flight)
+
+            count, chunks, changed, removed = (
+                    sum(counts[i] for counts in stats.values()) for i in range(4))
+            # cached answers may be based on outdated context now
+            # (a joined ingestion cleared them already)
+            if updated and self.response_cache is not None:
+                self.response_cache.clear()
+            tracing.current_span().set(documents=count, chunks=chunks,
+                                       changed=changed, removed=removed)
+            return (f"ok - Embedded {count} documents ({chunks} chunks, "
+                    f"{changed} new or changed, {removed} removed)")
+
+        @self._tool(mcp)
+        async def pull_model(model: str) -> str:
+            """
+            Download and install an Ollama model into the running server.
+            The pull runs in background, this returns its job id: see
+            pull_status for the progress. A model already being pulled is
+            not pulled twice, the id of the running job is returned.
+            """
+            job, started = self.pulls.start(model)
+            if not started:
+                return f"Model {model} is already being pulled, job id: {job.id}"
+            return f"Pulling model {model} in background, job id: {job.id}"
+
+        @self._tool(mcp)
+        async def pull_status(job_id: str = ""):
+            """
+            Progress of a pull_model job: status (pulling, success, error or
+            cancelled) and bytes downloaded of the model's layers.
+            Without job_id, the status of all the recent pull jobs.
+            """
+            if not job_id:
+                return [job.to_dict() for job in self.pulls.jobs.values()] or "No pull jobs"
+            job = self.pulls.get(job_id)
+            if job is None:
+                # jobs live in the replica that started them
+                return f"Oops, no pull job {job_id} on this server"
+            return job.to_dict()
+
+        @self._tool(mcp)
+        async def call_model(ctx: Context, prompt: str,
+                             model: str = self.model,
+                             embed_model: str = self.embedding_model,
+                             stream: bool = False) -> str:
+            """
+            Send a prompt to a model being served on ollama server.
+            With stream=True partial tokens are sent as progress notifications
+            while the answer is being generated (request with a progress token).
+            """
             #### 2) RETRIEVE
             # we embed the prompt but dont save it into db, then we retrieve
-            # the most relevant document (most similar vectors)
+            # the top_k most relevant chunks (most similar vectors and/or
+            # best BM25 matches) and pack them into the context budget
+            trace = tracing.current_span()
+            trace.set(model=model, stream=stream)
             try:
-                response = ollama.embed(
-                        model=embed_model,
-                        input=prompt
-                        )
-                results = self.collection.query(
-                        query_embeddings=response["embeddings"],
-                        n_results=1
-                        )
-                data = results['documents'][0][0]
+                data, query_embedding = await self.retrieve(prompt, embed_model)
+
+                # a paraphrase of a recent prompt with the same context
+                # gets the cached answer, generation is the expensive part
+                context_key = content_hash(data)
+                cache_model = f"{model}/{embed_model}"
+                if self.response_cache is not None and query_embedding is not None:
+                    cached = self.response_cache.get(
+                            cache_model, query_embedding, context_key)
+                    trace.set(response_cache=cached is not None)
+                    if cached is not None:
+                        return cached
 
             #### 3) GENERATE
             # generate answer given a combination of prompt and data retrieved
-                output = ollama.generate(
-                        model=model,
-                        prompt=f'Using data: {data}, respond to prompt: {prompt}'
-                        )
-                print(output)
+                full_prompt = f'Using data: {data}, respond to prompt: {prompt}'
+                with tracing.span("generate", model=model) as span:
+                    if span.recording:
+                        span.set(prompt_bytes=len(full_prompt.encode()),
+                                 prompt_tokens=estimate_tokens(full_prompt))
+                    if stream:
+                        # progress goes to this caller, streams are not shared
+                        async with self.admission.slot(model):
+                            with self.observe("ollama", "generate"):
+                                parts = await self.client.generate(
+                                        model=model,
+                                        prompt=full_prompt,
+                                        stream=True,
+                                        keep_alive=self.keep_alive
+                                        )
+                                answer = await forward_stream(
+                                        ctx, parts, lambda p: p['response'])
+                    else:
+                        output = await self.generate(model, full_prompt)
+                        print(output)
+                        answer = output['response']
+                    if span.recording:
+                        span.set(response_bytes=len(answer.encode()),
+                                 response_tokens=estimate_tokens(answer))
+                    if span.recording and not stream:
+                        # counted by the model, more accurate than the estimates
+                        if output.get('prompt_eval_count'):
+                            span.set(prompt_tokens=output['prompt_eval_count'])
+                        if output.get('eval_count'):
+                            span.set(response_tokens=output['eval_count'])
+                if self.response_cache is not None and query_embedding is not None:
+                    self.response_cache.put(cache_model, query_embedding,
+                                            context_key, answer)
             except Exception as e:
                 return f"Error occurred during calling the model: {str(e)}"
-            return output['response']
+            return answer
 
     async def handle(self, scope, receive, send):
         """Handle ASGI requests - both lifespan and HTTP."""
+        if self._app is None:
+            # not in the event loop, it would stall the other requests
+            await self.run_blocking(lambda: self.mcp)
         await self._app(scope, receive, send)
 
 class Function:
@@ -152,8 +914,15 @@ class Function:
         performed. See the start method for a startup hook which includes
         configuration.
         """
+        self.cold_start = ColdStart()
+        self.cold_start.mark("import")
         self.mcp_server = MCPServer()
-        self._mcp_initialized = False
+        self.cold_start.mark("new")
+        # MCP lifespan is started exactly once, see start()/_start_mcp
+        self._mcp_task = None
+        self._mcp_ready = None
+        self._mcp_stop = None
+        self._mcp_error = None
 
     async def handle(self, scope, receive, send):
         """
@@ -161,20 +930,62 @@ class Function:
         This handles all the incoming requests.
         """
 
-        # Initialize MCP server on first request
-        if not self._mcp_initialized:
-            await self._initialize_mcp()
-
         # Route MCP requests
-        if scope['path'].startswith('/mcp'):
-            await self.mcp_server.handle(scope, receive, send)
+        if scope.get('path', '').startswith('/mcp'):
+            self.cold_start.mark("first_mcp_request")
+            # started by start(), waits only while it is still coming up
+            await self._wait_mcp()
+            if scope.get('method') == 'POST' and self.mcp_server.admission.enabled:
+                # fail fast when a tool call's model has no capacity left:
+                # Overloaded is answered with 429/503 by the middleware
+                body, receive = await read_body(receive)
+                for tool, arguments in tool_calls(body):
+                    self.mcp_server.admit(tool, arguments)
+            self.mcp_server.requests_in_flight.inc()
+            try:
+                await self.mcp_server.handle(scope, receive, send)
+            finally:
+                self.mcp_server.requests_in_flight.dec()
+            if not self.cold_start.reported:
+                self.cold_start.mark("first_mcp_response")
+                self.cold_start.report()
+            return
+
+        if scope.get('path') == '/metrics':
+            await self._send_metrics(send)
             return
 
         # Default response for non-MCP requests
         await self._send_default_response(send)
 
-    async def _initialize_mcp(self):
-        """Initialize the MCP server by sending lifespan startup event."""
+    def metrics(self) -> str:
+        """ metrics in the Prometheus text format """
+        return self.mcp_server.metrics.render()
+
+    async def _send_metrics(self, send):
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [[b'content-type', CONTENT_TYPE.encode()]],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': self.metrics().encode(),
+        })
+
+    def _start_mcp(self):
+        """
+        Start the MCP server lifespan (session manager) in background.
+        Runs exactly once, needs a running event loop.
+        """
+        if self._mcp_task is not None:
+            return
+        self._mcp_ready = asyncio.Event()
+        self._mcp_stop = asyncio.Event()
+        self._mcp_task = asyncio.create_task(self._run_mcp_lifespan())
+
+    async def _run_mcp_lifespan(self):
+        """Drive the MCP server lifespan: startup now, shutdown on stop()."""
         lifespan_scope = {'type': 'lifespan', 'asgi': {'version': '3.0'}}
         startup_sent = False
 
@@ -183,21 +994,36 @@ class Function:
             if not startup_sent:
                 startup_sent = True
                 return {'type': 'lifespan.startup'}
-            await asyncio.Event().wait()  # Wait forever for shutdown
+            await self._mcp_stop.wait()
+            return {'type': 'lifespan.shutdown'}
 
         async def lifespan_send(message):
             if message['type'] == 'lifespan.startup.complete':
-                self._mcp_initialized = True
+                self.cold_start.mark("mcp_ready")
+                self._mcp_ready.set()
             elif message['type'] == 'lifespan.startup.failed':
                 logging.error(f"MCP startup failed: {message}")
+                self._mcp_error = message.get('message') or "startup failed"
 
-        # Start lifespan in background
-        asyncio.create_task(self.mcp_server.handle(
-            lifespan_scope, lifespan_receive, lifespan_send
-        ))
+        try:
+            await self.mcp_server.handle(
+                lifespan_scope, lifespan_receive, lifespan_send
+            )
+        except Exception as e:
+            logging.error(f"MCP lifespan failed: {e}")
+            self._mcp_error = self._mcp_error or str(e)
+        finally:
+            # never leave requests waiting for a server that is not coming
+            if not self._mcp_ready.is_set():
+                self._mcp_error = self._mcp_error or "lifespan exited"
+                self._mcp_ready.set()
 
-        # Brief wait for startup completion
-        await asyncio.sleep(0.1)
+    async def _wait_mcp(self):
+        """Wait until the MCP server is up (starting it if start() did not)."""
+        self._start_mcp()
+        await self._mcp_ready.wait()
+        if self._mcp_error:
+            raise RuntimeError(f"MCP server failed to start: {self._mcp_error}")
 
     async def _send_default_response(self, send):
         """
@@ -216,12 +1042,32 @@ class Function:
 
     def start(self, cfg):
         logging.info("Function starting")
+        self.cold_start.mark("start")
+        self.cold_start.budget_ms = float(
+                cfg.get("COLD_START_BUDGET_MS", self.cold_start.budget_ms))
+        self.mcp_server.configure(cfg)
+        # MCP server is started here, not on the first request
+        self._start_mcp()
+        # heavy dependencies load in background, readiness doesn't wait
+        warm_up = self.mcp_server.warm_up()
+        warm_up.add_done_callback(lambda _: self.cold_start.mark("warm_up"))
+        # ollama loads the models meanwhile, readiness waits for them
+        self.mcp_server.preload()
 
     def stop(self):
         logging.info("Function stopping")
+        if self._mcp_stop is not None:
+            self._mcp_stop.set()
+        self.mcp_server.close()
 
     def alive(self):
         return True, "Alive"
 
     def ready(self):
+        if self._mcp_ready is None or not self._mcp_ready.is_set():
+            return False, "MCP server starting"
+        if self._mcp_error:
+            return False, f"MCP server failed to start: {self._mcp_error}"
+        if not self.mcp_server.preloader.done:
+            return False, self.mcp_server.preloader.status()
         return True, "Ready"
@@ -0,0 +1,126 @@
+import heapq
+import math
+import re
+import threading
+from typing import Iterable, Optional, Sequence
+
+# BM25 parameters, the usual defaults
+K1 = 1.2
+B = 0.75
+# reciprocal rank fusion constant, dampens the weight of the top ranks
+RRF_K = 60
+
+# words, keeping identifiers like --build-arg, func.yaml or run_id together
+TOKEN_RE = re.compile(r"\w(?:[\w\-./:]*\w)?")
+SPLIT_RE = re.compile(r"[\-./:_]+")
+IDENTIFIER_RE = re.compile(r"-{0,2}\w+(?:[\-./:_]\w+)+|-{1,2}\w+|\w*[a-z][A-Z]\w*")
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercased terms of text. Identifiers are kept whole and also split into
+    their parts, so `func.yaml` matches both `func.yaml` and `yaml`.
+    """
+    terms = []
+    for token in TOKEN_RE.findall(text.lower()):
+        terms.append(token)
+        parts = SPLIT_RE.split(token)
+        if len(parts) > 1:
+            terms.extend(p for p in parts if p)
+    return terms
+
+def looks_like_identifier(query: str) -> bool:
+    """ a lone flag, file name, key or camelCase name rather than a question """
+    query = query.strip().strip("`'\"")
+    return bool(query) and IDENTIFIER_RE.fullmatch(query) is not None
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = RRF_K) -> list[str]:
+    """ fuse ranked id lists, ids ranked high in several lists win """
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
+
+class BM25Index:
+    """
+    In-memory inverted index with BM25 scoring, updated incrementally as
+    chunks are added. Keeps the chunk text and metadata, so lexical hits can
+    be packed into the context without going to the vector store.
+    Thread safe: chunks are added from the io threads while it is searched.
+    """
+
+    def __init__(self, k1: float = K1, b: float = B):
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, dict[str, int]] = {} # term -> {id: tf}
+        self.lengths: dict[str, int] = {}
+        self.documents: dict[str, tuple[str, dict]] = {}
+        self.total_length = 0
+        # held by add/remove/search, hold it to read documents consistently
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, ids: Sequence[str], texts: Sequence[str],
+            metadatas: Optional[Sequence[dict]] = None):
+        """ index chunks, an id indexed before is replaced """
+        with self.lock:
+            self._add(ids, texts, metadatas)
+
+    def _add(self, ids, texts, metadatas):
+        for i, (doc_id, text) in enumerate(zip(ids, texts)):
+            if doc_id in self.documents:
+                self._remove([doc_id])
+            terms = tokenize(text)
+            for term in terms:
+                postings = self.postings.setdefault(term, {})
+                postings[doc_id] = postings.get(doc_id, 0) + 1
+            self.lengths[doc_id] = len(terms)
+            self.total_length += len(terms)
+            self.documents[doc_id] = (text, metadatas[i] if metadatas else {})
+
+    def remove(self, ids: Iterable[str]):
+        with self.lock:
+            self._remove(ids)
+
+    def _remove(self, ids):
+        for doc_id in ids:
+            if doc_id not in self.documents:
+                continue
+            text, _ = self.documents.pop(doc_id)
+            for term in set(tokenize(text)):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self.postings[term]
+            self.total_length -= self.lengths.pop(doc_id)
+
+    def update_metadata(self, ids: Sequence[str], metadatas: Sequence[dict]):
+        """ replace the metadata of indexed chunks, unknown ids are ignored """
+        with self.lock:
+            for doc_id, meta in zip(ids, metadatas):
+                if doc_id in self.documents:
+                    self.documents[doc_id] = (self.documents[doc_id][0], meta)
+
+    def search(self, query: str, k: int) -> list[tuple[str, float]]:
+        """ top k (id, score) for query, best first """
+        with self.lock:
+            return self._search(query, k)
+
+    def _search(self, query, k):
+        if not self.documents:
+            return []
+        n = len(self.documents)
+        average = self.total_length / n or 1.0
+        scores: dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / average)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,42 @@
+from typing import Optional, Sequence
+
+from .cache import content_hash
+
+def chunk_id(source: str, text: str) -> str:
+    """ stable id of a chunk, derived from its source and content """
+    return content_hash(f"{source}\n{text}")
+
+class Manifest:
+    """
+    What the vector store holds per source: source -> {chunk id: chunk
+    index}. Lets a re-ingested source skip the chunks it already has and
+    remove the ones that are gone. Not persisted: it is rebuilt from the
+    metadata of the stored chunks.
+    """
+
+    def __init__(self):
+        self.sources: dict[str, dict[str, int]] = {}
+
+    @classmethod
+    def from_chunks(cls, ids: Sequence[str], metadatas: Sequence[Optional[dict]]):
+        manifest = cls()
+        for doc_id, meta in zip(ids, metadatas):
+            meta = meta or {}
+            manifest.add(meta.get("source", ""), doc_id, meta.get("chunk", 0))
+        return manifest
+
+    def __len__(self):
+        return sum(len(chunks) for chunks in self.sources.values())
+
+    def chunks(self, source: str) -> dict[str, int]:
+        return self.sources.get(source, {})
+
+    def add(self, source: str, doc_id: str, index: int):
+        self.sources.setdefault(source, {})[doc_id] = index
+
+    def remove(self, source: str, ids: Sequence[str]):
+        chunks = self.sources.get(source, {})
+        for doc_id in ids:
+            chunks.pop(doc_id, None)
+        if not chunks:
+            self.sources.pop(source, None)
@@ -1,39 +1,86 @@
-import requests
+import asyncio
+import time
 from urllib.parse import urlparse
 
-def parse_data_generator(data):
+from . import tracing
+from .chunker import Chunker, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP
+
+# source of chunks of raw data strings (urls are their own source)
+TEXT_SOURCE = "text"
+
+async def chunk_data_stream(data, fetcher,
+                            size: int = DEFAULT_CHUNK_SIZE,
+                            overlap: int = DEFAULT_CHUNK_OVERLAP,
+                            max_pending: int = 256):
     """
-    Generator that yields documents one at a time.
-    Handles any combination of urls and data strings.
-    Can be of type str|list.
-    example:
-    ["<url1>","<url2>","long data string"] etc.
+    Async generator that yields (source, Chunk) tuples one chunk at a time.
+    data is a url or text string, or a list of them. All urls are fetched
+    concurrently via fetcher and chunked while they stream in, chunks are
+    yielded in the order they become ready. At most max_pending chunks are
+    buffered so memory is bounded by the chunk size, not the document size.
+    Source is the url, or "text" for raw data strings.
     """
+    items = data if isinstance(data, list) else [data]
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+    done = object()
+
+    async def produce(item):
+        if not isinstance(item, str):
+            print(f"warning: handling item {item} as a string")
+            item = str(item)
+        chunker = Chunker(size, overlap)
+        if is_url(item):
+            source = item
+            # chunking runs as the lines stream in, the time it takes is
+            # reported within the fetch span (parse_ms)
+            with tracing.span("fetch", url=item) as span:
+                received = chunks = 0
+                parsing = 0.0
+                async for line in fetcher.iter_lines(item):
+                    if span.recording:
+                        received += len(line.encode()) + 1
+                    start = time.perf_counter()
+                    ready = chunker.feed(line)
+                    parsing += time.perf_counter() - start
+                    chunks += len(ready)
+                    for chunk in ready:
+                        await queue.put((source, chunk))
+                ready = chunker.flush()
+                span.set(bytes=received, chunks=chunks + len(ready),
+                         parse_ms=round(parsing * 1000, 3))
+        else:
+            source = TEXT_SOURCE
+            with tracing.span("parse") as span:
+                ready = [c for line in item.splitlines() for c in chunker.feed(line)]
+                ready += chunker.flush()
+                if span.recording:
+                    span.set(bytes=len(item.encode()), chunks=len(ready))
+        for chunk in ready:
+            await queue.put((source, chunk))
 
-    # STR
-    if isinstance(data, str):
-        content = ''
-        if is_url(data):
-            content = get_raw_content(data)
+    async def run(item):
+        try:
+            await produce(item)
+        except Exception as e:
+            await queue.put(e)
         else:
-            content = data
-        yield content.strip()
+            await queue.put(done)
 
-    # LIST
-    elif isinstance(data, list):
-        for item in data:
-            if isinstance(item,str):
-                if is_url(item):
-                    content = get_raw_content(item)
-                else:
-                    content = item
-                yield content.strip()
+    tasks = [asyncio.create_task(run(item)) for item in items]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            entry = await queue.get()
+            if entry is done:
+                remaining -= 1
+            elif isinstance(entry, Exception):
+                raise entry
             else:
-                print(f"warning: handling item {item} as a string")
-                yield str(item)
-    else:
-        print(f"Fallback: unknown type, handling {data} as a string")
-        yield str(data)
+                yield entry
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 def is_url(text: str):
     """Check if text is a valid URL"""
@@ -43,12 +90,3 @@ def is_url(text: str):
         return all([result.scheme, result.netloc])
     except:
         return False
-
-# Accepts any url link which points to a raw data (*.md/text files etc.)
-# example: https://raw.githubusercontent.com/knative/func/main/docs/function-templates/python.md
-def get_raw_content(url: str) -> str:
-    """ retrieve contents of github raw url as a text """
-    response = requests.get(url)
-    response.raise_for_status() # errors if bad response
-    print(f"fetch '{url}' - ok")
-    return response.text
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Iterable, Optional, Union
+
+# seconds before loading a model that failed is tried again (doubling up to max)
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 30.0
+
+def parse_keep_alive(value: str) -> Union[float, str, None]:
+    """
+    keep_alive as ollama takes it: seconds (negative = until unloaded) or a
+    duration like "30m" or "24h". Empty string = ollama's default (5m).
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+def parse_models(value: str) -> list[str]:
+    """ comma separated model names """
+    return [model.strip() for model in value.split(",") if model.strip()]
+
+class Preloader:
+    """
+    Loads ollama models into memory in the background, so the first call
+    for a model doesn't pay for loading it. A model that fails to load
+    (ollama not up yet, model not pulled yet) is retried with backoff until
+    it loads or stop() is called.
+    Use from the event loop thread only.
+    """
+
+    def __init__(self, load: Callable[[str], Awaitable[Optional[float]]]):
+        # load(model) -> seconds ollama took to load it (None: not reported)
+        self.load = load
+        self.models: list[str] = []
+        self.loaded: dict[str, float] = {} # model -> seconds to load
+        self.errors: dict[str, str] = {} # model -> last load error
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def done(self) -> bool:
+        """ all the models are loaded """
+        return all(model in self.loaded for model in self.models)
+
+    def start(self, models: Iterable[str]):
+        """ load models in background, needs a running event loop """
+        self.stop()
+        self.models = list(dict.fromkeys(models))
+        self._tasks = [asyncio.ensure_future(self._preload(model))
+                       for model in self.models if model not in self.loaded]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def wait(self):
+        """ until all the models are loaded """
+        await asyncio.gather(*self._tasks)
+
+    def status(self) -> str:
+        """ what readiness is waiting for """
+        pending = [model for model in self.models if model not in self.loaded]
+        errors = [f"{model}: {self.errors[model]}" for model in pending
+                  if model in self.errors]
+        status = "loading models " + ", ".join(pending)
+        return f"{status} ({'; '.join(errors)})" if errors else status
+
+    async def _preload(self, model: str):
+        delay = RETRY_DELAY
+        while True:
+            start = time.perf_counter()
+            try:
+                seconds = await self.load(model)
+            except Exception as e:
+                self.errors[model] = str(e)
+                logging.warning(f"loading model {model} failed, retry in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                continue
+            if seconds is None:
+                seconds = time.perf_counter() - start
+            self.loaded[model] = seconds
+            self.errors.pop(model, None)
+            logging.info(f"model {model} loaded in {seconds:.2f}s")
+            return
@@ -0,0 +1,478 @@
+import logging
+import os
+import random
+import tempfile
+import threading
+from typing import NamedTuple, Optional, Sequence
+
+# rows upcast and scored per matmul (float16, int8), small enough that the
+# float32 temporary stays in cache
+QUERY_BLOCK_ROWS = 256
+# rows per hamming distance block of the binary codes
+BINARY_BLOCK_ROWS = 65536
+INITIAL_CAPACITY = 1024
+# shortlist of the quantized search = n * rerank, re-ranked exactly;
+# binary codes are coarser and need a longer shortlist for the same recall
+DEFAULT_RERANK = {"int8": 4, "binary": 40}
+# share of the queries also answered by exact search, to measure recall
+DEFAULT_RECALL_SAMPLE = 0.01
+
+class QueryResult(NamedTuple):
+    ids: list
+    documents: list
+    metadatas: list
+    embeddings: Optional[list] = None
+
+class VectorStore:
+    """
+    Interface of the vector stores behind embed_document and call_model.
+    Blocking, the MCP server runs these calls in its io threads.
+    """
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def upsert(self, ids: Sequence[str], embeddings: Sequence, documents: Sequence[str],
+               metadatas: Sequence[dict]):
+        """ insert chunks, chunks with an id already stored are replaced """
+        raise NotImplementedError
+
+    def delete(self, ids: Sequence[str]):
+        """ remove chunks, unknown ids are ignored """
+        raise NotImplementedError
+
+    def update_metadata(self, ids: Sequence[str], metadatas: Sequence[dict]):
+        """ replace the metadata of stored chunks, unknown ids are ignored """
+        raise NotImplementedError
+
+    def query(self, embedding: Sequence[float], n: int,
+              with_embeddings: bool = False) -> QueryResult:
+        """ n nearest (cosine) stored chunks to embedding, nearest first """
+        raise NotImplementedError
+
+    def get(self) -> QueryResult:
+        """ all stored chunks (without embeddings) """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class ChromaStore(VectorStore):
+    """ chroma collection: in-memory, persistent (path) or a server (host) """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @classmethod
+    def open(cls, name: str, path: str = "", host: str = "", port: int = 8000):
+        """ open (get_or_create) the collection, host takes precedence over path """
+        import chromadb
+        if host:
+            client = chromadb.HttpClient(host=host, port=port)
+        elif path:
+            client = chromadb.PersistentClient(path=path)
+        else:
+            client = chromadb.Client()
+        return cls(client.get_or_create_collection(name=name))
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=list(ids), embeddings=embeddings,
+                               documents=list(documents), metadatas=list(metadatas))
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete(ids=list(ids))
+
+    def update_metadata(self, ids, metadatas):
+        if ids:
+            self.collection.update(ids=list(ids), metadatas=list(metadatas))
+
+    def query(self, embedding, n, with_embeddings=False):
+        include = ["documents", "metadatas"] + (["embeddings"] if with_embeddings else [])
+        results = self.collection.query(query_embeddings=[embedding],
+                                        n_results=n, include=include)
+        return QueryResult(results["ids"][0], results["documents"][0],
+                           results["metadatas"][0],
+                           results["embeddings"][0] if with_embeddings else None)
+
+    def get(self):
+        results = self.collection.get(include=["documents", "metadatas"])
+        return QueryResult(results["ids"], results["documents"], results["metadatas"])
+
+class RowStore(VectorStore):
+    """
+    Bookkeeping of the in-memory stores: chunk i is row i of their arrays,
+    new chunks are appended and a deleted row is filled with the last one,
+    so the rows stay contiguous. Searches scan a snapshot without the lock
+    and retry if a delete moved rows meanwhile (version).
+    """
+
+    def __init__(self):
+        self._size = 0
+        self._version = 0
+        self._rows: dict[str, int] = {}
+        self.ids: list[str] = []
+        self.documents: list[str] = []
+        self.metadatas: list[dict] = []
+        self._lock = threading.RLock()
+
+    def count(self) -> int:
+        return self._size
+
+    def _write_rows(self, start: int, vectors):
+        """ store the unit vectors as rows [start, start + len(vectors)) """
+        raise NotImplementedError
+
+    def _move_row(self, source: int, target: int):
+        raise NotImplementedError
+
+    def _embeddings(self, rows):
+        """ float32 vectors of rows """
+        raise NotImplementedError
+
+    def search(self, query, n: int):
+        """ (rows, scores) of the top n for query, best first """
+        raise NotImplementedError
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        import numpy as np
+        vectors = normalize(np.asarray(embeddings, dtype=np.float32))
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError(f"expected {len(ids)} embeddings, got shape {vectors.shape}")
+        if len(set(ids)) != len(ids):
+            raise ValueError("duplicate ids in one upsert")
+        with self._lock:
+            self._delete([doc_id for doc_id in ids if doc_id in self._rows])
+            self._write_rows(self._size, vectors)
+            for i, doc_id in enumerate(ids):
+                self._rows[doc_id] = self._size + i
+            self.ids.extend(ids)
+            self.documents.extend(documents)
+            self.metadatas.extend(metadatas)
+            self._size += len(vectors)
+
+    def delete(self, ids):
+        with self._lock:
+            self._delete(ids)
+
+    def update_metadata(self, ids, metadatas):
+        with self._lock:
+            for doc_id, meta in zip(ids, metadatas):
+                row = self._rows.get(doc_id)
+                if row is not None:
+                    self.metadatas[row] = meta
+
+    def _delete(self, ids):
+        for doc_id in ids:
+            row = self._rows.pop(doc_id, None)
+            if row is None:
+                continue
+            last = self._size - 1
+            if row != last:
+                self._move_row(last, row)
+                self.ids[row] = self.ids[last]
+                self.documents[row] = self.documents[last]
+                self.metadatas[row] = self.metadatas[last]
+                self._rows[self.ids[row]] = row
+            del self.ids[last], self.documents[last], self.metadatas[last]
+            self._size = last
+            self._version += 1
+
+    def query(self, embedding, n, with_embeddings=False):
+        while True:
+            version = self._version
+            rows, _ = self.search(embedding, n)
+            with self._lock:
+                if version != self._version:
+                    continue # rows moved during the search
+                self._searched(embedding, rows)
+                rows = rows.tolist()
+                return QueryResult([self.ids[i] for i in rows],
+                                   [self.documents[i] for i in rows],
+                                   [self.metadatas[i] for i in rows],
+                                   self._embeddings(rows) if with_embeddings else None)
+
+    def _searched(self, embedding, rows):
+        """ hook called with the rows found for a query """
+
+    def get(self):
+        with self._lock:
+            return QueryResult(list(self.ids), list(self.documents), list(self.metadatas))
+
+class NumpyStore(RowStore):
+    """
+    In-memory store on a contiguous matrix of normalized vectors (float32,
+    or float16 for half the memory at slower queries). Cosine top-k is one
+    matmul (per block of rows for float16) plus argpartition. Rows are
+    appended, the matrix grows by doubling so adds are amortized O(1).
+    Nothing is persisted, use chroma for a durable index.
+    """
+
+    def __init__(self, dtype: str = "float32"):
+        import numpy as np
+        super().__init__()
+        self.dtype = np.dtype(dtype)
+        self._vectors = None # (capacity, dimensions), rows [0, _size) used
+
+    def nbytes(self) -> int:
+        return 0 if self._vectors is None else self._vectors.nbytes
+
+    def _write_rows(self, start, vectors):
+        import numpy as np
+        if self._vectors is None:
+            self._vectors = np.empty((max(INITIAL_CAPACITY, len(vectors)),
+                                      vectors.shape[1]), dtype=self.dtype)
+        elif vectors.shape[1] != self._vectors.shape[1]:
+            raise ValueError(f"embedding dimensions {vectors.shape[1]} do not "
+                             f"match the store ({self._vectors.shape[1]})")
+        end = start + len(vectors)
+        self._vectors = grow(self._vectors, start, end)
+        self._vectors[start:end] = vectors
+
+    def _move_row(self, source, target):
+        self._vectors[target] = self._vectors[source]
+
+    def _embeddings(self, rows):
+        import numpy as np
+        if self._vectors is None: # nothing added yet, dimensions unknown
+            return np.empty((0, 0), dtype=np.float32)
+        return self._vectors[rows].astype("float32")
+
+    def search(self, query, n):
+        rows, scores = self.search_many([query], n)
+        return rows[0], scores[0]
+
+    def search_many(self, queries, n: int):
+        """
+        top n rows for each of the queries (2d), returns (rows, scores)
+        arrays of shape (queries, n), best first
+        """
+        import numpy as np
+        with self._lock:
+            vectors = self._vectors[:self._size] if self._vectors is not None else None
+        queries = normalize(np.asarray(queries, dtype=np.float32))
+        if vectors is None or not len(vectors):
+            return (np.empty((len(queries), 0), dtype=np.int64),
+                    np.empty((len(queries), 0), dtype=np.float32))
+        n = min(n, len(vectors))
+        if vectors.dtype == np.float32:
+            return top_k((vectors @ queries.T).T, n)
+        # no BLAS for float16: upcast cache sized blocks one at a time
+        scores = np.empty((len(queries), len(vectors)), dtype=np.float32)
+        for start in range(0, len(vectors), QUERY_BLOCK_ROWS):
+            block = vectors[start:start + QUERY_BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + len(block)] = (block @ queries.T).T
+        return top_k(scores, n)
+
+class QuantizedStore(RowStore):
+    """
+    In-memory store of quantized vectors for the candidate search, with the
+    full precision (float32) vectors in a file on disk, memory-mapped to
+    re-rank the shortlist. Per vector of 1024 dimensions:
+    - int8: 1024 bytes + a float32 scale (4x less memory than float32),
+      approximate scores by a matmul on the codes.
+    - binary: the sign bits, 128 bytes (32x less), hamming distance.
+    A recall_sample share of the queries is also answered by exact search
+    over the file, recall() reports how many of the exact top n the
+    quantized search found. Nothing is persisted, the file is a spill area
+    recreated when the store is opened.
+    """
+
+    def __init__(self, quantization: str = "int8", path: str = "",
+                 rerank: Optional[int] = None,
+                 recall_sample: float = DEFAULT_RECALL_SAMPLE):
+        import numpy as np
+        super().__init__()
+        if quantization not in ("int8", "binary"):
+            raise ValueError(f"unknown quantization: {quantization}")
+        self.quantization = quantization
+        self.rerank = rerank or DEFAULT_RERANK[quantization]
+        self.recall_sample = recall_sample
+        if path:
+            os.makedirs(path, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix="vectors-", suffix=".f32",
+                                         dir=path or None)
+        self._file = os.fdopen(fd, "w+b")
+        self._full = None # memmap of the file, reopened when it changed
+        self._full_version = 0
+        self._codes = None
+        self._scales = np.empty(0, dtype=np.float32) # int8 only
+        self.dimensions = 0
+        self.recall_found = 0
+        self.recall_total = 0
+
+    def nbytes(self) -> int:
+        """ memory of the quantized index (the full vectors are on disk) """
+        return 0 if self._codes is None else self._codes.nbytes + self._scales.nbytes
+
+    def recall(self) -> float:
+        """ measured recall of the sampled queries (1.0 before any sample) """
+        return self.recall_found / self.recall_total if self.recall_total else 1.0
+
+    def _write_rows(self, start, vectors):
+        import numpy as np
+        codes, scales = self._encode(vectors)
+        if self._codes is None:
+            self.dimensions = vectors.shape[1]
+            self._codes = np.empty((INITIAL_CAPACITY, codes.shape[1]), dtype=codes.dtype)
+        elif vectors.shape[1] != self.dimensions:
+            raise ValueError(f"embedding dimensions {vectors.shape[1]} do not "
+                             f"match the store ({self.dimensions})")
+        end = start + len(vectors)
+        self._codes = grow(self._codes, start, end)
+        self._codes[start:end] = codes
+        if scales is not None:
+            self._scales = grow(self._scales, start, end)
+            self._scales[start:end] = scales
+        self._file.seek(start * self.dimensions * 4)
+        self._file.write(vectors.tobytes())
+        self._file.flush()
+
+    def _move_row(self, source, target):
+        self._codes[target] = self._codes[source]
+        if self.quantization == "int8":
+            self._scales[target] = self._scales[source]
+        row = self.dimensions * 4
+        self._file.seek(source * row)
+        vector = self._file.read(row)
+        self._file.seek(target * row)
+        self._file.write(vector)
+        self._file.flush()
+
+    def _embeddings(self, rows):
+        return self.full_vectors()[rows]
+
+    def _encode(self, vectors):
+        """ (codes, scales) of unit vectors, scales is None for binary """
+        import numpy as np
+        if self.quantization == "binary":
+            return np.packbits(vectors > 0, axis=1), None
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _approximate(self, codes, scales, query):
+        """ approximate scores of the codes, higher is closer """
+        import numpy as np
+        scores = np.empty(len(codes), dtype=np.float32)
+        if self.quantization == "binary":
+            bits = np.packbits(query > 0)
+            for start in range(0, len(codes), BINARY_BLOCK_ROWS):
+                block = codes[start:start + BINARY_BLOCK_ROWS]
+                distance = hamming(block, bits)
+                scores[start:start + len(block)] = -distance
+            return scores
+        for start in range(0, len(codes), QUERY_BLOCK_ROWS):
+            block = codes[start:start + QUERY_BLOCK_ROWS].astype(np.float32)
+            scores[start:start + len(block)] = (block @ query) * scales[start:start + len(block)]
+        return scores
+
+    def full_vectors(self):
+        """ memmap (rows, dimensions) of the full precision vectors """
+        import numpy as np
+        with self._lock:
+            size = self._size
+            if self._full is None or len(self._full) != size or self._full_version != self._version:
+                self._full_version = self._version
+                self._full = (np.memmap(self.path, dtype=np.float32, mode="r",
+                                        shape=(size, self.dimensions))
+                              if size else np.empty((0, self.dimensions), np.float32))
+            return self._full
+
+    def search(self, query, n: int):
+        """ (rows, scores) of the top n for query: quantized shortlist, exact re-rank """
+        import numpy as np
+        with self._lock:
+            size = self._size
+            codes = self._codes[:size] if size else None
+            scales = self._scales[:size] if self.quantization == "int8" else None
+        query = normalize(np.asarray(query, dtype=np.float32))
+        if codes is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        approximate = self._approximate(codes, scales, query)
+        shortlist, _ = top_k(approximate[None], min(size, n * self.rerank))
+        # sorted rows read the memmap front to back
+        shortlist = np.sort(shortlist[0])
+        exact = self.full_vectors()[shortlist] @ query
+        rows, scores = top_k(exact[None], min(n, len(shortlist)))
+        return shortlist[rows[0]], scores[0]
+
+    def exact_search(self, query, n: int):
+        """ (rows, scores) of the top n for query by scanning the full vectors """
+        import numpy as np
+        query = normalize(np.asarray(query, dtype=np.float32))
+        full = self.full_vectors()
+        if not len(full):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows, scores = top_k((full @ query)[None], min(n, len(full)))
+        return rows[0], scores[0]
+
+    def _searched(self, embedding, rows):
+        if self.recall_sample and len(rows) and random.random() < self.recall_sample:
+            self.measure_recall(embedding, rows)
+
+    def measure_recall(self, embedding, rows) -> float:
+        """ share of the exact top len(rows) found by the quantized search """
+        exact, _ = self.exact_search(embedding, len(rows))
+        found = len(set(exact.tolist()) & set(rows.tolist()))
+        with self._lock:
+            self.recall_found += found
+            self.recall_total += len(exact)
+        logging.info(f"{self.quantization} recall@{len(exact)}: {found / len(exact):.2f} "
+                     f"(over {self.recall_total // len(exact)} samples: {self.recall():.3f})")
+        return found / len(exact)
+
+    def close(self):
+        self._full = None
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def grow(array, size: int, end: int):
+    """ array with room for end rows (doubling), rows [0, size) kept """
+    import numpy as np
+    if array is None or end <= len(array):
+        return array
+    grown = np.empty((max(end, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+    grown[:size] = array[:size]
+    logging.debug(f"vector store grown to {len(grown)} rows")
+    return grown
+
+def normalize(vectors):
+    """ unit rows (zero rows stay zero) """
+    import numpy as np
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def top_k(scores, n: int):
+    """ (rows, scores) of the n highest scores per row of scores, best first """
+    import numpy as np
+    if n < scores.shape[1]:
+        rows = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    else:
+        rows = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    picked = np.take_along_axis(scores, rows, axis=1)
+    order = np.argsort(-picked, axis=1)
+    return (np.take_along_axis(rows, order, axis=1),
+            np.take_along_axis(picked, order, axis=1))
+
+_POPCOUNT = None
+
+def hamming(codes, bits):
+    """ bits differing between each row of codes and bits (packed uint8) """
+    global _POPCOUNT
+    import numpy as np
+    if hasattr(np, "bitwise_count"): # numpy >= 2.0
+        if codes.shape[1] % 8 == 0: # 8 bytes at a time
+            codes, bits = codes.view(np.uint64), bits.view(np.uint64)
+        return np.bitwise_count(codes ^ bits).sum(axis=1, dtype=np.int32)
+    if _POPCOUNT is None:
+        _POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None],
+                                  axis=1).sum(axis=1).astype(np.uint8)
+    return _POPCOUNT[codes ^ bits].sum(axis=1, dtype=np.int32)
@@ -0,0 +1,268 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Optional
+
+# span of the running stage, child spans attach to it; asyncio tasks
+# inherit it, so concurrent fetches of one call land in the same trace
+_current: contextvars.ContextVar = contextvars.ContextVar("span", default=None)
+
+class Span:
+    """
+    A timed stage of a trace with attributes (byte/token counts, ...).
+    Use as context manager: it becomes the parent of spans started inside.
+    """
+    recording = True
+
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"], attributes: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = random.getrandbits(64).to_bytes(8, "big").hex()
+        self.parent_id = parent.span_id if parent else ""
+        self.attributes = attributes
+        self.error = ""
+        self.start_ns = 0
+        self.end_ns = 0
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, message: str):
+        self.error = message
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        _current.reset(self._token)
+        if exc is not None and not self.error:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.trace.finished(self)
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+class _NoopSpan:
+    """
+    Stands in for a span when the call is not sampled, costs nothing.
+    Check recording before computing costly attributes.
+    """
+    recording = False
+
+    def set(self, **attributes):
+        pass
+
+    def fail(self, message: str):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NOOP = _NoopSpan()
+
+class Trace:
+    """ spans of one sampled call, exported when its root span ends """
+
+    def __init__(self, tracer: "Tracer"):
+        self.tracer = tracer
+        self.trace_id = random.getrandbits(128).to_bytes(16, "big").hex()
+        self.spans: list[Span] = []
+        self.root: Optional[Span] = None
+
+    def finished(self, span: Span):
+        self.spans.append(span)
+        if span is self.root:
+            self.tracer.export(self)
+
+class Tracer:
+    """
+    Samples sample_rate of the calls (0 = off, 1 = all) and hands their
+    traces to the exporters (FileExporter, OTLPExporter).
+    """
+
+    def __init__(self, sample_rate: float = 0.0, exporters: tuple = ()):
+        self.sample_rate = sample_rate
+        self.exporters = list(exporters)
+
+    def trace(self, name: str, **attributes):
+        """ root span of a new trace, NOOP if this call is not sampled """
+        if not self.exporters or random.random() >= self.sample_rate:
+            return NOOP
+        trace = Trace(self)
+        trace.root = Span(trace, name, None, attributes)
+        return trace.root
+
+    def export(self, trace: Trace):
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception as e:
+                logging.warning(f"trace export failed: {e}")
+
+    def close(self):
+        for exporter in self.exporters:
+            exporter.close()
+
+def span(name: str, **attributes):
+    """ child span of the current one, NOOP outside of a sampled trace """
+    parent = _current.get()
+    if parent is None:
+        return NOOP
+    return Span(parent.trace, name, parent, attributes)
+
+def current_span():
+    """ the running span (NOOP if none), to add attributes to it """
+    return _current.get() or NOOP
+
+class FileExporter:
+    """
+    Appends each trace as one json line (its spans in end order). A
+    background thread writes them, no file io in the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        record = {"trace_id": trace.trace_id,
+                  "spans": [s.to_dict() for s in trace.spans]}
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write, daemon=True,
+                                                name="trace-file-writer")
+                self._thread.start()
+            self._queue.put(record)
+
+    def _write(self):
+        with open(self.path, "a") as f:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    return
+                try:
+                    f.write(json.dumps(record) + "\n")
+                    if self._queue.empty():
+                        f.flush()
+                except Exception as e:
+                    logging.warning(f"trace export failed: {e}")
+
+    def close(self):
+        """ write the pending traces and stop the writer """
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+
+class OTLPExporter:
+    """
+    Sends traces to an OTLP/HTTP collector (json encoding, {endpoint}/v1/traces)
+    in the background, without the OpenTelemetry SDK.
+    """
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+        self._client = None
+        self._pending: set = set()
+
+    def export(self, trace: Trace):
+        task = asyncio.get_running_loop().create_task(self._send(self.payload(trace)))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _send(self, payload: dict):
+        import httpx
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        try:
+            response = await self._client.post(self.url, json=payload)
+            response.raise_for_status()
+        except Exception as e:
+            logging.warning(f"OTLP export to {self.url} failed: {e}")
+
+    def payload(self, trace: Trace) -> dict:
+        return {"resourceSpans": [{
+            "resource": {"attributes": otlp_attributes({"service.name": self.service_name})},
+            "scopeSpans": [{
+                "scope": {"name": self.service_name},
+                "spans": [{
+                    "traceId": trace.trace_id,
+                    "spanId": s.span_id,
+                    "parentSpanId": s.parent_id,
+                    "name": s.name,
+                    "kind": 1, # internal
+                    "startTimeUnixNano": str(s.start_ns),
+                    "endTimeUnixNano": str(s.end_ns),
+                    "attributes": otlp_attributes(s.attributes),
+                    "status": ({"code": 2, "message": s.error} if s.error else {"code": 1}),
+                } for s in trace.spans],
+            }],
+        }]}
+
+    def close(self):
+        if self._client is not None:
+            client, self._client = self._client, None
+            try:
+                asyncio.get_running_loop().create_task(client.aclose())
+            except RuntimeError:
+                pass # no loop anymore, the connections go with the process
+
+def otlp_attributes(attributes: dict) -> list:
+    out = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            v = {"boolValue": value}
+        elif isinstance(value, int):
+            v = {"intValue": str(value)}
+        elif isinstance(value, float):
+            v = {"doubleValue": value}
+        else:
+            v = {"stringValue": str(value)}
+        out.append({"key": key, "value": v})
+    return out
+
+def from_config(cfg, service_name: str) -> Tracer:
+    """
+    Tracer of the Function configuration: TRACE_SAMPLE_RATE, TRACE_FILE
+    and/or TRACE_OTLP_ENDPOINT (or OTEL_EXPORTER_OTLP_ENDPOINT).
+    """
+    exporters = []
+    if cfg.get("TRACE_FILE"):
+        os.makedirs(os.path.dirname(os.path.abspath(cfg["TRACE_FILE"])), exist_ok=True)
+        exporters.append(FileExporter(cfg["TRACE_FILE"]))
+    endpoint = cfg.get("TRACE_OTLP_ENDPOINT") or cfg.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+    if endpoint:
+        exporters.append(OTLPExporter(endpoint, service_name))
+    sample_rate = float(cfg.get("TRACE_SAMPLE_RATE", 1.0 if exporters else 0.0))
+    if sample_rate > 0 and not exporters:
+        logging.warning("TRACE_SAMPLE_RATE set without TRACE_FILE or "
+                        "TRACE_OTLP_ENDPOINT, tracing is off")
+    return Tracer(sample_rate, tuple(exporters))
@@ -0,0 +1,120 @@
+"""
+Unit tests of the per model admission control.
+"""
+import asyncio
+import json
+
+import pytest
+from function.admission import Admission, Overloaded, read_body, tool_calls
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_limited_per_model_in_order():
+    admission = Admission(concurrency=2, max_queue=10, timeout=5)
+    running = {"a": 0, "b": 0}
+    peak = {"a": 0, "b": 0}
+    order = []
+
+    async def call(model, i):
+        async with admission.slot(model):
+            order.append((model, i))
+            running[model] += 1
+            peak[model] = max(peak[model], running[model])
+            await asyncio.sleep(0.01)
+            running[model] -= 1
+
+    await asyncio.gather(*(call(m, i) for i in range(6) for m in "ab"))
+    assert peak == {"a": 2, "b": 2}
+    assert [i for m, i in order if m == "a"] == list(range(6)) # first come, first served
+    assert admission.models["a"].in_flight == 0 and not admission.models["a"].waiters
+
+
+@pytest.mark.asyncio
+async def test_full_queue_and_deadline_are_turned_away():
+    waits = []
+    admission = Admission(concurrency=1, max_queue=1, timeout=0.05,
+                          on_wait=lambda model, seconds: waits.append(seconds))
+    release = asyncio.Event()
+
+    async def hold():
+        async with admission.slot("m"):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+
+    # the queue (1) is full
+    with pytest.raises(Overloaded) as e:
+        async with admission.slot("m"):
+            pass
+    assert e.value.status == 429 and e.value.retry_after >= 1
+    # the queued call gives up after the deadline
+    with pytest.raises(Overloaded) as e:
+        await queued
+    assert e.value.status == 503
+    assert admission.rejected == {("m", "queue_full"): 1, ("m", "timeout"): 1}
+
+    release.set()
+    await holder
+    async with admission.slot("m"):
+        pass
+    assert len(waits) == 2
+    assert admission.models["m"].in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_check_fails_fast():
+    admission = Admission(concurrency=1, max_queue=1, timeout=1.0)
+    admission.check("m") # unknown model, nothing in flight
+    release = asyncio.Event()
+
+    async def hold():
+        async with admission.slot("m"):
+            await release.wait()
+
+    tasks = [asyncio.create_task(hold())]
+    await asyncio.sleep(0)
+    admission.check("m") # busy, but there is room in the queue
+    # calls took 2s on average: the next one would wait longer than 1s
+    admission.models["m"].duration = 2.0
+    with pytest.raises(Overloaded) as e:
+        admission.check("m")
+    assert (e.value.status, e.value.reason, e.value.retry_after) == (503, "deadline", 2)
+
+    admission.models["m"].duration = 0.0
+    tasks.append(asyncio.create_task(hold()))
+    await asyncio.sleep(0)
+    with pytest.raises(Overloaded) as e:
+        admission.check("m")
+    assert e.value.status == 429
+    release.set()
+    await asyncio.gather(*tasks)
+
+    assert Admission(concurrency=0).enabled is False
+
+
+@pytest.mark.asyncio
+async def test_read_body_and_tool_calls():
+    body = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+                       "params": {"name": "call_model", "arguments": {"model": "m"}}}).encode()
+    messages = [{"type": "http.request", "body": body[:10], "more_body": True},
+                {"type": "http.request", "body": body[10:], "more_body": False},
+                {"type": "http.disconnect"}]
+
+    async def receive():
+        return messages.pop(0)
+
+    read, replay = await read_body(receive)
+    assert read == body
+    assert await replay() == {"type": "http.request", "body": body, "more_body": False}
+    assert await replay() == {"type": "http.disconnect"}
+
+    assert tool_calls(read) == [("call_model", {"model": "m"})]
+    assert tool_calls(b'[{"method": "initialize"}, {"method": "tools/call", '
+                      b'"params": {"name": "list_models"}}]') == [("list_models", {})]
+    assert tool_calls(b"not json") == []
+    # malformed arguments are not passed on
+    assert tool_calls(b'{"method": "tools/call", "params": {"name": "call_model", '
+                      b'"arguments": ["m"]}}') == [("call_model", {})]
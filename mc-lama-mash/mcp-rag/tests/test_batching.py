@@ -0,0 +1,24 @@
+"""
+Unit tests for grouping embed/insert calls into adaptive batches.
+"""
+from function.batching import AdaptiveBatcher
+
+
+def test_batches_by_count_and_bytes():
+    b = AdaptiveBatcher(initial=3, max_bytes=10)
+    assert list(b.batches(["a", "b", "c", "d"])) == [["a", "b", "c"], ["d"]]
+    # payload cap closes the batch early
+    assert list(b.batches(["aaaaaa", "bbbbbb", "c"])) == [["aaaaaa"], ["bbbbbb", "c"]]
+
+
+def test_batch_size_adapts_to_latency():
+    b = AdaptiveBatcher(initial=16, max_size=20, target_latency=1.0)
+    b.record(16, 0.1)
+    assert b.size == 20
+    b.record(20, 0.1)
+    assert b.size == 20 # capped
+    b.record(20, 5.0)
+    assert b.size == 10
+    # a partial batch says nothing about growing
+    b.record(3, 0.1)
+    assert b.size == 10
@@ -0,0 +1,56 @@
+"""
+Unit tests for the embedding caches.
+"""
+from function.cache import EmbeddingCache, LRUCache, SemanticCache
+
+
+def test_embedding_cache_persists_vectors(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache(path)
+    cache.put_many("m", ["a", "bb"], [[1.0, 0.5], [2.0, 0.5]])
+    cache.close()
+
+    # reopened cache (eg. new pod) has the vectors of the content seen before
+    cache = EmbeddingCache(path)
+    assert cache.get_many("m", ["bb", "ccc"]) == [[2.0, 0.5], None]
+    # key includes the model
+    assert cache.get_many("other", ["a"]) == [None]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_embedding_cache_evicts_lru(tmp_path):
+    vector_size = 4 * 2 # two float32
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_bytes=2 * vector_size)
+    cache.put_many("m", ["a"], [[1.0, 1.0]])
+    cache.put_many("m", ["b"], [[2.0, 2.0]])
+    cache.get_many("m", ["a"]) # a is now more recent than b
+    cache.put_many("m", ["c"], [[3.0, 3.0]])
+
+    assert cache.get_many("m", ["a", "b", "c"]) == [[1.0, 1.0], None, [3.0, 3.0]]
+
+
+def test_lru_cache_ttl_and_eviction(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("function.cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(max_entries=2, ttl=10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3) # evicts b, the least recently used
+    assert cache.get("b") is None
+    now[0] += 11
+    assert cache.get("a") is None # expired
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_semantic_cache_matches_close_prompts():
+    cache = SemanticCache(max_entries=2, max_distance=0.05)
+    cache.put("llm", [1.0, 0.0], "ctx", "answer")
+
+    assert cache.get("llm", [0.99, 0.05], "ctx") == "answer" # paraphrase
+    assert cache.get("llm", [0.0, 1.0], "ctx") is None       # other meaning
+    assert cache.get("llm", [1.0, 0.0], "other ctx") is None
+    assert cache.get("other llm", [1.0, 0.0], "ctx") is None
+
+    cache.clear() # eg. documents changed
+    assert cache.get("llm", [1.0, 0.0], "ctx") is None
@@ -0,0 +1,50 @@
+"""
+Unit tests for splitting documents into chunks before embedding.
+"""
+import pytest
+from function.chunker import chunk_lines, chunk_text
+
+
+def test_chunk_respects_size_and_overlap():
+    lines = [f"line {i:03d} " + "x" * 40 for i in range(100)]
+    chunks = list(chunk_lines(lines, size=500, overlap=100))
+
+    assert len(chunks) > 1
+    assert [c.index for c in chunks] == list(range(len(chunks)))
+    for c in chunks:
+        # a chunk can overshoot by at most one line
+        assert len(c.text) < 500 + 50
+    # consecutive chunks share the overlapping lines
+    for prev, cur in zip(chunks, chunks[1:]):
+        assert cur.text.splitlines()[0] in prev.text
+
+
+def test_chunk_splits_on_headings():
+    text = "\n".join([
+        "# Title",
+        "intro",
+        "## Usage",
+        "run it",
+        "```",
+        "# not a heading",
+        "```",
+        "# Other",
+        "bye",
+    ])
+    chunks = list(chunk_text(text, size=1000, overlap=100))
+
+    assert [c.heading for c in chunks] == ["Title", "Title > Usage", "Other"]
+    assert chunks[1].text.startswith("## Usage")
+    assert "# not a heading" in chunks[1].text
+    # overlap never crosses a section boundary
+    assert "intro" not in chunks[1].text
+
+
+def test_chunk_long_line():
+    chunks = list(chunk_text("y" * 2500, size=1000, overlap=0))
+    assert [len(c.text) for c in chunks] == [1000, 1000, 500]
+
+
+def test_chunk_invalid_overlap():
+    with pytest.raises(ValueError):
+        list(chunk_text("abc", size=10, overlap=10))
@@ -0,0 +1,82 @@
+"""
+Unit tests of the single-flight coalescing.
+"""
+import asyncio
+
+import pytest
+from function.coalesce import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch(x):
+        calls.append(x)
+        await asyncio.sleep(0.01)
+        return [x]
+
+    results = await asyncio.gather(*(flights.do("k", fetch, 1) for _ in range(5)),
+                                   flights.do("other", fetch, 2))
+    assert results == [[1]] * 5 + [[2]]
+    assert calls == [1, 2]
+    assert (flights.calls, flights.shared) == (2, 4)
+    assert len(flights) == 0
+
+    # nothing is kept once done
+    assert await flights.do("k", fetch, 3) == [3]
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_not_kept():
+    flights = SingleFlight()
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("backend down")
+
+    results = await asyncio.gather(*(flights.do("k", fail) for _ in range(3)),
+                                   return_exceptions=True)
+    assert calls == 1
+    assert all(isinstance(r, ValueError) for r in results)
+    with pytest.raises(ValueError):
+        await flights.do("k", fail)
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_the_others():
+    flights = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    first = asyncio.create_task(flights.do("k", slow))
+    second = asyncio.create_task(flights.do("k", slow))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == "done"
+
+
+@pytest.mark.asyncio
+async def test_claim_and_resolve():
+    flights = SingleFlight()
+    joined, claimed = flights.claim(["a", "b", "a"])
+    assert joined == {} and claimed == ["a", "b"]
+
+    joined, claimed = flights.claim(["b", "c"])
+    assert list(joined) == ["b"] and claimed == ["c"]
+    flights.resolve("b", 42)
+    assert await joined["b"] == 42
+    # resolved flights are gone right away
+    assert flights.claim(["b"]) == ({}, ["b"])
+
+    joined, _ = flights.claim(["c"])
+    flights.resolve("c", error=asyncio.CancelledError())
+    with pytest.raises(RuntimeError):
+        await joined["c"]
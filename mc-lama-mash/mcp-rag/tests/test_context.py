@@ -0,0 +1,58 @@
+"""
+Unit tests for packing retrieved chunks into the prompt context.
+"""
+from function.context import estimate_tokens, mmr, pack_context
+
+
+def test_pack_orders_by_document_and_position():
+    documents = ["second part of a", "only part of b", "first part of a"]
+    metadatas = [
+        {"source": "a", "heading": "Usage", "chunk": 1},
+        {"source": "b", "chunk": 0},
+        {"source": "a", "heading": "Intro", "chunk": 0},
+    ]
+    packed = pack_context(documents, metadatas, budget_tokens=1000)
+
+    assert packed.split("\n\n") == [
+        "[a > Intro]\nfirst part of a",
+        "[a > Usage]\nsecond part of a",
+        "[b]\nonly part of b",
+    ]
+
+
+def test_pack_drops_duplicates_and_contained_chunks():
+    documents = ["the whole paragraph about functions", "about functions",
+                 "the whole paragraph about functions"]
+    metadatas = [{"source": "a", "chunk": i} for i in range(3)]
+    packed = pack_context(documents, metadatas, budget_tokens=1000)
+
+    assert packed == "[a]\nthe whole paragraph about functions"
+
+
+def test_pack_respects_budget():
+    documents = ["first " * 400, "other " * 400, "third " * 400]
+    metadatas = [{"source": s, "chunk": 0} for s in "abc"]
+    packed = pack_context(documents, metadatas, budget_tokens=700)
+
+    parts = packed.split("\n\n")
+    # first chunk fits whole (600 tokens), second is truncated, third skipped
+    assert len(parts) == 2
+    assert parts[1].endswith(" ...")
+    assert sum(estimate_tokens(p.split("\n", 1)[1]) for p in parts) <= 700
+
+
+def test_pack_empty():
+    assert pack_context([], [], budget_tokens=100) == ""
+
+
+def test_mmr_prefers_diverse_candidates():
+    query = [1.0, 0.0, 0.0]
+    candidates = [
+        [1.0, 0.1, 0.0],
+        [1.0, 0.11, 0.0], # near duplicate of the first
+        [0.7, 0.0, 0.7],
+    ]
+    # relevance only
+    assert mmr(query, candidates, k=2, lambda_=1.0) == [0, 1]
+    # with diversity the near duplicate loses against the other direction
+    assert mmr(query, candidates, k=2, lambda_=0.5) == [0, 2]
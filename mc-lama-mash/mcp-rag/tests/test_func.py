@@ -2,6 +2,10 @@
 An example set of unit tests which confirm that the main handler (the
 callable function) returns 200 OK for a simple HTTP GET.
 """
+import asyncio
+import subprocess
+import sys
+
 import pytest
 from function import new
 
@@ -36,3 +40,109 @@ async def test_function_handle():
     assert sent_ok, "Function did not send a 200 OK"
     assert sent_headers, "Function did not send headers"
     assert sent_body, "Function did not send a body"
+
+
+@pytest.mark.asyncio
+async def test_function_mcp_lifespan():
+    f = new()
+    assert not f.ready()[0], "Function ready before MCP server started"
+
+    f.start({})
+    # concurrent first requests share the single lifespan started by start
+    task = f._mcp_task
+    await asyncio.gather(f._wait_mcp(), f._wait_mcp())
+    assert f._mcp_task is task
+    assert f.ready() == (True, "Ready")
+
+    f.stop()
+    await asyncio.wait_for(task, 5)
+
+
+def test_function_import_is_lazy():
+    # heavy dependencies must not be paid for before the pod can answer
+    code = ("import sys; from function import new; new(); "
+            "print(sorted(m for m in ('mcp.server.fastmcp', 'httpx', 'chromadb', "
+            "'ollama', 'numpy', 'requests') "
+            "if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                         text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+@pytest.mark.asyncio
+async def test_function_metrics_endpoint():
+    f = new()
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await f.handle({'type': 'http', 'path': '/metrics'}, {}, send)
+
+    assert messages[0]['status'] == 200
+    assert messages[0]['headers'][0][1].startswith(b'text/plain; version=0.0.4')
+    assert b'# TYPE mcp_rag_tool_calls_total counter' in messages[1]['body']
+
+
+def test_ollama_host_is_configurable():
+    f = new()
+    server = f.mcp_server
+    server.configure({"OLLAMA_HOST": "http://127.0.0.1:11435", "OLLAMA_TIMEOUT": "30"})
+    http = server.client._client
+    assert str(http.base_url) == "http://127.0.0.1:11435"
+    assert http.timeout.read == 30
+    server.close()
+
+
+@pytest.mark.asyncio
+async def test_function_fails_fast_when_the_model_is_busy():
+    from function.admission import Overloaded
+    f = new()
+    f.start({"OLLAMA_MAX_CONCURRENCY": "1", "OLLAMA_MAX_QUEUE": "0"})
+    body = (b'{"jsonrpc": "2.0", "id": 1, "method": "tools/call", '
+            b'"params": {"name": "call_model", "arguments": {"prompt": "hi"}}}')
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async with f.mcp_server.admission.slot(f.mcp_server.model):
+        with pytest.raises(Overloaded) as e:
+            await f.handle({'type': 'http', 'path': '/mcp', 'method': 'POST'},
+                           receive, None)
+    assert e.value.status == 429
+    assert e.value.retry_after >= 1
+    f.stop()
+    await asyncio.wait_for(f._mcp_task, 5)
+
+
+@pytest.mark.asyncio
+async def test_function_is_ready_once_the_models_are_loaded():
+    f = new()
+    loaded = asyncio.Event()
+
+    class SlowOllama:
+        async def generate(self, model, prompt, keep_alive=None):
+            await loaded.wait()
+            return {"response": "", "load_duration": 2_000_000_000}
+
+    f.mcp_server.client = SlowOllama()
+    f.start({"OLLAMA_PRELOAD_MODELS": "llama3.2:3b"})
+    await f._wait_mcp()
+    assert f.ready() == (False, "loading models llama3.2:3b")
+    loaded.set()
+    await asyncio.wait_for(f.mcp_server.preloader.wait(), 5)
+    assert f.ready() == (True, "Ready")
+    assert 'mcp_rag_model_preload_seconds{model="llama3.2:3b"} 2' in f.metrics()
+    f.stop()
+    await asyncio.wait_for(f._mcp_task, 5)
+
+
+def test_partial_configure_keeps_admission_limits():
+    f = new()
+    server = f.mcp_server
+    server.configure({"OLLAMA_MAX_CONCURRENCY": "2", "OLLAMA_MAX_QUEUE": "5",
+                      "OLLAMA_QUEUE_TIMEOUT": "7"})
+    server.configure({"OLLAMA_TIMEOUT": "30"})
+    assert (server.admission.concurrency, server.admission.max_queue,
+            server.admission.timeout) == (2, 5, 7.0)
+    server.close()
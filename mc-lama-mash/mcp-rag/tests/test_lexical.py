@@ -0,0 +1,85 @@
+"""
+Unit tests for the BM25 index and rank fusion of the hybrid retrieval.
+"""
+import threading
+
+from function.lexical import (BM25Index, looks_like_identifier,
+                              reciprocal_rank_fusion, tokenize)
+
+
+def test_tokenize_keeps_identifiers():
+    terms = tokenize("Set `--build-arg` in func.yaml")
+    assert "build-arg" in terms
+    assert "build" in terms and "arg" in terms
+    assert "func.yaml" in terms and "yaml" in terms
+
+
+def test_bm25_ranks_exact_identifier_first():
+    index = BM25Index()
+    index.add(["0", "1", "2"], [
+        "Functions are built from source with a builder image.",
+        "Pass --build-arg to func build to set build arguments.",
+        "The func.yaml file holds the function configuration.",
+    ], [{"source": "a", "chunk": i} for i in range(3)])
+
+    assert index.search("--build-arg", k=3)[0][0] == "1"
+    assert index.search("func.yaml", k=3)[0][0] == "2"
+    assert index.search("nothing matches", k=3) == []
+    assert index.documents["2"][1] == {"source": "a", "chunk": 2}
+
+
+def test_bm25_incremental_replace_and_remove():
+    index = BM25Index()
+    index.add(["0"], ["cats meow"])
+    index.add(["1"], ["dogs woof"])
+    assert [doc_id for doc_id, _ in index.search("woof", k=2)] == ["1"]
+
+    index.add(["1"], ["cats purr"]) # same id is replaced
+    assert index.search("woof", k=2) == []
+    assert {doc_id for doc_id, _ in index.search("cats", k=2)} == {"0", "1"}
+
+    index.update_metadata(["0", "unknown"], [{"chunk": 3}, {}])
+    assert index.documents["0"] == ("cats meow", {"chunk": 3})
+
+    index.remove(["0", "1"])
+    assert len(index) == 0
+    assert index.postings == {}
+    assert index.total_length == 0
+
+
+def test_bm25_search_while_ingesting():
+    # chunks are added and removed by the io threads during searches
+    index = BM25Index()
+    index.add(["base"], ["cats meow"])
+    done = threading.Event()
+
+    def ingest():
+        i = 0
+        while not done.is_set():
+            ids = [f"{i}-{j}" for j in range(20)]
+            index.add(ids, [f"cats meow number {i} {j}" for j in range(20)])
+            index.remove(ids)
+            i += 1
+
+    writer = threading.Thread(target=ingest)
+    writer.start()
+    try:
+        for _ in range(3000):
+            assert index.search("cats meow", k=4)
+    finally:
+        done.set()
+        writer.join()
+    assert len(index) == 1
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]])
+    # b is in both lists, a is first in only one
+    assert fused == ["b", "a", "d", "c"]
+
+
+def test_looks_like_identifier():
+    for query in ["--build-arg", "func.yaml", "buildEnvs", "`run_id`", "-v"]:
+        assert looks_like_identifier(query), query
+    for query in ["how do I build a function?", "dogs", ""]:
+        assert not looks_like_identifier(query), query
@@ -0,0 +1,51 @@
+"""
+Unit tests for the Prometheus metrics of the Function.
+"""
+import pytest
+from function.metrics import Registry
+
+
+def test_render_prometheus_text():
+    registry = Registry()
+    calls = registry.counter("calls_total", "Calls", ["tool", "status"])
+    duration = registry.histogram("duration_seconds", "Duration", ["tool"],
+                                  buckets=(0.1, 1.0))
+    in_flight = registry.gauge("in_flight", "Running")
+    registry.gauge("ratio", "Ratio", ["cache"], callback=lambda: {("query",): 0.5})
+
+    calls.inc("call_model", "ok")
+    calls.inc("call_model", "ok")
+    duration.observe("call_model", value=0.05)
+    duration.observe("call_model", value=0.1) # le is inclusive
+    duration.observe("call_model", value=3.0)
+    in_flight.inc()
+    in_flight.inc()
+    in_flight.dec()
+
+    lines = registry.render().splitlines()
+    assert "# TYPE calls_total counter" in lines
+    assert 'calls_total{tool="call_model",status="ok"} 2' in lines
+    assert "# TYPE duration_seconds histogram" in lines
+    assert 'duration_seconds_bucket{tool="call_model",le="0.1"} 2' in lines
+    assert 'duration_seconds_bucket{tool="call_model",le="1"} 2' in lines
+    assert 'duration_seconds_bucket{tool="call_model",le="+Inf"} 3' in lines
+    assert 'duration_seconds_sum{tool="call_model"} 3.15' in lines
+    assert 'duration_seconds_count{tool="call_model"} 3' in lines
+    assert "in_flight 1" in lines
+    assert 'ratio{cache="query"} 0.5' in lines
+
+
+def test_timer_counts_errors():
+    registry = Registry()
+    duration = registry.histogram("backend_seconds", "Duration", ["backend"])
+    errors = registry.counter("backend_errors_total", "Errors", ["backend"])
+
+    with duration.time("ollama", errors=errors):
+        pass
+    with pytest.raises(RuntimeError):
+        with duration.time("ollama", errors=errors):
+            raise RuntimeError("down")
+
+    text = registry.render()
+    assert 'backend_seconds_count{backend="ollama"} 2' in text
+    assert 'backend_errors_total{backend="ollama"} 1' in text
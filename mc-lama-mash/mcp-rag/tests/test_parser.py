@@ -0,0 +1,65 @@
+"""
+Unit tests for concurrent fetching + chunking of the ingestion input.
+"""
+import asyncio
+import time
+
+import pytest
+from function.parser import chunk_data_stream
+
+
+class FakeFetcher:
+    """ serves each url after a delay, tracks how many run at once """
+    def __init__(self, delay=0.1, fail=()):
+        self.delay = delay
+        self.fail = fail
+        self.active = 0
+        self.peak = 0
+
+    async def iter_lines(self, url):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if url in self.fail:
+                raise RuntimeError(f"cannot fetch {url}")
+            yield f"# {url}"
+            yield "content"
+        finally:
+            self.active -= 1
+
+
+@pytest.mark.asyncio
+async def test_chunk_data_stream_fetches_concurrently():
+    urls = [f"https://example.com/{i}.md" for i in range(20)]
+    fetcher = FakeFetcher()
+
+    start = time.monotonic()
+    out = [entry async for entry in chunk_data_stream(urls + ["raw text"], fetcher)]
+
+    assert time.monotonic() - start < 1.0 # ~ one fetch, not 20 in a row
+    assert fetcher.peak == len(urls)
+    assert sorted(source for source, _ in out) == sorted(urls + ["text"])
+    assert all(chunk.index == 0 for _, chunk in out)
+
+
+@pytest.mark.asyncio
+async def test_chunk_data_stream_raises_fetch_errors():
+    fetcher = FakeFetcher(fail=("https://example.com/bad",))
+    with pytest.raises(RuntimeError):
+        async for _ in chunk_data_stream(
+                ["https://example.com/ok", "https://example.com/bad"], fetcher):
+            pass
+    assert fetcher.active == 0
+
+
+@pytest.mark.asyncio
+async def test_fetcher_connection_pool_is_closed():
+    from function.fetch import Fetcher
+    fetcher = Fetcher()
+    client = fetcher.client
+    fetcher.close() # from sync code, e.g. MCPServer.close
+    await asyncio.sleep(0.01)
+    assert client.is_closed
+    assert fetcher.client is not client # a new pool on next use
+    await fetcher.aclose()
@@ -0,0 +1,52 @@
+"""
+Unit tests of the model preloading.
+"""
+import asyncio
+
+import pytest
+from function import preload
+from function.preload import Preloader, parse_keep_alive, parse_models
+
+
+def test_parse_settings():
+    assert parse_keep_alive("") is None
+    assert parse_keep_alive("-1") == -1.0
+    assert parse_keep_alive("30m") == "30m"
+    assert parse_models(" a:1b, b ,,") == ["a:1b", "b"]
+
+
+@pytest.mark.asyncio
+async def test_failed_loads_are_retried(monkeypatch):
+    monkeypatch.setattr(preload, "RETRY_DELAY", 0.0)
+    attempts = []
+
+    async def load(model):
+        attempts.append(model)
+        if model == "b" and attempts.count("b") < 3:
+            raise ConnectionError("ollama is not up")
+        return 2.5 if model == "a" else None
+
+    preloader = Preloader(load)
+    preloader.start(["a", "b", "a"])
+    assert not preloader.done
+    assert preloader.status() == "loading models a, b"
+    await asyncio.wait_for(preloader.wait(), 5)
+    assert preloader.done
+    assert attempts.count("a") == 1 and attempts.count("b") == 3
+    # b didn't report its load time, the time of the call is taken instead
+    assert preloader.loaded["a"] == 2.5 and preloader.loaded["b"] < 1
+    assert preloader.errors == {}
+
+
+@pytest.mark.asyncio
+async def test_status_and_stop():
+    async def load(model):
+        raise RuntimeError(f"model {model} not found")
+
+    preloader = Preloader(load)
+    preloader.start(["a"])
+    await asyncio.sleep(0)
+    assert preloader.status() == "loading models a (a: model a not found)"
+    preloader.stop()
+    assert not preloader.done
+    assert Preloader(load).done # nothing to load
@@ -0,0 +1,79 @@
+"""
+Unit tests of the background model pull jobs.
+"""
+import asyncio
+
+import pytest
+from function import pulls
+from function.pulls import PullJobs
+
+
+class Pulls:
+    """ progress of two layers, a step per release() """
+    def __init__(self):
+        self.started = []
+        self.step = asyncio.Event()
+
+    async def pull(self, model):
+        self.started.append(model)
+        if model == "missing":
+            raise RuntimeError("pull model manifest: file does not exist")
+        yield {"status": "pulling manifest"}
+        for completed in (50, 100):
+            await self.step.wait()
+            self.step.clear()
+            yield {"status": "pulling a", "digest": "sha256:a", "total": 100,
+                   "completed": completed}
+            yield {"status": "pulling b", "digest": "sha256:b", "total": 300,
+                   "completed": completed * 3}
+        yield {"status": "success"}
+
+    async def release(self):
+        self.step.set()
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_pull_job_progress_and_deduplication():
+    fake = Pulls()
+    jobs = PullJobs(fake.pull)
+    job, started = jobs.start("m")
+    assert started and job.status == "pulling"
+    await fake.release()
+    # a second request for the model attaches to the running job
+    same, started = jobs.start("m")
+    assert same is job and not started
+    assert fake.started == ["m"]
+    status = job.to_dict()
+    assert (status["completed_bytes"], status["total_bytes"], status["percent"]) == (200, 400, 50.0)
+    assert jobs.running() == 1
+
+    await fake.release()
+    await job.task
+    status = jobs.get(job.id).to_dict()
+    assert (status["status"], status["message"], status["percent"]) == ("success", "success", 100.0)
+    assert jobs.running() == 0
+    # done, a new request pulls again (the model may have been updated)
+    again, started = jobs.start("m")
+    assert started and again.id != job.id
+    jobs.stop()
+    with pytest.raises(asyncio.CancelledError):
+        await again.task
+    assert again.status == "cancelled"
+
+
+@pytest.mark.asyncio
+async def test_failed_pulls_and_history(monkeypatch):
+    monkeypatch.setattr(pulls, "MAX_FINISHED", 2)
+    jobs = PullJobs(Pulls().pull)
+    failed, _ = jobs.start("missing")
+    await failed.task
+    assert failed.status == "error"
+    assert failed.to_dict()["message"] == "pull model manifest: file does not exist"
+    for _ in range(2):
+        job, _ = jobs.start("missing")
+        await job.task
+    # only the last MAX_FINISHED jobs are kept
+    assert jobs.get(failed.id) is None
+    assert len(jobs.jobs) == 2
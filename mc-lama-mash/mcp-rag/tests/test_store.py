@@ -0,0 +1,125 @@
+"""
+Unit tests for the vector stores.
+"""
+import numpy as np
+import pytest
+from function.func import MCPServer
+from function.store import NumpyStore, QuantizedStore
+
+
+def test_persistent_collection_survives_restart(tmp_path):
+    cfg = {"CHROMA_PATH": str(tmp_path / "chroma"), "EMBED_CACHE_PATH": ""}
+
+    server = MCPServer()
+    server.configure(cfg)
+    server.store.upsert(["0"], [[0.1, 0.2]], ["doc"], [{"source": "a"}])
+
+    # new replica/pod reopens the same collection without re-embedding
+    server = MCPServer()
+    server.configure(cfg)
+    assert server.store.count() == 1
+    assert server.store.get().documents == ["doc"]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_numpy_store_matches_exact_search(dtype):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((3000, 64)).astype(np.float32)
+    store = NumpyStore(dtype=dtype)
+    # several adds, the matrix grows past its initial capacity
+    for start in range(0, len(vectors), 700):
+        block = vectors[start:start + 700]
+        ids = [str(start + i) for i in range(len(block))]
+        store.upsert(ids, block, [f"doc {i}" for i in ids], [{"chunk": int(i)} for i in ids])
+    assert store.count() == len(vectors)
+
+    query = rng.standard_normal(64)
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    exact = np.argsort(-(unit @ (query / np.linalg.norm(query))))[:10]
+
+    result = store.query(query, 10, with_embeddings=True)
+    if dtype == "float32":
+        assert result.ids == [str(i) for i in exact]
+    else: # rounding may swap near ties
+        assert len(set(result.ids) & {str(i) for i in exact}) >= 9
+    assert result.documents[0] == f"doc {result.ids[0]}"
+    assert result.metadatas[0] == {"chunk": int(result.ids[0])}
+    assert result.embeddings.shape == (10, 64)
+
+
+def test_numpy_store_small_and_empty():
+    store = NumpyStore()
+    assert store.query([1.0, 0.0], 5).ids == []
+    result = store.query([1.0, 0.0], 5, with_embeddings=True)
+    assert result.ids == [] and len(result.embeddings) == 0
+    store.upsert(["a", "b"], [[1.0, 0.0], [0.0, 1.0]], ["x", "y"], [{}, {}])
+    assert store.query([0.1, 1.0], 5).ids == ["b", "a"]
+    with pytest.raises(ValueError):
+        store.upsert(["c"], [[1.0, 0.0, 0.0]], ["z"], [{}])
+
+
+
+@pytest.mark.parametrize("quantization,min_recall,max_bytes", [
+    ("int8", 0.95, 64 + 4), # bytes per vector, 4x less than float32
+    ("binary", 0.8, 64 // 8),
+])
+def test_quantized_store_recall(tmp_path, quantization, min_recall, max_bytes):
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((20, 64)).astype(np.float32)
+    vectors = centers[rng.integers(0, 20, 2000)] + 0.5 * rng.standard_normal((2000, 64))
+    store = QuantizedStore(quantization, path=str(tmp_path), recall_sample=1.0)
+    store.upsert([str(i) for i in range(len(vectors))], vectors,
+              [f"doc {i}" for i in range(len(vectors))], [{}] * len(vectors))
+    assert store.nbytes() <= max_bytes * 2 * len(vectors) # capacity doubles
+
+    for query in centers[:10] + 0.5 * rng.standard_normal((10, 64)):
+        result = store.query(query, 10, with_embeddings=True)
+        assert len(result.ids) == 10
+        assert result.documents[0] == f"doc {result.ids[0]}"
+        # re-ranked on the full precision vectors
+        assert np.allclose(result.embeddings[0] * np.linalg.norm(vectors[int(result.ids[0])]),
+                           vectors[int(result.ids[0])], atol=1e-5)
+    assert store.recall_total == 100
+    assert store.recall() >= min_recall
+
+    store.close()
+    assert not list(tmp_path.iterdir())
+
+
+def test_quantized_store_empty(tmp_path):
+    store = QuantizedStore("binary", path=str(tmp_path))
+    assert store.query([1.0, 0.0], 5).ids == []
+    store.close()
+
+
+@pytest.mark.parametrize("make_store", [
+    NumpyStore,
+    lambda: NumpyStore(dtype="float16"),
+    lambda: QuantizedStore("int8", recall_sample=1.0),
+])
+def test_upsert_and_delete(make_store):
+    store = make_store()
+    vectors = np.eye(4, dtype=np.float32)
+    store.upsert(["a", "b", "c", "d"], vectors, ["A", "B", "C", "D"],
+                 [{"i": i} for i in range(4)])
+
+    store.delete(["b", "unknown"])
+    assert store.count() == 3
+    assert sorted(store.get().ids) == ["a", "c", "d"]
+    # the moved last row is still found by its vector
+    assert store.query(vectors[3], 1).ids == ["d"]
+    assert store.query(vectors[3], 1, with_embeddings=True).embeddings[0].tolist() == [0, 0, 0, 1]
+
+    store.upsert(["a"], [vectors[1]], ["A2"], [{"i": 9}])
+    assert store.count() == 3
+    result = store.query(vectors[1], 1)
+    assert (result.ids, result.documents, result.metadatas) == (["a"], ["A2"], [{"i": 9}])
+    assert store.query(vectors[0], 3).ids[-1] == "a" # old vector is gone
+
+    store.update_metadata(["c", "unknown"], [{"i": 7}, {}])
+    assert store.query(vectors[2], 1).metadatas == [{"i": 7}]
+    assert store.count() == 3
+
+    with pytest.raises(ValueError):
+        store.upsert(["x", "x"], vectors[:2], ["X", "X"], [{}, {}])
+    store.close()
@@ -0,0 +1,367 @@
+"""
+Tests of the MCP tools against a fake (in-process) Ollama client.
+"""
+import asyncio
+import json
+import re
+import threading
+
+import ollama
+import pytest
+from function.func import MCPServer
+
+
+class FakeOllama:
+    """ embeds by counting letters, echoes the prompt it was given """
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.embed_calls = 0
+        self.generate_calls = 0
+        self.pull_calls = 0
+        self.keep_alive = [] # of each call
+
+    async def embed(self, model, input, keep_alive=None):
+        self.embed_calls += 1
+        self.keep_alive.append(keep_alive)
+        await asyncio.sleep(self.delay)
+        inputs = ([input] if input else []) if isinstance(input, str) else input
+        return {"embeddings": [self._vector(t) for t in inputs],
+                "load_duration": 1000}
+
+    async def generate(self, model, prompt, stream=False, keep_alive=None):
+        self.generate_calls += 1
+        self.keep_alive.append(keep_alive)
+        if "embed" in model:
+            raise ollama.ResponseError(f'"{model}" does not support generate', 400)
+        await asyncio.sleep(self.delay)
+        if stream:
+            async def parts():
+                for word in re.findall(r"\S+\s*", prompt):
+                    yield {"response": word, "done": False}
+                yield {"response": "", "done": True, "load_duration": 1000}
+            return parts()
+        return {"response": prompt, "load_duration": 1000}
+
+    async def list(self):
+        return {"models": []}
+
+    async def pull(self, model, stream=False):
+        self.pull_calls += 1
+
+        async def progress():
+            await asyncio.sleep(self.delay)
+            yield {"status": "pulling a", "digest": "sha256:a", "total": 10, "completed": 10}
+            yield {"status": "success"}
+        return progress()
+
+    @staticmethod
+    def _vector(text):
+        text = text.lower()
+        return [text.count(c) + 0.01 for c in "abcdefghijklmnopqrstuvwxyz"]
+
+
+def tool_text(result):
+    content = result[0] if isinstance(result, tuple) else result
+    return content[0].text
+
+
+@pytest.fixture(params=["chroma", "numpy", "quantized"])
+def server(request, tmp_path):
+    s = MCPServer()
+    s.configure({
+        "EMBED_CACHE_PATH": str(tmp_path / "cache.sqlite"),
+        "VECTOR_STORE": request.param,
+        "VECTOR_PATH": str(tmp_path),
+        # in-memory chroma is shared within the process
+        "CHROMA_COLLECTION": tmp_path.name,
+        })
+    s.client = FakeOllama()
+    yield s
+    s.close()
+
+
+@pytest.mark.asyncio
+async def test_embed_and_call_model(server):
+    out = await server.mcp.call_tool("embed_document", {
+        "data": ["# Cats\nmeow meow cats", "# Dogs\nwoof woof dogs"]})
+    assert tool_text(out) == "ok - Embedded 2 documents (2 chunks, 2 new or changed, 0 removed)"
+
+    out = await server.mcp.call_tool("call_model", {"prompt": "woof woof dogs"})
+    # both chunks fit the context, the most relevant one first
+    assert tool_text(out).index("[text > Dogs]") < tool_text(out).index("[text > Cats]")
+
+    server.top_k = 1
+    out = await server.mcp.call_tool("call_model", {"prompt": "woof woof dogs"})
+    assert "woof woof dogs" in tool_text(out)
+    assert "meow" not in tool_text(out)
+
+
+@pytest.mark.asyncio
+async def test_call_model_streams_progress(server):
+    from mcp.shared.memory import create_connected_server_and_client_session
+    await server.mcp.call_tool("embed_document", {"data": ["# Cats\nmeow"]})
+    progress = []
+
+    async def on_progress(done, total, message):
+        progress.append((done, message))
+
+    async with create_connected_server_and_client_session(server.mcp._mcp_server) as client:
+        result = await client.call_tool("call_model", {"prompt": "meow", "stream": True},
+                                        progress_callback=on_progress)
+    answer = result.content[0].text
+    assert answer.startswith("Using data: ") and answer.endswith("respond to prompt: meow")
+    # one notification per token, the answer is all of them
+    assert [done for done, _ in progress] == list(range(1, len(progress) + 1))
+    assert "".join(message for _, message in progress) == answer
+
+
+@pytest.mark.asyncio
+async def test_tool_and_backend_metrics(server):
+    await server.mcp.call_tool("embed_document", {"data": ["# Cats\nmeow meow cats"]})
+    await server.mcp.call_tool("call_model", {"prompt": "meow"})
+    await server.mcp.call_tool("call_model", {"prompt": "meow"})
+    await server.mcp.call_tool("list_models", {})
+
+    text = server.metrics.render()
+    assert 'mcp_rag_backend_duration_seconds_count{backend="ollama",operation="list"} 1' in text
+    assert 'mcp_rag_tool_calls_total{tool="call_model",status="ok"} 2' in text
+    assert 'mcp_rag_tool_duration_seconds_count{tool="embed_document"} 1' in text
+    assert 'mcp_rag_backend_duration_seconds_count{backend="ollama",operation="generate"} 2' in text
+    assert (f'mcp_rag_backend_duration_seconds_count{{backend="{server.vector_store}",'
+            'operation="query"} 2') in text
+    # the second prompt embedding came from the query cache
+    assert 'mcp_rag_cache_hit_ratio{cache="query_embedding"} 0.5' in text
+
+
+@pytest.mark.asyncio
+async def test_models_are_preloaded_and_kept_alive(server):
+    server.configure({"OLLAMA_PRELOAD_MODELS": "llama3.2:3b, mxbai-embed-large",
+                      "OLLAMA_KEEP_ALIVE": "24h"})
+    server.preload()
+    assert not server.preloader.done
+    await server.preloader.wait()
+    # the embedding model doesn't generate, it is loaded by an empty embed
+    assert server.preloader.loaded == {"llama3.2:3b": 1e-6, "mxbai-embed-large": 1e-6}
+
+    await server.mcp.call_tool("embed_document", {"data": ["# Cats\nmeow meow cats"]})
+    await server.mcp.call_tool("call_model", {"prompt": "meow"})
+    assert set(server.client.keep_alive) == {"24h"}
+    text = server.metrics.render()
+    assert 'mcp_rag_model_loaded{model="mxbai-embed-large"} 1' in text
+    assert 'mcp_rag_model_preload_seconds{model="llama3.2:3b"} 1e-06' in text
+    # preload, then the generation of call_model
+    assert 'mcp_rag_ollama_load_duration_seconds_count{model="llama3.2:3b"} 2' in text
+
+
+@pytest.mark.asyncio
+async def test_pull_model_runs_in_background(server):
+    server.client = FakeOllama(delay=0.05)
+    out = [tool_text(await server.mcp.call_tool("pull_model", {"model": "all-minilm"}))
+           for _ in range(2)]
+    job_id = out[0].rsplit(" ", 1)[1]
+    assert out[0] == f"Pulling model all-minilm in background, job id: {job_id}"
+    assert out[1] == f"Model all-minilm is already being pulled, job id: {job_id}"
+    status = json.loads(tool_text(
+            await server.mcp.call_tool("pull_status", {"job_id": job_id})))
+    assert status["status"] == "pulling"
+
+    await server.pulls.get(job_id).task
+    status = json.loads(tool_text(
+            await server.mcp.call_tool("pull_status", {"job_id": job_id})))
+    assert (status["status"], status["completed_bytes"], status["percent"]) == ("success", 10, 100.0)
+    assert server.client.pull_calls == 1
+    out = await server.mcp.call_tool("pull_status", {"job_id": "unknown"})
+    assert tool_text(out) == "Oops, no pull job unknown on this server"
+    text = server.metrics.render()
+    assert 'mcp_rag_pull_jobs{status="success"} 1' in text
+    assert 'mcp_rag_backend_duration_seconds_count{backend="ollama",operation="pull"} 1' in text
+
+
+class PagesFetcher:
+    """ serves pages from a dict, pages can be edited between calls """
+    def __init__(self, pages):
+        self.pages = pages
+
+    async def iter_lines(self, url):
+        for line in self.pages[url].splitlines():
+            yield line
+
+    def close(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_reingestion_only_embeds_the_diff(server):
+    url = "https://example.com/docs.md"
+    sections = [f"# Section {i}\n" + f"text of section {i} " * 40 for i in range(5)]
+    server.fetcher = PagesFetcher({url: "\n".join(sections)})
+    server.embed_cache_path = "" # count every embedded chunk
+
+    out = await server.mcp.call_tool("embed_document", {"data": [url, "some raw text"]})
+    assert tool_text(out) == "ok - Embedded 2 documents (6 chunks, 6 new or changed, 0 removed)"
+    embed_calls = server.client.embed_calls
+
+    # unchanged: nothing is embedded or written again
+    out = await server.mcp.call_tool("embed_document", {"data": [url, "some raw text"]})
+    assert tool_text(out) == "ok - Embedded 2 documents (6 chunks, 0 new or changed, 0 removed)"
+    assert server.client.embed_calls == embed_calls
+
+    # one section edited, one removed
+    sections[1] = "# Section 1\nrewritten"
+    del sections[3]
+    server.fetcher.pages[url] = "\n".join(sections)
+    embedded = []
+    server.client.embed = lambda model, input, keep_alive=None: (
+            embedded.extend(input) or FakeOllama.embed(server.client, model, input))
+    out = await server.mcp.call_tool("embed_document", {"data": [url]})
+    # section 1 changed, its old version and section 3 are stale, section 4
+    # moved up: only its position is updated, it is not embedded again
+    assert tool_text(out) == "ok - Embedded 1 documents (4 chunks, 1 new or changed, 2 removed)"
+    assert embedded == ["# Section 1\nrewritten"]
+    assert server.store.count() == 4 + 1 # and the raw text
+    stored = server.store.get()
+    assert "rewritten" in "\n".join(stored.documents)
+    assert "section 3" not in "\n".join(stored.documents)
+    assert "some raw text" in "\n".join(stored.documents)
+    moved_id, moved = next((doc_id, meta) for doc_id, doc, meta
+                           in zip(stored.ids, stored.documents, stored.metadatas)
+                           if doc.startswith("# Section 4"))
+    assert moved["chunk"] == 3
+    assert server.manifest.chunks(url)[moved_id] == 3
+
+    # the page is empty now: all its chunks are stale
+    server.fetcher.pages[url] = ""
+    out = await server.mcp.call_tool("embed_document", {"data": [url]})
+    assert tool_text(out) == "ok - Embedded 0 documents (0 chunks, 0 new or changed, 4 removed)"
+    assert server.store.get().documents == ["some raw text"]
+    assert server.manifest.chunks(url) == {}
+    assert server.lexical.search("section", k=4) == []
+
+
+@pytest.mark.asyncio
+async def test_traced_pipeline(server, tmp_path):
+    path = tmp_path / "traces.jsonl"
+    server.configure({"TRACE_FILE": str(path)})
+    url = "https://example.com/docs.md"
+    server.fetcher = PagesFetcher({url: "# Dogs\n" + "woof " * 20})
+    await server.mcp.call_tool("embed_document", {"data": [url, "# Cats\nmeow"]})
+    await server.mcp.call_tool("call_model", {"prompt": "woof dogs"})
+    server.tracer.close() # the traces are written in background until then
+
+    embed_document, call_model = [
+        {s["name"]: s for s in json.loads(line)["spans"]}
+        for line in path.read_text().splitlines()]
+    root = embed_document["embed_document"]
+    assert root["attributes"] == {"documents": 2, "chunks": 2, "changed": 2, "removed": 0}
+    assert embed_document["fetch"]["attributes"]["bytes"] == len("# Dogs\n" + "woof " * 20) + 1
+    assert embed_document["parse"]["attributes"] == {"bytes": 11, "chunks": 1}
+    assert embed_document["embed"]["attributes"]["texts"] == 2
+    assert embed_document["vector_upsert"]["attributes"]["chunks"] == 2
+    assert all(s["trace_id"] == root["trace_id"] for s in embed_document.values())
+
+    assert set(call_model) == {"call_model", "lexical_search", "embed",
+                               "vector_query", "prompt_assembly", "generate"}
+    assert call_model["embed"]["attributes"]["tokens"] == 3
+    assert call_model["prompt_assembly"]["attributes"]["chunks"] == 2
+    generate = call_model["generate"]["attributes"]
+    # the fake model echoes the prompt
+    assert generate["prompt_bytes"] == generate["response_bytes"]
+    assert generate["prompt_tokens"] > call_model["prompt_assembly"]["attributes"]["tokens"]
+
+
+@pytest.mark.asyncio
+async def test_partial_configure_keeps_tracing(server, tmp_path):
+    path = tmp_path / "traces.jsonl"
+    server.configure({"TRACE_FILE": str(path)})
+    tracer = server.tracer
+    server.configure({"RAG_TOP_K": "2"})
+    assert server.tracer is tracer
+    await server.mcp.call_tool("call_model", {"prompt": "meow"})
+    server.tracer.close()
+    assert len(path.read_text().splitlines()) == 1
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_calls_are_coalesced(server):
+    server.client = FakeOllama(delay=0.05)
+    url = "https://example.com/docs.md"
+    fetches = []
+
+    class CountingFetcher(PagesFetcher):
+        async def iter_lines(self, url):
+            fetches.append(url)
+            await asyncio.sleep(0.05)
+            async for line in super().iter_lines(url):
+                yield line
+
+    server.fetcher = CountingFetcher({url: "# Dogs\nwoof woof dogs"})
+    server.embed_cache_path = ""
+    out = await asyncio.gather(
+            server.mcp.call_tool("embed_document", {"data": [url]}),
+            server.mcp.call_tool("embed_document", {"data": [url, "# Cats\nmeow"]}))
+    assert fetches == [url]
+    assert tool_text(out[0]) == "ok - Embedded 1 documents (1 chunks, 1 new or changed, 0 removed)"
+    assert tool_text(out[1]) == "ok - Embedded 2 documents (2 chunks, 2 new or changed, 0 removed)"
+    assert server.store.count() == 2
+
+    embed_calls = server.client.embed_calls
+    out = await asyncio.gather(*(server.mcp.call_tool(
+            "call_model", {"prompt": "woof  dogs"}) for _ in range(4)))
+    assert len({tool_text(o) for o in out}) == 1
+    assert server.client.embed_calls == embed_calls + 1
+    assert server.client.generate_calls == 1
+    assert 'mcp_rag_coalesced_calls_total{operation="generate"} 3' in server.metrics.render()
+
+
+@pytest.mark.asyncio
+async def test_store_is_opened_off_the_event_loop(monkeypatch):
+    from function import func
+    opened_in = []
+
+    class RecordingStore(func.NumpyStore):
+        def __init__(self, *args, **kwargs):
+            opened_in.append(threading.current_thread())
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(func, "NumpyStore", RecordingStore)
+    s = MCPServer()
+    s.configure({"VECTOR_STORE": "numpy", "RAG_RETRIEVAL": "vector",
+                 "EMBED_CACHE_PATH": ""})
+    s.client = FakeOllama()
+    # a cold replica: the first call opens the store
+    await s.mcp.call_tool("call_model", {"prompt": "meow"})
+    assert len(opened_in) == 1
+    assert opened_in[0] is not threading.current_thread()
+    # no keyword index in vector mode, nothing would keep it up to date
+    await s.mcp.call_tool("embed_document", {"data": ["# Cats\nmeow"]})
+    assert s.manifest.chunks("text") and s._lexical is None
+    s.close()
+
+
+@pytest.mark.asyncio
+async def test_identifier_query_skips_embedding(server):
+    await server.mcp.call_tool("embed_document", {"data": [
+        "# Build\nPass --build-arg to set build arguments",
+        "# Config\nThe function configuration is kept in func.yaml"]})
+    embed_calls = server.client.embed_calls
+
+    out = await server.mcp.call_tool("call_model", {"prompt": "func.yaml"})
+    assert "[text > Config]" in tool_text(out)
+    assert "--build-arg" not in tool_text(out)
+    # answered from the lexical index alone
+    assert server.client.embed_calls == embed_calls
+
+
+@pytest.mark.asyncio
+async def test_tools_do_not_block_each_other(server):
+    server.client = FakeOllama(delay=0.2)
+    # no admission limit, the calls would be served in waves of 4
+    server.configure({"OLLAMA_MAX_CONCURRENCY": "0"})
+    await server.mcp.call_tool("embed_document", {"data": ["some text"]})
+
+    start = asyncio.get_running_loop().time()
+    await asyncio.gather(*(
+        server.mcp.call_tool("call_model", {"prompt": f"question {i}"})
+        for i in range(10)))
+    # 10 calls with 2 slow backend calls each: 4s one after the other
+    assert asyncio.get_running_loop().time() - start < 1.0
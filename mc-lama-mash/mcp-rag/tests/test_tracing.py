@@ -0,0 +1,132 @@
+"""
+Unit tests of the stage tracing.
+"""
+import asyncio
+import json
+
+import pytest
+from function import tracing
+
+
+class ListExporter:
+    def __init__(self):
+        self.traces = []
+
+    def export(self, trace):
+        self.traces.append(trace)
+
+    def close(self):
+        pass
+
+
+def test_spans_nest_within_a_sampled_trace():
+    exporter = ListExporter()
+    tracer = tracing.Tracer(1.0, (exporter,))
+    with tracer.trace("call_model", model="m") as root:
+        with tracing.span("embed", tokens=3):
+            tracing.current_span().set(cached=0)
+        with pytest.raises(ValueError):
+            with tracing.span("generate"):
+                raise ValueError("boom")
+    assert tracing.current_span() is tracing.NOOP
+
+    [trace] = exporter.traces
+    spans = {s.name: s for s in trace.spans}
+    assert spans["call_model"] is root
+    assert spans["embed"].parent_id == root.span_id
+    assert spans["embed"].attributes == {"tokens": 3, "cached": 0}
+    assert spans["generate"].error == "ValueError: boom"
+    assert root.error == ""
+    assert root.start_ns <= spans["embed"].start_ns <= spans["embed"].end_ns <= root.end_ns
+
+
+def test_sampling():
+    exporter = ListExporter()
+    assert tracing.Tracer(0.0, (exporter,)).trace("t") is tracing.NOOP
+    # nothing to export to -> nothing is traced
+    assert tracing.Tracer(1.0).trace("t") is tracing.NOOP
+    # spans outside of a trace cost nothing
+    assert tracing.span("embed") is tracing.NOOP
+
+    tracer = tracing.Tracer(0.5, (exporter,))
+    for _ in range(1000):
+        with tracer.trace("t"):
+            pass
+    assert 350 < len(exporter.traces) < 650
+
+
+@pytest.mark.asyncio
+async def test_tasks_inherit_the_current_span():
+    exporter = ListExporter()
+    tracer = tracing.Tracer(1.0, (exporter,))
+
+    async def fetch(i):
+        with tracing.span("fetch", i=i):
+            await asyncio.sleep(0)
+
+    with tracer.trace("embed_document") as root:
+        await asyncio.gather(*(asyncio.create_task(fetch(i)) for i in range(3)))
+    fetches = [s for s in exporter.traces[0].spans if s.name == "fetch"]
+    assert len(fetches) == 3
+    assert all(s.parent_id == root.span_id for s in fetches)
+
+
+def test_file_exporter(tmp_path):
+    path = tmp_path / "traces" / "traces.jsonl"
+    tracer = tracing.from_config({"TRACE_FILE": str(path)}, "test")
+    for _ in range(2):
+        with tracer.trace("call_model"):
+            with tracing.span("generate", tokens=5):
+                pass
+    tracer.close() # the traces are written in background until then
+    traces = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(traces) == 2
+    assert [s["name"] for s in traces[0]["spans"]] == ["generate", "call_model"]
+    assert traces[0]["spans"][0]["attributes"] == {"tokens": 5}
+    assert traces[0]["trace_id"] != traces[1]["trace_id"]
+
+
+def test_otlp_payload():
+    exporter = tracing.OTLPExporter("http://collector:4318/", "mcp-rag")
+    assert exporter.url == "http://collector:4318/v1/traces"
+    trace = tracing.Trace(tracing.Tracer())
+    root = trace.root = tracing.Span(trace, "call_model", None, {"stream": False})
+    child = tracing.Span(trace, "generate", root, {"tokens": 5, "ms": 1.5, "model": "m"})
+    child.fail("timeout")
+    trace.spans = [child, root]
+
+    payload = exporter.payload(trace)
+    resource = payload["resourceSpans"][0]
+    assert resource["resource"]["attributes"] == [
+        {"key": "service.name", "value": {"stringValue": "mcp-rag"}}]
+    generate, call_model = resource["scopeSpans"][0]["spans"]
+    assert len(generate["traceId"]) == 32 and len(generate["spanId"]) == 16
+    assert generate["parentSpanId"] == call_model["spanId"]
+    assert generate["attributes"] == [
+        {"key": "tokens", "value": {"intValue": "5"}},
+        {"key": "ms", "value": {"doubleValue": 1.5}},
+        {"key": "model", "value": {"stringValue": "m"}}]
+    assert generate["status"] == {"code": 2, "message": "timeout"}
+    assert call_model["attributes"] == [{"key": "stream", "value": {"boolValue": False}}]
+    assert call_model["parentSpanId"] == ""
+
+
+@pytest.mark.asyncio
+async def test_otlp_export_posts_in_background():
+    import httpx
+    received = []
+
+    def handler(request):
+        received.append((request.url.path, json.loads(request.content)))
+        return httpx.Response(200)
+
+    exporter = tracing.OTLPExporter("http://collector:4318", "mcp-rag")
+    exporter._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    tracer = tracing.Tracer(1.0, (exporter,))
+    with tracer.trace("call_model"):
+        pass
+    await asyncio.gather(*exporter._pending)
+    [(path, payload)] = received
+    assert path == "/v1/traces"
+    assert payload["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["name"] == "call_model"
+    tracer.close()
@@ -31,14 +31,21 @@ async def main():
             #models = unload_list_models(models)
             #print(f"list of models currently available: {models}")
 
+            # print partial tokens as they are generated (stream=True)
+            async def on_token(progress, total, message):
+                print(message, end="", flush=True)
+
             # create a request for the model
             response = await sess.call_tool(
                 name="call_model",
                 arguments={
                     "prompt":"How to properly tie a tie?",
                     "model":"llama3.2:3b",
-                    }
+                    "stream": True,
+                    },
+                progress_callback=on_token,
                 )
+            print()
             print(response.content)
 
 if __name__ == "__main__":
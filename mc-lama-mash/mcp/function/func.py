@@ -3,9 +3,17 @@
 # Function as an MCP Server implementation
 import logging
 
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
 import ollama
 import asyncio
+import collections
+import functools
+import time
+
+from .admission import Admission, read_body, tool_calls
+from .metrics import CONTENT_TYPE, Registry
+from .preload import Preloader, parse_keep_alive, parse_models
+from .pulls import PullJobs
 
 def new():
     """ New is the only method that must be implemented by a Function.
@@ -13,6 +21,20 @@ def new():
     """
     return Function()
 
+async def forward_stream(ctx: Context, parts, text_of) -> str:
+    """
+    Forward partial tokens of a streamed ollama response to the MCP client as
+    progress notifications (progress = parts so far, message = new text).
+    Returns the whole response text.
+    """
+    out = []
+    async for part in parts:
+        text = text_of(part)
+        if text:
+            out.append(text)
+            await ctx.report_progress(len(out), message=text)
+    return "".join(out)
+
 class MCPServer:
     """
     MCP server that exposes a chat with an LLM model running on Ollama server
@@ -23,42 +45,241 @@ class MCPServer:
         # Create FastMCP instance with stateless HTTP for Kubernetes deployment
         self.mcp = FastMCP("MCP-Ollama server", stateless_http=True)
 
+        # default model of call_model
+        self.model = "llama3.2:3b"
+        # how long ollama keeps a model in memory after a call (None = its
+        # default) and the models loaded at start, see configure/preload
+        self.keep_alive = None
+        self.preload_models: list[str] = []
+        self.preloader = Preloader(self.load_model)
+        # model pulls run in background, see pull_model/pull_status
+        self.pulls = PullJobs(self.pull)
+        self._init_metrics()
+        # per model limit of the calls to ollama, see configure
+        self.admission = Admission(on_wait=self._observe_wait)
         self._register_tools()
 
         # Get the ASGI app from FastMCP
         self._app = self.mcp.streamable_http_app()
 
-        self.client = ollama.Client()
+        # async client -> a slow generation doesn't stall other requests
+        self.client = ollama.AsyncClient()
+
+    def configure(self, cfg):
+        """
+        Apply Function configuration (environment).
+        - OLLAMA_HOST: url of the ollama server (e.g. a local stand-in),
+          default the local one.
+        - OLLAMA_TIMEOUT: seconds to wait for an ollama response (default none).
+        - OLLAMA_MAX_CONCURRENCY: calls to ollama at once per model (0 = no
+          limit), the others wait in line.
+        - OLLAMA_MAX_QUEUE: calls waiting per model, more are turned away (429).
+        - OLLAMA_QUEUE_TIMEOUT: seconds a call may wait, calls that would wait
+          longer are turned away (503).
+        - OLLAMA_KEEP_ALIVE: how long ollama keeps a model in memory after a
+          call, seconds or a duration ("30m", "24h"), negative = forever.
+        - OLLAMA_PRELOAD_MODELS: comma separated models loaded when the
+          Function starts, it is ready once they are in memory.
+        """
+        self.admission.concurrency = int(cfg.get("OLLAMA_MAX_CONCURRENCY",
+                                                 self.admission.concurrency))
+        self.admission.max_queue = int(cfg.get("OLLAMA_MAX_QUEUE", self.admission.max_queue))
+        self.admission.timeout = float(cfg.get("OLLAMA_QUEUE_TIMEOUT", self.admission.timeout))
+        if "OLLAMA_KEEP_ALIVE" in cfg:
+            self.keep_alive = parse_keep_alive(cfg["OLLAMA_KEEP_ALIVE"])
+        if "OLLAMA_PRELOAD_MODELS" in cfg:
+            self.preload_models = parse_models(cfg["OLLAMA_PRELOAD_MODELS"])
+        if cfg.get("OLLAMA_HOST") or cfg.get("OLLAMA_TIMEOUT"):
+            self.client = ollama.AsyncClient(
+                    host=cfg.get("OLLAMA_HOST") or None,
+                    timeout=float(cfg["OLLAMA_TIMEOUT"]) if cfg.get("OLLAMA_TIMEOUT") else None)
+
+    def _init_metrics(self):
+        """ metrics of the tools and ollama calls, served on /metrics """
+        self.metrics = Registry()
+        self.requests_in_flight = self.metrics.gauge(
+                "mcp_ollama_requests_in_flight", "MCP requests being served")
+        self.tool_calls = self.metrics.counter(
+                "mcp_ollama_tool_calls_total", "MCP tool calls by result",
+                ["tool", "status"])
+        self.tool_duration = self.metrics.histogram(
+                "mcp_ollama_tool_duration_seconds", "MCP tool call duration", ["tool"])
+        self.tools_in_flight = self.metrics.gauge(
+                "mcp_ollama_tool_calls_in_flight", "MCP tool calls running", ["tool"])
+        self.backend_duration = self.metrics.histogram(
+                "mcp_ollama_backend_duration_seconds", "Ollama call duration",
+                ["backend", "operation"])
+        self.backend_errors = self.metrics.counter(
+                "mcp_ollama_backend_errors_total", "Failed Ollama calls",
+                ["backend", "operation"])
+        self.metrics.gauge(
+                "mcp_ollama_admission_in_flight", "Ollama calls holding a slot, by model",
+                ["model"], callback=lambda: {(name,): m.in_flight
+                                             for name, m in self.admission.models.items()})
+        self.metrics.gauge(
+                "mcp_ollama_admission_queue_depth", "Ollama calls waiting for a slot, by model",
+                ["model"], callback=lambda: {(name,): len(m.waiters)
+                                             for name, m in self.admission.models.items()})
+        self.admission_wait = self.metrics.histogram(
+                "mcp_ollama_admission_wait_seconds", "Time waited for an ollama slot",
+                ["model"])
+        self.metrics.counter(
+                "mcp_ollama_admission_rejected_total",
+                "Ollama calls turned away (queue_full, deadline, timeout)",
+                ["model", "reason"], callback=lambda: self.admission.rejected)
+        self.metrics.gauge(
+                "mcp_ollama_pull_jobs", "Recent model pull jobs by status", ["status"],
+                callback=lambda: collections.Counter(
+                        (job.status,) for job in self.pulls.jobs.values()))
+        self.metrics.gauge(
+                "mcp_ollama_model_loaded", "1 once a model preloaded at start is in memory",
+                ["model"], callback=lambda: {(model,): int(model in self.preloader.loaded)
+                                             for model in self.preloader.models})
+        self.metrics.gauge(
+                "mcp_ollama_model_preload_seconds", "Time ollama took to load a model at start",
+                ["model"], callback=lambda: {(model,): seconds for model, seconds
+                                             in self.preloader.loaded.items()})
+        self.load_duration = self.metrics.histogram(
+                "mcp_ollama_load_duration_seconds",
+                "Model load time of the ollama calls, as reported by ollama", ["model"])
+
+    def _observe_wait(self, model: str, seconds: float):
+        self.admission_wait.observe(model, value=seconds)
+
+    def _observe_load(self, model: str, response):
+        """ record the model load time reported in an ollama response, in seconds """
+        load_duration = response.get("load_duration")
+        if load_duration is None:
+            return None
+        seconds = load_duration / 1e9
+        self.load_duration.observe(model, value=seconds)
+        return seconds
+
+    def preload(self):
+        """ load preload_models into ollama in background, see Function.ready """
+        self.preloader.start(self.preload_models)
+
+    async def load_model(self, model: str):
+        """
+        Load model into ollama's memory (a call without input), kept there
+        for keep_alive. Returns the seconds ollama took to load it.
+        """
+        with self.observe("ollama", "load"):
+            try:
+                response = await self.client.generate(
+                        model=model, prompt="", keep_alive=self.keep_alive)
+            except ollama.ResponseError:
+                # embedding models don't generate
+                response = await self.client.embed(
+                        model=model, input="", keep_alive=self.keep_alive)
+        return self._observe_load(model, response)
+
+    async def pull(self, model: str):
+        """ progress messages of pulling model into ollama """
+        with self.observe("ollama", "pull"):
+            async for progress in await self.client.pull(model, stream=True):
+                yield progress
+
+    def admit(self, tool: str, arguments: dict):
+        """ raise Overloaded if the ollama model the tool call needs has no capacity left """
+        if tool == "call_model":
+            self.admission.check(arguments.get("model") or self.model)
+
+    def observe(self, backend: str, operation: str):
+        """ time a backend call (with block) into the backend metrics """
+        return self.backend_duration.time(backend, operation, errors=self.backend_errors)
+
+    def _tool(self):
+        """ mcp.tool() recording calls, failures and duration of the tool """
+        def register(fn):
+            name = fn.__name__
+
+            @functools.wraps(fn)
+            async def tool(*args, **kwargs):
+                self.tools_in_flight.inc(name)
+                start = time.perf_counter()
+                status = "error"
+                try:
+                    result = await fn(*args, **kwargs)
+                    # tools report failures as text, see _register_tools
+                    if not (isinstance(result, str) and result.startswith(("Error", "Oops"))):
+                        status = "ok"
+                    return result
+                finally:
+                    self.tools_in_flight.dec(name)
+                    self.tool_duration.observe(name, value=time.perf_counter() - start)
+                    self.tool_calls.inc(name, status)
+            return self.mcp.tool()(tool)
+        return register
 
     def _register_tools(self):
         """Register MCP tools."""
-        @self.mcp.tool()
-        def list_models():
+        @self._tool()
+        async def list_models():
             """List all models currently available on the Ollama server"""
             try:
-                models = self.client.list()
+                with self.observe("ollama", "list"):
+                    models = await self.client.list()
             except Exception as e:
                 return f"Oops, failed to list models because: {str(e)}"
             #return [model['name'] for model in models['models']]
             return [model for model in models]
 
-        @self.mcp.tool()
-        def pull_model(model: str) -> str:
-            """Download and install an Ollama model into the running server"""
-            try:
-                _ = self.client.pull(model)
-            except Exception as e:
-                return f"Error occurred during pulling of a model: {str(e)}"
-            return f"Success! model {model} is available"
+        @self._tool()
+        async def pull_model(model: str) -> str:
+            """
+            Download and install an Ollama model into the running server.
+            The pull runs in background, this returns its job id: see
+            pull_status for the progress. A model already being pulled is
+            not pulled twice, the id of the running job is returned.
+            """
+            job, started = self.pulls.start(model)
+            if not started:
+                return f"Model {model} is already being pulled, job id: {job.id}"
+            return f"Pulling model {model} in background, job id: {job.id}"
+
+        @self._tool()
+        async def pull_status(job_id: str = ""):
+            """
+            Progress of a pull_model job: status (pulling, success, error or
+            cancelled) and bytes downloaded of the model's layers.
+            Without job_id, the status of all the recent pull jobs.
+            """
+            if not job_id:
+                return [job.to_dict() for job in self.pulls.jobs.values()] or "No pull jobs"
+            job = self.pulls.get(job_id)
+            if job is None:
+                # jobs live in the replica that started them
+                return f"Oops, no pull job {job_id} on this server"
+            return job.to_dict()
 
-        @self.mcp.tool()
-        def call_model(prompt: str, model: str = "llama3.2:3b") -> str:
-            """Send a prompt to a model being served on ollama server"""
+        @self._tool()
+        async def call_model(ctx: Context, prompt: str,
+                             model: str = self.model,
+                             stream: bool = False) -> str:
+            """
+            Send a prompt to a model being served on ollama server.
+            With stream=True partial tokens are sent as progress notifications
+            while the answer is being generated (request with a progress token).
+            """
             try:
-                response = self.client.chat(
-                        model=model,
-                        messages=[{"role": "user", "content": prompt}]
-                        )
+                async with self.admission.slot(model):
+                    with self.observe("ollama", "chat"):
+                        if stream:
+                            parts = await self.client.chat(
+                                    model=model,
+                                    messages=[{"role": "user", "content": prompt}],
+                                    stream=True,
+                                    keep_alive=self.keep_alive
+                                    )
+                            return await forward_stream(
+                                    ctx, parts, lambda p: p['message']['content'])
+                        response = await self.client.chat(
+                                model=model,
+                                messages=[{"role": "user", "content": prompt}],
+                                keep_alive=self.keep_alive
+                                )
+                self._observe_load(model, response)
             except Exception as e:
                 return f"Error occurred during calling the model: {str(e)}"
             return response['message']['content']
@@ -74,7 +295,11 @@ class Function:
         configuration.
         """
         self.mcp_server = MCPServer()
-        self._mcp_initialized = False
+        # MCP lifespan is started exactly once, see start()/_start_mcp
+        self._mcp_task = None
+        self._mcp_ready = None
+        self._mcp_stop = None
+        self._mcp_error = None
 
     async def handle(self, scope, receive, send):
         """
@@ -82,20 +307,58 @@ class Function:
         This handles all the incoming requests.
         """
 
-        # Initialize MCP server on first request
-        if not self._mcp_initialized:
-            await self._initialize_mcp()
-
         # Route MCP requests
-        if scope['path'].startswith('/mcp'):
-            await self.mcp_server.handle(scope, receive, send)
+        if scope.get('path', '').startswith('/mcp'):
+            # started by start(), waits only while it is still coming up
+            await self._wait_mcp()
+            if scope.get('method') == 'POST' and self.mcp_server.admission.enabled:
+                # fail fast when a tool call's model has no capacity left:
+                # Overloaded is answered with 429/503 by the middleware
+                body, receive = await read_body(receive)
+                for tool, arguments in tool_calls(body):
+                    self.mcp_server.admit(tool, arguments)
+            self.mcp_server.requests_in_flight.inc()
+            try:
+                await self.mcp_server.handle(scope, receive, send)
+            finally:
+                self.mcp_server.requests_in_flight.dec()
+            return
+
+        if scope.get('path') == '/metrics':
+            await self._send_metrics(send)
             return
 
         # Default response for non-MCP requests
         await self._send_default_response(send)
 
-    async def _initialize_mcp(self):
-        """Initialize the MCP server by sending lifespan startup event."""
+    def metrics(self) -> str:
+        """ metrics in the Prometheus text format """
+        return self.mcp_server.metrics.render()
+
+    async def _send_metrics(self, send):
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [[b'content-type', CONTENT_TYPE.encode()]],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': self.metrics().encode(),
+        })
+
+    def _start_mcp(self):
+        """
+        Start the MCP server lifespan (session manager) in background.
+        Runs exactly once, needs a running event loop.
+        """
+        if self._mcp_task is not None:
+            return
+        self._mcp_ready = asyncio.Event()
+        self._mcp_stop = asyncio.Event()
+        self._mcp_task = asyncio.create_task(self._run_mcp_lifespan())
+
+    async def _run_mcp_lifespan(self):
+        """Drive the MCP server lifespan: startup now, shutdown on stop()."""
         lifespan_scope = {'type': 'lifespan', 'asgi': {'version': '3.0'}}
         startup_sent = False
 
@@ -104,21 +367,35 @@ class Function:
             if not startup_sent:
                 startup_sent = True
                 return {'type': 'lifespan.startup'}
-            await asyncio.Event().wait()  # Wait forever for shutdown
+            await self._mcp_stop.wait()
+            return {'type': 'lifespan.shutdown'}
 
         async def lifespan_send(message):
             if message['type'] == 'lifespan.startup.complete':
-                self._mcp_initialized = True
+                self._mcp_ready.set()
             elif message['type'] == 'lifespan.startup.failed':
                 logging.error(f"MCP startup failed: {message}")
+                self._mcp_error = message.get('message') or "startup failed"
 
-        # Start lifespan in background
-        asyncio.create_task(self.mcp_server.handle(
-            lifespan_scope, lifespan_receive, lifespan_send
-        ))
+        try:
+            await self.mcp_server.handle(
+                lifespan_scope, lifespan_receive, lifespan_send
+            )
+        except Exception as e:
+            logging.error(f"MCP lifespan failed: {e}")
+            self._mcp_error = self._mcp_error or str(e)
+        finally:
+            # never leave requests waiting for a server that is not coming
+            if not self._mcp_ready.is_set():
+                self._mcp_error = self._mcp_error or "lifespan exited"
+                self._mcp_ready.set()
 
-        # Brief wait for startup completion
-        await asyncio.sleep(0.1)
+    async def _wait_mcp(self):
+        """Wait until the MCP server is up (starting it if start() did not)."""
+        self._start_mcp()
+        await self._mcp_ready.wait()
+        if self._mcp_error:
+            raise RuntimeError(f"MCP server failed to start: {self._mcp_error}")
 
     async def _send_default_response(self, send):
         """
@@ -137,12 +414,27 @@ class Function:
 
     def start(self, cfg):
         logging.info("Function starting")
+        self.mcp_server.configure(cfg)
+        # MCP server is started here, not on the first request
+        self._start_mcp()
+        # ollama loads the models meanwhile, readiness waits for them
+        self.mcp_server.preload()
 
     def stop(self):
         logging.info("Function stopping")
+        if self._mcp_stop is not None:
+            self._mcp_stop.set()
+        self.mcp_server.preloader.stop()
+        self.mcp_server.pulls.stop()
 
     def alive(self):
         return True, "Alive"
 
     def ready(self):
+        if self._mcp_ready is None or not self._mcp_ready.is_set():
+            return False, "MCP server starting"
+        if self._mcp_error:
+            return False, f"MCP server failed to start: {self._mcp_error}"
+        if not self.mcp_server.preloader.done:
+            return False, self.mcp_server.preloader.status()
         return True, "Ready"
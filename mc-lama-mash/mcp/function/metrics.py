@@ -0,0 +1,145 @@
+import bisect
+import time
+from typing import Callable, Optional, Sequence
+
+# seconds, from a cache hit to a long generation
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class Metric:
+    """
+    Base of the metrics, values are kept per label values (a tuple).
+    Recording is a dict lookup and a few additions without a lock: record
+    from the event loop thread, where nothing can interleave with it.
+    """
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 callback: Optional[Callable[[], dict]] = None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        # read the values ({labels: value}) on render instead
+        self.callback = callback
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return lines + self.samples()
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def _labels(self, values, extra: str = "") -> str:
+        pairs = [f'{k}="{escape(v)}"' for k, v in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=(), callback=None):
+        super().__init__(name, help, labels, callback)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels: str, value: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + value
+
+    def samples(self):
+        values = self.callback() if self.callback else self.values
+        return [f"{self.name}{self._labels(k)} {format_value(v)}"
+                for k, v in values.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels: str, value: float):
+        self.values[labels] = value
+
+    def dec(self, *labels: str, value: float = 1.0):
+        self.inc(*labels, value=-value)
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (not cumulative) ..., +Inf], sum
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, *labels: str, value: float):
+        state = self.values.get(labels)
+        if state is None:
+            state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def time(self, *labels: str, errors: Optional[Counter] = None) -> "_Timer":
+        """
+        context manager observing the duration of its block, errors (with
+        the same labels) counts the blocks that raised
+        """
+        return _Timer(self, labels, errors)
+
+    def samples(self):
+        lines = []
+        for k, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else format_value(bound)
+                bucket = self._labels(k, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(k)} {format_value(total)}")
+            lines.append(f"{self.name}_count{self._labels(k)} {cumulative}")
+        return lines
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: tuple, errors: Optional[Counter]):
+        self.histogram = histogram
+        self.labels = labels
+        self.errors = errors
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(*self.labels, value=time.perf_counter() - self.start)
+        if exc_type is not None and self.errors is not None:
+            self.errors.inc(*self.labels)
+        return False
+
+class Registry:
+    """ the metrics of a Function, rendered in the Prometheus text format """
+
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=(), callback=None) -> Counter:
+        return self.register(Counter(name, help, labels, callback))
+
+    def gauge(self, name, help, labels=(), callback=None) -> Gauge:
+        return self.register(Gauge(name, help, labels, callback))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
@@ -0,0 +1,103 @@
+import asyncio
+import collections
+import time
+import uuid
+from typing import AsyncIterator, Callable, Optional
+
+# finished jobs kept for pull_status, the oldest are forgotten first
+MAX_FINISHED = 100
+
+class PullJob:
+    """ a model being pulled, progress is summed over the layers (digests) """
+
+    def __init__(self, model: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.model = model
+        self.status = "pulling" # then success, error or cancelled
+        self.message = "" # last status line of ollama, or the error
+        self.layers: dict[str, tuple[int, int]] = {} # digest -> (completed, total)
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.finished is not None
+
+    def update(self, progress):
+        """ record a progress message of the ollama pull stream """
+        self.message = progress.get("status") or self.message
+        digest = progress.get("digest")
+        if digest and progress.get("total"):
+            self.layers[digest] = (progress.get("completed") or 0, progress["total"])
+
+    def to_dict(self) -> dict:
+        completed = sum(c for c, _ in self.layers.values())
+        total = sum(t for _, t in self.layers.values())
+        return {
+            "job_id": self.id,
+            "model": self.model,
+            "status": self.status,
+            "message": self.message,
+            "completed_bytes": completed,
+            "total_bytes": total,
+            "percent": round(100 * completed / total, 1) if total else 0.0,
+            "elapsed_seconds": round((self.finished or time.time()) - self.started, 1),
+        }
+
+class PullJobs:
+    """
+    Model pulls run as background jobs: start() returns at once, the job
+    records the streamed progress. A model has one pull at a time, a pull
+    requested while one is running attaches to it.
+    Use from the event loop thread only.
+    """
+
+    def __init__(self, pull: Callable[[str], AsyncIterator]):
+        # pull(model) -> async iterator of the progress messages of ollama
+        self.pull = pull
+        self.jobs: dict[str, PullJob] = {}
+        self._running: dict[str, PullJob] = {} # model -> its running job
+        self._finished: collections.deque = collections.deque()
+
+    def start(self, model: str) -> tuple[PullJob, bool]:
+        """ the job pulling model and whether it was started now (else attached) """
+        job = self._running.get(model)
+        if job is not None:
+            return job, False
+        job = PullJob(model)
+        self.jobs[job.id] = job
+        self._running[model] = job
+        job.task = asyncio.ensure_future(self._run(job))
+        job.task.add_done_callback(lambda _: self._finish(job))
+        return job, True
+
+    def get(self, job_id: str) -> Optional[PullJob]:
+        return self.jobs.get(job_id)
+
+    def running(self) -> int:
+        return len(self._running)
+
+    def stop(self):
+        """ cancel the running pulls """
+        for job in list(self._running.values()):
+            job.task.cancel()
+
+    async def _run(self, job: PullJob):
+        try:
+            async for progress in self.pull(job.model):
+                job.update(progress)
+            job.status = "success"
+        except Exception as e:
+            job.status = "error"
+            job.message = str(e)
+
+    def _finish(self, job: PullJob):
+        # a done callback: runs even if the job got cancelled before it started
+        if job.task.cancelled():
+            job.status = "cancelled"
+        job.finished = time.time()
+        del self._running[job.model]
+        self._finished.append(job.id)
+        while len(self._finished) > MAX_FINISHED:
+            self.jobs.pop(self._finished.popleft(), None)
@@ -2,6 +2,9 @@
 An example set of unit tests which confirm that the main handler (the
 callable function) returns 200 OK for a simple HTTP GET.
 """
+import asyncio
+import json
+
 import pytest
 from function import new
 
@@ -36,3 +39,166 @@ async def test_function_handle():
     assert sent_ok, "Function did not send a 200 OK"
     assert sent_headers, "Function did not send headers"
     assert sent_body, "Function did not send a body"
+
+
+@pytest.mark.asyncio
+async def test_function_mcp_lifespan():
+    f = new()
+    assert not f.ready()[0], "Function ready before MCP server started"
+
+    f.start({})
+    # concurrent first requests share the single lifespan started by start
+    task = f._mcp_task
+    await asyncio.gather(f._wait_mcp(), f._wait_mcp())
+    assert f._mcp_task is task
+    assert f.ready() == (True, "Ready")
+
+    f.stop()
+    await asyncio.wait_for(task, 5)
+
+
+@pytest.mark.asyncio
+async def test_function_metrics_endpoint():
+    f = new()
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await f.handle({'type': 'http', 'path': '/metrics'}, {}, send)
+
+    assert messages[0]['status'] == 200
+    assert messages[0]['headers'][0][1].startswith(b'text/plain; version=0.0.4')
+    assert b'# TYPE mcp_ollama_tool_calls_total counter' in messages[1]['body']
+
+
+def test_ollama_host_is_configurable():
+    f = new()
+    f.mcp_server.configure({"OLLAMA_HOST": "http://127.0.0.1:11435", "OLLAMA_TIMEOUT": "30"})
+    http = f.mcp_server.client._client
+    assert str(http.base_url) == "http://127.0.0.1:11435"
+    assert http.timeout.read == 30
+
+
+@pytest.mark.asyncio
+async def test_function_fails_fast_when_the_model_is_busy():
+    from function.admission import Overloaded
+    f = new()
+    f.start({"OLLAMA_MAX_CONCURRENCY": "1", "OLLAMA_MAX_QUEUE": "0"})
+    body = (b'{"jsonrpc": "2.0", "id": 1, "method": "tools/call", '
+            b'"params": {"name": "call_model", "arguments": {"prompt": "hi"}}}')
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async with f.mcp_server.admission.slot(f.mcp_server.model):
+        with pytest.raises(Overloaded) as e:
+            await f.handle({'type': 'http', 'path': '/mcp', 'method': 'POST'},
+                           receive, None)
+    assert e.value.status == 429
+    f.stop()
+    await asyncio.wait_for(f._mcp_task, 5)
+
+
+@pytest.mark.asyncio
+async def test_function_is_ready_once_the_models_are_loaded():
+    f = new()
+    loaded = asyncio.Event()
+    kept_alive = [] # keep_alive of the chat calls
+
+    class SlowOllama:
+        async def generate(self, model, prompt, keep_alive=None):
+            await loaded.wait()
+            return {"response": "", "load_duration": 2_000_000_000}
+
+        async def chat(self, model, messages, keep_alive=None):
+            kept_alive.append(keep_alive)
+            return {"message": {"content": "hi"}, "load_duration": 1000}
+
+    f.mcp_server.client = SlowOllama()
+    f.start({"OLLAMA_PRELOAD_MODELS": "llama3.2:3b", "OLLAMA_KEEP_ALIVE": "-1"})
+    await f._wait_mcp()
+    assert f.ready() == (False, "loading models llama3.2:3b")
+    loaded.set()
+    await asyncio.wait_for(f.mcp_server.preloader.wait(), 5)
+    assert f.ready() == (True, "Ready")
+
+    await f.mcp_server.mcp.call_tool("call_model", {"prompt": "hi"})
+    assert kept_alive == [-1.0]
+    metrics = f.metrics()
+    assert 'mcp_ollama_model_preload_seconds{model="llama3.2:3b"} 2' in metrics
+    assert 'mcp_ollama_load_duration_seconds_count{model="llama3.2:3b"} 2' in metrics
+    f.stop()
+    await asyncio.wait_for(f._mcp_task, 5)
+
+
+@pytest.mark.asyncio
+async def test_pull_model_runs_in_background():
+    f = new()
+    done = asyncio.Event()
+
+    class PullingOllama:
+        pulls = 0
+
+        async def pull(self, model, stream=False):
+            PullingOllama.pulls += 1
+
+            async def progress():
+                yield {"status": "pulling a", "digest": "sha256:a", "total": 4, "completed": 1}
+                await done.wait()
+                yield {"status": "success"}
+            return progress()
+
+    async def call(tool, arguments):
+        content = await f.mcp_server.mcp.call_tool(tool, arguments)
+        return (content[0] if isinstance(content, tuple) else content)[0].text
+
+    f.mcp_server.client = PullingOllama()
+    first = await call("pull_model", {"model": "llama3.2:1b"})
+    again = await call("pull_model", {"model": "llama3.2:1b"})
+    job_id = first.rsplit(" ", 1)[1]
+    assert again == f"Model llama3.2:1b is already being pulled, job id: {job_id}"
+    await asyncio.sleep(0.01)
+    status = json.loads(await call("pull_status", {"job_id": job_id}))
+    assert (status["status"], status["percent"]) == ("pulling", 25.0)
+
+    done.set()
+    await f.mcp_server.pulls.get(job_id).task
+    assert json.loads(await call("pull_status", {}))["status"] == "success"
+    assert PullingOllama.pulls == 1
+
+
+@pytest.mark.asyncio
+async def test_call_model_streams_progress():
+    from mcp.shared.memory import create_connected_server_and_client_session
+    f = new()
+    progress = []
+
+    class StreamingOllama:
+        async def chat(self, model, messages, stream=False, keep_alive=None):
+            assert stream
+
+            async def parts():
+                for token in ["Hello", " there", ""]:
+                    yield {"message": {"content": token}, "done": not token}
+            return parts()
+
+    async def on_progress(done, total, message):
+        progress.append((done, message))
+
+    f.mcp_server.client = StreamingOllama()
+    async with create_connected_server_and_client_session(f.mcp_server.mcp._mcp_server) as client:
+        result = await client.call_tool("call_model", {"prompt": "hi", "stream": True},
+                                        progress_callback=on_progress)
+    assert result.content[0].text == "Hello there"
+    assert progress == [(1, "Hello"), (2, " there")]
+
+
+def test_partial_configure_keeps_admission_limits():
+    f = new()
+    server = f.mcp_server
+    server.configure({"OLLAMA_MAX_CONCURRENCY": "2", "OLLAMA_MAX_QUEUE": "5",
+                      "OLLAMA_QUEUE_TIMEOUT": "7"})
+    server.configure({"OLLAMA_TIMEOUT": "30"})
+    assert (server.admission.concurrency, server.admission.max_queue,
+            server.admission.timeout) == (2, 5, 7.0)
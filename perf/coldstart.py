@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark of the Function variants.
+
+For every package it measures, over a number of fresh processes:
+- import time of the function package (total and per top-level package,
+  like `python -X importtime`)
+- new() construction time
+- time from process spawn to ready (/health/readiness), to the first MCP
+  initialize and to the first tools/call
+against the local Ollama stand-in (ollama_stub.py), and writes the medians
+to a json file, so results can be compared between commits (--compare).
+
+run: python coldstart.py [--runs 5] [--output coldstart.json] [--compare old.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+import ollama_stub
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# package -> tool calls made (in order) after the MCP initialize
+PACKAGES = {
+    "initial/mcpfn": [
+        ("hello_tool", {"name": "bench"}),
+    ],
+    "mc-lama-mash/mcp": [
+        ("call_model", {"prompt": "What is a Knative Function?"}),
+    ],
+    "mc-lama-mash/mcp-rag": [
+        ("embed_document", {"data": ["# Functions\nKnative Functions run code."]}),
+        ("call_model", {"prompt": "What is a Knative Function?"}),
+    ],
+}
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def import_times(package: str) -> tuple[float, dict[str, float]]:
+    """ total ms of `import function` and self ms per top-level package """
+    out = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import function"],
+            cwd=package, capture_output=True, text=True, check=True)
+    total = 0.0
+    by_package: dict[str, float] = {}
+    for line in out.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, _, name = match.groups()
+        root = name.split(".")[0]
+        by_package[root] = by_package.get(root, 0.0) + int(self_us) / 1000
+        if name == "function":
+            total = int(cumulative_us) / 1000
+    return total, by_package
+
+async def first_calls(base_url: str, calls, spawned: float,
+                      timeout: float) -> dict[str, float]:
+    """ ms from process spawn to ready, MCP initialize and each tool call """
+    result = {}
+    deadline = spawned + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                response = await client.get(f"{base_url}/health/readiness")
+                if response.status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.perf_counter() > deadline:
+                raise TimeoutError("function did not become ready")
+            await asyncio.sleep(0.01)
+    result["ready_ms"] = (time.perf_counter() - spawned) * 1000
+
+    async with streamablehttp_client(f"{base_url}/mcp") as streams:
+        async with ClientSession(streams[0], streams[1]) as sess:
+            await sess.initialize()
+            result["initialize_ms"] = (time.perf_counter() - spawned) * 1000
+            for name, arguments in calls:
+                out = await sess.call_tool(name=name, arguments=arguments)
+                if out.isError:
+                    raise RuntimeError(f"{name} failed: {out.content}")
+                key = f"tools_call_{name}_ms"
+                result.setdefault(key, (time.perf_counter() - spawned) * 1000)
+    return result
+
+def run_once(package: str, calls, ollama_url: str, timeout: float) -> dict[str, float]:
+    """ spawn a fresh Function process and measure its cold start """
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   LISTEN_ADDRESS=f"127.0.0.1:{port}",
+                   OLLAMA_HOST=ollama_url,
+                   # cold means cold: nothing cached from a previous run
+                   EMBED_CACHE_PATH=os.path.join(tmp, "embeddings.sqlite"))
+        spawned = time.perf_counter()
+        proc = subprocess.Popen(
+                [sys.executable, os.path.join(HERE, "serve_function.py"), package],
+                env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                text=True)
+        try:
+            line = proc.stdout.readline() # pyright: ignore[reportOptionalMemberAccess]
+            if not line.startswith("BENCH "):
+                raise RuntimeError(f"unexpected output from {package}: {line!r}")
+            result = json.loads(line[len("BENCH "):])
+            result.update(asyncio.run(first_calls(
+                    f"http://127.0.0.1:{port}", calls, spawned, timeout)))
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    return result
+
+def bench(package: str, calls, runs: int, ollama_url: str, timeout: float) -> dict:
+    path = os.path.join(ROOT, package)
+    samples: dict[str, list[float]] = {}
+    by_package: dict[str, list[float]] = {}
+    for _ in range(runs):
+        total, per_package = import_times(path)
+        samples.setdefault("importtime_ms", []).append(total)
+        for name, ms in per_package.items():
+            by_package.setdefault(name, []).append(ms)
+        for key, ms in run_once(path, calls, ollama_url, timeout).items():
+            samples.setdefault(key, []).append(ms)
+
+    imports = {name: statistics.median(v) for name, v in by_package.items()}
+    top = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:25]
+    return {
+        "metrics": {key: round(statistics.median(v), 2) for key, v in samples.items()},
+        "samples": {key: [round(x, 2) for x in v] for key, v in samples.items()},
+        "import_self_ms_by_package": {name: round(ms, 2) for name, ms in top},
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(old: dict, new: dict):
+    """ print metric deltas between two result files """
+    print(f"{'package':<24}{'metric':<34}{'old':>10}{'new':>10}{'delta':>9}")
+    for package, result in new["packages"].items():
+        old_metrics = old.get("packages", {}).get(package, {}).get("metrics", {})
+        for metric, value in result["metrics"].items():
+            before = old_metrics.get(metric)
+            if before is None:
+                continue
+            delta = (value - before) / before * 100 if before else 0.0
+            print(f"{package:<24}{metric:<34}{before:>10.1f}{value:>10.1f}{delta:>+8.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--package", action="append", choices=list(PACKAGES),
+                        help="package(s) to measure, default all")
+    parser.add_argument("--output", default="coldstart.json")
+    parser.add_argument("--compare", help="previous result file to compare with")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    stub = ollama_stub.start()
+    ollama_url = f"http://127.0.0.1:{stub.server_address[1]}"
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "packages": {},
+    }
+    for package in args.package or PACKAGES:
+        print(f"measuring {package} ({args.runs} runs)...", flush=True)
+        results["packages"][package] = bench(
+                package, PACKAGES[package], args.runs, ollama_url, args.timeout)
+        for metric, value in results["packages"][package]["metrics"].items():
+            print(f"  {metric:<34}{value:>10.1f} ms")
+    stub.shutdown()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Concurrent load generator for the MCP Functions.
+
+Runs N concurrent MCP sessions (streamablehttp_client + ClientSession)
+calling a weighted mix of tools, either
+- closed loop: every session calls again as soon as its call returns
+  (optionally after --think seconds), load follows the Function's speed
+- open loop: calls arrive at --rate per second (Poisson) no matter how
+  fast they are served, latency is measured from the arrival, so time
+  spent waiting for a free session counts (no coordinated omission)
+and reports throughput and p50/p95/p99 latency per tool. --sessions takes
+a list (1,2,4,8) to sweep the concurrency and find the saturation point:
+where throughput stops growing while latency does.
+
+Against a running Function:
+    python loadgen.py --url http://localhost:8080/mcp --mix call_model=1
+or spawned locally against the Ollama stand-in (ollama_stub.py):
+    python loadgen.py --package mc-lama-mash/mcp-rag --sessions 1,2,4,8,16
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+import ollama_stub
+from coldstart import HERE, ROOT, free_port, git_commit
+
+PROMPTS = [
+    "What is a Knative Function?",
+    "How do I deploy a Function to a cluster?",
+    "Which languages can Functions be written in?",
+    "How is a Function configured?",
+]
+
+DOCUMENT = ("# Functions\nKnative Functions run code in containers and scale to zero.\n"
+            "# Deploy\nfunc deploy builds the image and deploys it to the cluster.\n"
+            "# Configuration\nThe configuration is kept in func.yaml.")
+
+# tool -> arguments of a call (a function: calls vary a bit, like real ones)
+ARGUMENTS = {
+    "hello_tool": lambda: {"name": "load"},
+    "list_models": lambda: {},
+    "call_model": lambda: {"prompt": random.choice(PROMPTS)},
+    "embed_document": lambda: {"data": [DOCUMENT]},
+}
+
+# default tool mix (weights) per package
+MIXES = {
+    "initial/mcpfn": {"hello_tool": 1},
+    "mc-lama-mash/mcp": {"call_model": 9, "list_models": 1},
+    "mc-lama-mash/mcp-rag": {"call_model": 8, "embed_document": 1, "list_models": 1},
+}
+
+# tool results starting with these are failures reported as text
+ERROR_PREFIXES = ("Error", "Oops")
+
+def parse_mix(text: str) -> dict[str, float]:
+    """ "call_model=8,list_models=1" -> {"call_model": 8.0, "list_models": 1.0} """
+    mix = {}
+    for item in text.split(","):
+        tool, _, weight = item.partition("=")
+        mix[tool.strip()] = float(weight or 1)
+    return mix
+
+def percentile(values: list[float], q: float) -> float:
+    """ nearest rank percentile of sorted values """
+    if not values:
+        return 0.0
+    rank = max(1, round(q / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+class Recorder:
+    """ latencies (s) and errors per tool, inside the measured window only """
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.recording = False
+
+    def record(self, tool: str, latency: float, ok: bool):
+        if not self.recording:
+            return
+        self.latencies.setdefault(tool, []).append(latency)
+        if not ok:
+            self.errors[tool] = self.errors.get(tool, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        tools = {}
+        for tool, latencies in sorted(self.latencies.items()):
+            tools[tool] = summarize(sorted(latencies), self.errors.get(tool, 0), elapsed)
+        every = sorted(x for latencies in self.latencies.values() for x in latencies)
+        return {"elapsed_s": round(elapsed, 2),
+                "total": summarize(every, sum(self.errors.values()), elapsed),
+                "tools": tools}
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    ms = lambda s: round(s * 1000, 2)
+    return {
+        "calls": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+    }
+
+async def call(sess: ClientSession, tool: str, recorder: Recorder, since: float):
+    """ call tool, latency is measured from since (call start or arrival) """
+    ok = False
+    try:
+        out = await sess.call_tool(name=tool, arguments=ARGUMENTS.get(tool, dict)())
+        text = getattr(out.content[0], "text", "") if out.content else ""
+        ok = not out.isError and not text.startswith(ERROR_PREFIXES)
+    except Exception as e:
+        print(f"{tool} failed: {e}", file=sys.stderr)
+    recorder.record(tool, time.perf_counter() - since, ok)
+
+@contextlib.asynccontextmanager
+async def session(url: str):
+    async with streamablehttp_client(url) as streams:
+        async with ClientSession(streams[0], streams[1]) as sess:
+            await sess.initialize()
+            yield sess
+
+async def closed_loop(url, sessions, pick, recorder, stop: asyncio.Event, think: float):
+    async def worker():
+        async with session(url) as sess:
+            while not stop.is_set():
+                await call(sess, pick(), recorder, time.perf_counter())
+                if think:
+                    await asyncio.sleep(random.expovariate(1 / think))
+    await asyncio.gather(*(worker() for _ in range(sessions)))
+
+async def open_loop(url, sessions, pick, recorder, stop: asyncio.Event, rate: float):
+    """
+    Poisson arrivals at rate/s served by the sessions. Arrivals waiting for
+    a session pile up in the queue, its size at the end is reported: a
+    growing backlog means the rate is past the saturation point.
+    """
+    arrivals: asyncio.Queue = asyncio.Queue()
+
+    async def worker(sess):
+        while True:
+            tool, arrived = await arrivals.get()
+            if tool is None:
+                return
+            await call(sess, tool, recorder, arrived)
+
+    async with contextlib.AsyncExitStack() as stack:
+        opened = [await stack.enter_async_context(session(url)) for _ in range(sessions)]
+        workers = [asyncio.create_task(worker(sess)) for sess in opened]
+        next_arrival = time.perf_counter()
+        while not stop.is_set():
+            next_arrival += random.expovariate(rate)
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            arrivals.put_nowait((pick(), next_arrival))
+        backlog = arrivals.qsize()
+        # drop what is still queued, let the calls in flight finish
+        while not arrivals.empty():
+            arrivals.get_nowait()
+        for _ in workers:
+            arrivals.put_nowait((None, 0.0))
+        await asyncio.gather(*workers)
+    return backlog
+
+async def run(url: str, sessions: int, mix: dict[str, float], duration: float,
+              warmup: float, rate: float = 0.0, think: float = 0.0) -> dict:
+    """ one load run: warmup, then duration seconds measured """
+    tools, weights = list(mix), list(mix.values())
+    pick = lambda: random.choices(tools, weights)[0]
+    recorder = Recorder()
+    stop = asyncio.Event()
+    if rate:
+        load = asyncio.create_task(open_loop(url, sessions, pick, recorder, stop, rate))
+    else:
+        load = asyncio.create_task(closed_loop(url, sessions, pick, recorder, stop, think))
+
+    async def measure():
+        await asyncio.sleep(warmup)
+        recorder.recording = True
+        start = time.perf_counter()
+        await asyncio.sleep(duration)
+        recorder.recording = False
+        stop.set()
+        return time.perf_counter() - start
+
+    elapsed, backlog = await asyncio.gather(measure(), load)
+    result = {"sessions": sessions, "mode": "open" if rate else "closed"}
+    if rate:
+        result.update(rate_rps=rate, backlog=backlog)
+    result.update(recorder.summary(elapsed))
+    return result
+
+@contextlib.contextmanager
+def spawn(package: str, timeout: float):
+    """ serve package locally against the Ollama stand-in, yields its MCP url """
+    stub = ollama_stub.start()
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   LISTEN_ADDRESS=f"127.0.0.1:{port}",
+                   OLLAMA_HOST=f"http://127.0.0.1:{stub.server_address[1]}",
+                   EMBED_CACHE_PATH=os.path.join(tmp, "embeddings.sqlite"))
+        proc = subprocess.Popen(
+                [sys.executable, os.path.join(HERE, "serve_function.py"),
+                 os.path.join(ROOT, package)],
+                env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(f"http://127.0.0.1:{port}", timeout)
+            yield f"http://127.0.0.1:{port}/mcp"
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            stub.shutdown()
+
+def wait_ready(base_url: str, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            if httpx.get(f"{base_url}/health/readiness").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.perf_counter() > deadline:
+            raise TimeoutError("function did not become ready")
+        time.sleep(0.05)
+
+def report(result: dict):
+    header = f"sessions={result['sessions']} {result['mode']} loop"
+    if result["mode"] == "open":
+        header += f" rate={result['rate_rps']}/s backlog={result['backlog']}"
+    print(header)
+    print(f"  {'tool':<16}{'calls':>7}{'errors':>7}{'rps':>9}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    rows = list(result["tools"].items()) + [("total", result["total"])]
+    for tool, s in rows:
+        print(f"  {tool:<16}{s['calls']:>7}{s['errors']:>7}{s['throughput_rps']:>9.1f}"
+              f"{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}")
+
+def saturation(results: list[dict], gain: float = 0.05):
+    """
+    smallest concurrency after which throughput grows by less than gain,
+    None if it still grows at the last level
+    """
+    for previous, current in zip(results, results[1:]):
+        before = previous["total"]["throughput_rps"]
+        if current["total"]["throughput_rps"] < before * (1 + gain):
+            return previous["sessions"]
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="MCP endpoint of a running Function")
+    target.add_argument("--package", choices=list(MIXES),
+                        help="serve this package locally against the Ollama stub")
+    parser.add_argument("--sessions", default="8",
+                        help="concurrent sessions, a list (1,2,4,8) sweeps them")
+    parser.add_argument("--mix", help="tool weights, e.g. call_model=8,embed_document=1 "
+                                      "(default: per package)")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="open loop arrival rate (calls/s), default closed loop")
+    parser.add_argument("--think", type=float, default=0.0,
+                        help="closed loop: mean pause (s) between calls of a session")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds first")
+    parser.add_argument("--output", help="write the results to this json file")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    if args.mix:
+        mix = parse_mix(args.mix)
+    elif args.package:
+        mix = MIXES[args.package]
+    else:
+        parser.error("--mix is required with --url")
+    levels = [int(n) for n in args.sessions.split(",")]
+
+    results = []
+    with (spawn(args.package, args.timeout) if args.package
+          else contextlib.nullcontext(args.url)) as url:
+        for sessions in levels:
+            result = asyncio.run(run(url, sessions, mix, args.duration,
+                                     args.warmup, args.rate, args.think))
+            report(result)
+            results.append(result)
+    if len(results) > 1 and not args.rate:
+        saturated = saturation(results)
+        if saturated is None:
+            print(f"throughput still grows at {levels[-1]} sessions")
+        else:
+            print(f"throughput saturates at {saturated} sessions")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "target": args.package or args.url,
+                "mix": mix,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "runs": results,
+            }, f, indent=2)
+        print(f"results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
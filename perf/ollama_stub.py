@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Ollama HTTP API, for benchmarks without a real
+Ollama daemon (and without its noise).
+
+Embeddings are deterministic (hashed bag of words, so similar texts get
+similar vectors), generations echo the prompt (or are --response-tokens
+words long). Endpoints: /api/embed, /api/generate, /api/chat (streamed
+as ndjson, like Ollama, unless "stream": false), /api/tags, /api/pull
+(streamed progress, the model is listed afterwards), /api/ps and
+/api/version. An empty prompt (or input) only loads the model.
+
+Slower and less reliable than the stub is by default:
+- --latency embed=lognormal:0.05,0.5 - time to first byte per endpoint,
+  fixed:S, uniform:A,B, normal:MEAN,SD, lognormal:MEDIAN,SIGMA or exp:MEAN
+- --prompt-tps/--tps - prompt evaluation and generation token rates
+- --fail generate=0.05:500 - share of the calls of an endpoint failing
+  with the status (0 = connection dropped), streamed responses fail
+  halfway through
+- --load-time - seconds to load a model that is not in memory; it stays
+  loaded for the keep_alive of the calls (default 5m), like in Ollama
+- --seed for repeatable latencies and failures
+
+run: python ollama_stub.py [--port 11435] [options]
+then point the Functions at it: OLLAMA_HOST=http://127.0.0.1:11435
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 11435
+DEFAULT_DIMENSIONS = 1024
+
+MODELS = ["llama3.2:3b", "mxbai-embed-large"]
+
+ENDPOINTS = ("embed", "generate", "chat", "tags", "pull")
+
+# seconds a model stays loaded after a call without keep_alive
+DEFAULT_KEEP_ALIVE = 300.0
+
+# pull progress: bytes "downloaded" per step
+PULL_SIZE = 64 * 1024 * 1024
+PULL_STEPS = 8
+
+def embed_text(text: str, dimensions: int = DEFAULT_DIMENSIONS) -> list[float]:
+    """ deterministic unit vector of text (hashed bag of words) """
+    vector = [0.0] * dimensions
+    for token in re.findall(r"\w+", text.lower()):
+        h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "big")
+        vector[h % dimensions] += 1.0 if h >> 63 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+def count_tokens(text: str) -> int:
+    """ rough token count (~4 chars per token), like the Functions estimate """
+    return math.ceil(len(text) / 4)
+
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def parse_latency(spec: str):
+    """
+    "lognormal:0.05,0.5" -> function(rng) returning seconds (>= 0):
+    fixed:S, uniform:A,B, normal:MEAN,SD, lognormal:MEDIAN,SIGMA, exp:MEAN
+    """
+    kind, _, params = spec.partition(":")
+    p = [float(x) for x in params.split(",") if x]
+    samplers = {
+        "fixed": lambda rng: p[0],
+        "uniform": lambda rng: rng.uniform(p[0], p[1]),
+        "normal": lambda rng: rng.gauss(p[0], p[1]),
+        "lognormal": lambda rng: rng.lognormvariate(math.log(p[0]), p[1]),
+        "exp": lambda rng: rng.expovariate(1 / p[0]),
+    }
+    if kind not in samplers:
+        raise ValueError(f"unknown latency distribution: {spec}")
+    sample = samplers[kind]
+    return lambda rng: max(0.0, sample(rng))
+
+def parse_keep_alive(value) -> float:
+    """
+    keep_alive of a call in seconds: a number or a duration like "1h30m",
+    negative = forever (inf), None = the default
+    """
+    if value is None or value == "":
+        return DEFAULT_KEEP_ALIVE
+    try:
+        seconds = float(value)
+    except ValueError:
+        units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        parts = re.findall(r"(-?[\d.]+)(ms|s|m|h)", value)
+        if not parts:
+            raise ValueError(f"invalid keep_alive: {value}")
+        seconds = sum(float(n) * units[unit] for n, unit in parts)
+    return math.inf if seconds < 0 else seconds
+
+def parse_failure(spec: str) -> tuple[float, int]:
+    """ "0.05:503" -> (0.05, 503), the status defaults to 500 """
+    rate, _, status = spec.partition(":")
+    return float(rate), int(status or 500)
+
+class Settings:
+    """ behavior of a stub server, see the module docstring """
+
+    def __init__(self, dimensions: int = DEFAULT_DIMENSIONS,
+                 latency: dict = None, failures: dict = None,
+                 prompt_tps: float = 0.0, tps: float = 0.0,
+                 response_tokens: int = 0, load_time: float = 0.0,
+                 seed: int = None):
+        self.dimensions = dimensions
+        # endpoint -> sampler of the seconds before responding
+        self.latency = {name: parse_latency(spec) if isinstance(spec, str) else spec
+                        for name, spec in (latency or {}).items()}
+        # endpoint -> (rate, status)
+        self.failures = dict(failures or {})
+        self.prompt_tps = prompt_tps # 0 = prompts are evaluated instantly
+        self.tps = tps # 0 = all tokens at once
+        self.response_tokens = response_tokens # 0 = echo the prompt
+        self.models = list(MODELS)
+        self.load_time = load_time # 0 = models load instantly
+        self.resident: dict[str, float] = {} # model -> time it is unloaded
+        self._loading = threading.Lock() # one model loads at a time
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock() # requests are served by many threads
+
+    def delay(self, endpoint: str) -> float:
+        sampler = self.latency.get(endpoint) or self.latency.get("*")
+        if sampler is None:
+            return 0.0
+        with self._lock:
+            return sampler(self._rng)
+
+    def failure(self, endpoint: str):
+        """ status to fail this call with (0 = drop the connection) or None """
+        rate, status = self.failures.get(endpoint) or self.failures.get("*") or (0.0, 0)
+        with self._lock:
+            return status if rate and self._rng.random() < rate else None
+
+    def load(self, model: str, keep_alive=None) -> int:
+        """
+        Load model unless it is in memory, it stays there for keep_alive.
+        Returns the nanoseconds spent, the load_duration of the response.
+        """
+        start = time.perf_counter_ns()
+        if not self._resident(model):
+            with self._loading:
+                if not self._resident(model): # or loaded by the call waited for
+                    time.sleep(self.load_time)
+        with self._lock:
+            self.resident[model] = time.monotonic() + parse_keep_alive(keep_alive)
+        return time.perf_counter_ns() - start
+
+    def _resident(self, model: str) -> bool:
+        with self._lock:
+            return self.resident.get(model, 0.0) > time.monotonic()
+
+    def loaded(self) -> list[str]:
+        """ models in memory """
+        return [model for model in list(self.resident) if self._resident(model)]
+
+    def answer(self, prompt: str) -> list[str]:
+        """ tokens (words) of the response to prompt """
+        if not self.response_tokens:
+            return re.findall(r"\S+\s*", f"stub answer to: {prompt}")
+        # deterministic words of the prompt, as many as configured
+        words = re.findall(r"\w+", prompt) or ["stub"]
+        seed = int.from_bytes(hashlib.blake2b(prompt.encode(), digest_size=8).digest(), "big")
+        return [words[(seed + i) % len(words)] + " " for i in range(self.response_tokens)]
+
+class OllamaStub(BaseHTTPRequestHandler):
+    settings = Settings()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass # quiet, this sits in the hot path of benchmarks
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            if self._prepare("tags") is None:
+                self._json({"models": [{
+                    "model": m, "name": m, "modified_at": now(),
+                    "digest": hashlib.sha256(m.encode()).hexdigest(), "size": 0,
+                    } for m in self.settings.models]})
+        elif self.path == "/api/ps":
+            self._json({"models": [{"model": m, "name": m, "size": 0}
+                                   for m in self.settings.loaded()]})
+        elif self.path == "/api/version":
+            self._json({"version": "0.0.0-stub"})
+        else:
+            self._json({"error": f"not found: {self.path}"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        endpoint = self.path.removeprefix("/api/")
+        if endpoint not in ENDPOINTS or endpoint == "tags":
+            self._json({"error": f"not found: {self.path}"}, 404)
+            return
+        started = time.perf_counter_ns()
+        fail = self._prepare(endpoint, streamed=body.get("stream", True))
+        if fail is False:
+            return
+        if endpoint != "pull":
+            self.load_ns = self.settings.load(body.get("model", ""), body.get("keep_alive"))
+        getattr(self, f"_{endpoint}")(body, started, fail)
+
+    def _prepare(self, endpoint: str, streamed: bool = False):
+        """
+        Wait the sampled latency and inject a failure: returns False when
+        the call failed already, True if a stream has to fail halfway.
+        """
+        time.sleep(self.settings.delay(endpoint))
+        status = self.settings.failure(endpoint)
+        if status is None:
+            return None
+        if status == 0:
+            self.close_connection = True
+            self.connection.close()
+            return False
+        if streamed and endpoint in ("generate", "chat", "pull"):
+            return True
+        self._json({"error": f"injected failure of {endpoint}"}, status)
+        return False
+
+    def _embed(self, body, started, fail):
+        inputs = body.get("input", "")
+        # one embedding per input, like Ollama: only a lone "" loads the model
+        inputs = ([inputs] if inputs else []) if isinstance(inputs, str) else inputs
+        tokens = sum(count_tokens(t) for t in inputs)
+        self._evaluate(tokens)
+        self._json({"model": body.get("model", ""),
+                    "embeddings": [embed_text(t, self.settings.dimensions) for t in inputs],
+                    "total_duration": time.perf_counter_ns() - started,
+                    "load_duration": self.load_ns, "prompt_eval_count": tokens})
+
+    def _generate(self, body, started, fail):
+        prompt = body.get("prompt", "")
+        self._respond(body, started, fail, prompt,
+                      lambda text: {"response": text})
+
+    def _chat(self, body, started, fail):
+        messages = body.get("messages") or [{}]
+        prompt = "".join(m.get("content", "") for m in messages)
+        self._respond(body, started, fail, messages[-1].get("content", ""),
+                      lambda text: {"message": {"role": "assistant", "content": text}},
+                      prompt_tokens=count_tokens(prompt))
+
+    def _respond(self, body, started, fail, prompt, part, prompt_tokens=None):
+        """ generate/chat: evaluate the prompt, then the tokens at the token rate """
+        model = body.get("model", "")
+        if not prompt:
+            # nothing to generate, the call only loaded the model
+            self._json({"model": model, "created_at": now(), "done": True,
+                        "done_reason": "load", "load_duration": self.load_ns,
+                        "total_duration": time.perf_counter_ns() - started,
+                        **part("")})
+            return
+        prompt_tokens = prompt_tokens or count_tokens(prompt)
+        prompt_start = time.perf_counter_ns()
+        self._evaluate(prompt_tokens)
+        prompt_ns = time.perf_counter_ns() - prompt_start
+        tokens = self.settings.answer(prompt)
+        interval = 1 / self.settings.tps if self.settings.tps else 0.0
+
+        def final(eval_ns):
+            return {"model": model, "created_at": now(), "done": True,
+                    "done_reason": "stop",
+                    "total_duration": time.perf_counter_ns() - started,
+                    "load_duration": self.load_ns,
+                    "prompt_eval_count": prompt_tokens,
+                    "prompt_eval_duration": prompt_ns,
+                    "eval_count": len(tokens), "eval_duration": eval_ns}
+
+        eval_start = time.perf_counter_ns()
+        if not body.get("stream", True):
+            time.sleep(interval * len(tokens))
+            out = final(time.perf_counter_ns() - eval_start)
+            out.update(part("".join(tokens)))
+            self._json(out)
+            return
+
+        def lines():
+            for i, token in enumerate(tokens):
+                if fail and i == len(tokens) // 2:
+                    yield {"error": "injected failure of the generation"}
+                    return
+                time.sleep(interval)
+                yield dict(part(token), model=model, created_at=now(), done=False)
+            out = final(time.perf_counter_ns() - eval_start)
+            out.update(part(""))
+            yield out
+        self._stream(lines())
+
+    def _pull(self, body, started, fail):
+        model = body.get("model") or body.get("name", "")
+        digest = "sha256:" + hashlib.sha256(model.encode()).hexdigest()
+
+        def lines():
+            yield {"status": "pulling manifest"}
+            step = PULL_SIZE // PULL_STEPS
+            for i in range(1, PULL_STEPS + 1):
+                if fail and i == PULL_STEPS // 2:
+                    yield {"error": "injected failure of the pull"}
+                    return
+                yield {"status": f"pulling {digest[7:19]}", "digest": digest,
+                       "total": PULL_SIZE, "completed": step * i}
+            yield {"status": "verifying sha256 digest"}
+            yield {"status": "writing manifest"}
+            with self.settings._lock:
+                if model not in self.settings.models:
+                    self.settings.models.append(model)
+            yield {"status": "success"}
+
+        if body.get("stream", True):
+            self._stream(lines())
+        else:
+            *_, last = lines()
+            self._json(last, 500 if "error" in last else 200)
+
+    def _evaluate(self, tokens: int):
+        if self.settings.prompt_tps:
+            time.sleep(tokens / self.settings.prompt_tps)
+
+    def _json(self, payload, status=200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, parts):
+        """ ndjson lines, chunked transfer encoding, flushed one by one """
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for part in parts:
+            data = json.dumps(part).encode() + b"\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+def start(port: int = 0, host: str = "127.0.0.1",
+          settings: Settings = None) -> ThreadingHTTPServer:
+    """ start the stub in a background thread, returns the server """
+    server = make_server(host, port, settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def make_server(host: str, port: int, settings: Settings = None) -> ThreadingHTTPServer:
+    # a handler class per server, so stubs of one process can differ
+    handler = type("OllamaStub", (OllamaStub,), {"settings": settings or Settings()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--dimensions", type=int, default=DEFAULT_DIMENSIONS)
+    parser.add_argument("--latency", action="append", default=[], metavar="ENDPOINT=DIST",
+                        help="e.g. generate=lognormal:0.2,0.5 or *=fixed:0.01")
+    parser.add_argument("--fail", action="append", default=[], metavar="ENDPOINT=RATE[:STATUS]",
+                        help="e.g. embed=0.01:503, status 0 drops the connection")
+    parser.add_argument("--prompt-tps", type=float, default=0.0,
+                        help="prompt (and embedding input) tokens evaluated per second")
+    parser.add_argument("--tps", type=float, default=0.0,
+                        help="generated tokens per second")
+    parser.add_argument("--response-tokens", type=int, default=0,
+                        help="tokens per generation, default echo the prompt")
+    parser.add_argument("--load-time", type=float, default=0.0,
+                        help="seconds to load a model that is not in memory")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    pairs = lambda items: dict(item.split("=", 1) for item in items)
+    settings = Settings(
+            dimensions=args.dimensions,
+            latency=pairs(args.latency),
+            failures={k: parse_failure(v) for k, v in pairs(args.fail).items()},
+            prompt_tps=args.prompt_tps, tps=args.tps,
+            response_tokens=args.response_tokens, load_time=args.load_time,
+            seed=args.seed)
+    server = make_server(args.host, args.port, settings)
+    print(f"ollama stub listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
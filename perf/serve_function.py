@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Serve a Function package the way func-python does (hypercorn + the ASGI
+middleware copy in initial/asgi/dev), printing its import and new() times
+as a "BENCH {...}" json line on stdout before serving.
+
+run: LISTEN_ADDRESS=127.0.0.1:8080 python serve_function.py <package dir>
+"""
+import json
+import os
+import sys
+import time
+
+started = time.perf_counter()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIDDLEWARE_DIR = os.path.join(ROOT, "initial", "asgi", "dev")
+
+def main():
+    package = os.path.abspath(sys.argv[1])
+    sys.path.insert(0, package)
+    import function
+    imported = time.perf_counter()
+    f = function.new()
+    constructed = time.perf_counter()
+    print("BENCH " + json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "new_ms": (constructed - imported) * 1000,
+        }), flush=True)
+
+    sys.path.insert(0, MIDDLEWARE_DIR)
+    from middleware import ASGIApplication
+    ASGIApplication(f).serve()
+
+if __name__ == "__main__":
+    main()
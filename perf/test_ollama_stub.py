@@ -0,0 +1,92 @@
+"""
+Tests of the Ollama stand-in, run: python -m pytest -q perf
+"""
+import http.client
+import json
+import time
+
+import pytest
+import ollama_stub
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**settings):
+        server = ollama_stub.start(settings=ollama_stub.Settings(dimensions=8, **settings))
+        servers.append(server)
+        return server.server_address[1]
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def post(port, endpoint, body):
+    """ status and the ndjson lines (one for a json response) """
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        conn.request("POST", f"/api/{endpoint}", json.dumps(body),
+                     {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, [json.loads(line) for line in response.read().splitlines()]
+    finally:
+        conn.close()
+
+
+def test_embed_returns_a_vector_per_input(stub):
+    port = stub()
+    status, [out] = post(port, "embed", {"model": "m", "input": ["a b", "", "a b"]})
+    assert status == 200
+    assert len(out["embeddings"]) == 3
+    assert all(len(v) == 8 for v in out["embeddings"])
+    assert out["embeddings"][0] == out["embeddings"][2] # deterministic
+    assert out["prompt_eval_count"] == 2
+
+    # a lone empty input only loads the model, like ollama
+    status, [out] = post(port, "embed", {"model": "m", "input": ""})
+    assert status == 200 and out["embeddings"] == []
+
+
+def test_generate_streams_ndjson(stub):
+    port = stub(tps=1000)
+    status, lines = post(port, "generate", {"model": "m", "prompt": "hello world"})
+    assert status == 200
+    *parts, last = lines
+    assert [p["done"] for p in parts] == [False] * len(parts)
+    assert "".join(p["response"] for p in parts) == "stub answer to: hello world"
+    assert last["done"] and last["eval_count"] == len(parts)
+
+    status, [out] = post(port, "generate", {"model": "m", "prompt": "hi", "stream": False})
+    assert status == 200 and out["response"] == "stub answer to: hi" and out["done"]
+
+
+def test_pull_lists_the_model(stub):
+    port = stub()
+    status, lines = post(port, "pull", {"model": "new-model"})
+    assert status == 200
+    assert lines[-1] == {"status": "success"}
+    assert lines[-4]["completed"] == lines[-4]["total"] == ollama_stub.PULL_SIZE
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.request("GET", "/api/tags")
+    tags = json.loads(conn.getresponse().read())
+    conn.close()
+    assert "new-model" in [m["name"] for m in tags["models"]]
+
+
+def test_injected_failures_and_latency(stub):
+    port = stub(failures={"embed": (1.0, 503), "generate": (1.0, 500)},
+                latency={"embed": "fixed:0.2"})
+    start = time.perf_counter()
+    status, [out] = post(port, "embed", {"model": "m", "input": "a"})
+    assert time.perf_counter() - start >= 0.2
+    assert status == 503 and "injected" in out["error"]
+
+    # a stream fails halfway through, with an error line and no final one
+    status, lines = post(port, "generate", {"model": "m", "prompt": "one two three four"})
+    assert status == 200
+    assert "error" in lines[-1] and not any(line.get("done") for line in lines)
+
+    status, _ = post(port, "generate", {"model": "m", "prompt": "hi", "stream": False})
+    assert status == 500
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from array import array
+from typing import Callable, Optional, Sequence
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "mcp-rag-embeddings.sqlite")
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024 # bytes of stored vectors
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Persistent content-addressed embedding cache backed by SQLite.
+    Vectors are keyed by (embedding model, sha256 of the content), so
+    re-ingesting unchanged content costs a lookup instead of a model call.
+    Total size of stored vectors is capped at max_bytes, least recently used
+    entries are evicted first.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH,
+                 max_bytes: int = DEFAULT_CACHE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, hash)
+            )""")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_used)")
+        self._db.commit()
+        self._size = self._db.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str,
+                 texts: Sequence[str]) -> list[Optional[list[float]]]:
+        """ return cached vectors for texts (None for every miss) """
+        hashes = [content_hash(t) for t in texts]
+        found = {}
+        with self._lock:
+            # sqlite limits number of host parameters, query in slices
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i+500]
+                rows = self._db.execute(
+                    "SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN (%s)"
+                    % ",".join("?" * len(part)), [model, *part])
+                found.update(rows)
+            if found:
+                self._db.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                    [(time.time(), model, h) for h in found])
+                self._db.commit()
+        self.hits += len(found)
+        self.misses += len(hashes) - len(found)
+        return [_unpack(found[h]) if h in found else None for h in hashes]
+
+    def put_many(self, model: str, texts: Sequence[str],
+                 vectors: Sequence[Sequence[float]]):
+        """ store vectors for texts and evict old entries over the size cap """
+        now = time.time()
+        rows = {}
+        for t, v in zip(texts, vectors):
+            h = content_hash(t)
+            rows[h] = (model, h, _pack(v), now)
+        rows = list(rows.values())
+        with self._lock:
+            for row in rows:
+                old = self._db.execute(
+                    "SELECT LENGTH(vector) FROM embeddings WHERE model = ? AND hash = ?",
+                    row[:2]).fetchone()
+                self._size += len(row[2]) - (old[0] if old else 0)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._evict()
+            self._db.commit()
+
+    def embed(self, model: str, texts: Sequence[str],
+              embed_fn: Callable[[list[str]], Sequence[Sequence[float]]]
+              ) -> list[list[float]]:
+        """
+        Return vectors for all texts, calling embed_fn(list[str]) only for
+        the texts which are not cached yet.
+        """
+        vectors = self.get_many(model, texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            new = embed_fn([texts[i] for i in missing])
+            self.put_many(model, [texts[i] for i in missing], new)
+            for i, v in zip(missing, new):
+                vectors[i] = list(v)
+        return vectors # pyright: ignore[reportReturnType]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _evict(self):
+        """ drop least recently used entries until under max_bytes """
+        while self._size > self.max_bytes:
+            rows = self._db.execute(
+                "SELECT model, hash, LENGTH(vector) FROM embeddings "
+                "ORDER BY last_used LIMIT 100").fetchall()
+            if not rows:
+                self._size = 0
+                return
+            for model, h, size in rows:
+                if self._size <= self.max_bytes:
+                    break
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE model = ? AND hash = ?", (model, h))
+                self._size -= size
+
+def _pack(vector: Sequence[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+def _unpack(blob: bytes) -> list[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
@@ -1,27 +1,36 @@
+import asyncio
 import chromadb
 import ollama
-from retrieve import get_raw_content
+from retrieve import fetch_all
+from batching import AdaptiveBatcher
+from cache import EmbeddingCache
 import sys
 
 url="https://raw.githubusercontent.com/knative/func/main/docs/function-templates/python.md"
 url2="https://context7.com/knative/docs/llms.txt?topic=functions"
-documents = [
-    get_raw_content(url),
-    get_raw_content(url2),
-]
+documents = asyncio.run(fetch_all([url, url2]))
 
 ### 1) Generate embeddings
 client = chromadb.Client()
 collection = client.create_collection(name="docs")
 
-for i, d in enumerate(documents):
-    response = ollama.embed(model="mxbai-embed-large",input=d)
-    embeddings = response["embeddings"]
+# embed in batches -> one request and one insert per batch, not per document.
+# Documents embedded by a previous run are served from the on-disk cache
+batcher = AdaptiveBatcher()
+cache = EmbeddingCache()
+
+def embed_fn(inputs):
+    with batcher.timed(len(inputs)):
+        return ollama.embed(model="mxbai-embed-large",input=inputs)["embeddings"]
+
+count = 0
+for batch in batcher.batches(documents):
     collection.add(
-            ids=[str(i)],
-            embeddings=embeddings,
-            documents=[d]
+            ids=[str(count + i) for i in range(len(batch))],
+            embeddings=cache.embed("mxbai-embed-large", batch, embed_fn),
+            documents=batch
             )
+    count += len(batch)
 
 ##### 2) Retrieve
 ### embed the prompt and retrieve the most relevant info
@@ -1,9 +1,46 @@
-import requests
+import asyncio
+import logging
+from urllib.parse import urlparse
+
+import httpx
+
+# status codes worth another try, everything else >=400 fails right away
+RETRY_STATUS = {429, 500, 502, 503, 504}
 
 # Accepts any url link which points to a raw data (*.md/text files etc.)
 # example: https://raw.githubusercontent.com/knative/func/main/docs/function-templates/python.md
-def get_raw_content(url: str) -> str:
-    """ retrieve contents of github raw url as a text """
-    response = requests.get(url)
-    response.raise_for_status() # errors if bad response
-    return response.text
+async def fetch_all(urls: list[str],
+                    timeout: float = 30.0,
+                    retries: int = 3,
+                    backoff: float = 0.5,
+                    per_host: int = 8) -> list[str]:
+    """
+    retrieve contents of all urls concurrently (in order of urls) over one
+    connection pool, at most per_host at once per host, with timeouts and
+    retries with exponential backoff for transient failures
+    """
+    hosts: dict[str, asyncio.Semaphore] = {}
+    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+        async def get(url: str, last: bool) -> str:
+            response = await client.get(url)
+            if response.status_code in RETRY_STATUS and not last:
+                raise _Retry(f"status {response.status_code}")
+            response.raise_for_status() # errors if bad response
+            return response.text
+
+        async def fetch(url: str) -> str:
+            limit = hosts.setdefault(urlparse(url).netloc, asyncio.Semaphore(per_host))
+            async with limit:
+                for attempt in range(retries):
+                    try:
+                        return await get(url, last=False)
+                    except (_Retry, httpx.TransportError) as e:
+                        delay = backoff * 2 ** attempt
+                        logging.warning(f"fetch '{url}' failed ({e}), retry in {delay}s")
+                        await asyncio.sleep(delay)
+                # the last attempt, its errors are raised
+                return await get(url, last=True)
+        return await asyncio.gather(*(fetch(url) for url in urls))
+
+class _Retry(Exception):
+    pass